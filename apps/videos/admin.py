@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Video, VideoProgress
+from .models import Video, VideoProgress, VideoUpload
 from import_export import resources
 from import_export.admin import ImportExportModelAdmin
 
@@ -18,6 +18,9 @@ class VideoAdmin(ImportExportModelAdmin):
     Includes import/export functionality.
     """
     resource_class = VideoResource
+    readonly_fields = ('status', 'media_manifest', 'source_hash')
+    list_display = ('title', 'category', 'status', 'created_at')
+    list_filter = ('status', 'category')
 
 @admin.register(VideoProgress)
 class VideoProgressAdmin(admin.ModelAdmin):
@@ -29,3 +32,14 @@ class VideoProgressAdmin(admin.ModelAdmin):
     list_filter = ('completed', 'started')
     search_fields = ('user__email', 'video__title')
     ordering = ('-updated_at',)
+
+@admin.register(VideoUpload)
+class VideoUploadAdmin(admin.ModelAdmin):
+    """
+    Admin configuration for VideoUpload model.
+    Shows the progress of resumable uploads.
+    """
+    list_display = ('filename', 'user', 'offset', 'upload_length', 'video', 'updated_at')
+    search_fields = ('filename', 'title', 'user__email')
+    readonly_fields = ('offset', 'video')
+    ordering = ('-updated_at',)
@@ -0,0 +1,13 @@
+from rest_framework.pagination import CursorPagination
+
+
+class VideoCursorPagination(CursorPagination):
+    """
+    Cursor pagination for the video catalog, newest videos first.
+    """
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    # DRF baut den Cursor nur aus dem ersten Feld. created_at ist ein Datum,
+    # gleiche Tage würden per Offset übersprungen, daher die eindeutige ID.
+    ordering = '-id'
@@ -1,48 +1,114 @@
-from rest_framework import serializers
-from apps.videos.models import Video, VideoProgress
 import os
+from rest_framework import serializers
+from django.conf import settings
+from django.utils.functional import cached_property
+from apps.videos.models import Video, VideoProgress, VideoUpload
+from apps.videos.progress_buffer import buffer_progress
+from apps.videos.storage import LocalMediaStorage, get_media_base_url, get_media_storage
+from apps.videos.thumbnails import build_srcset
+from videoflix_backend.metrics import TimedListSerializer, TimedSerializerMixin
+
+# Feste Felder für ältere Clients, die noch einzelne MP4-URLs erwarten
+LEGACY_RESOLUTIONS = ('120p', '360p', '720p', '1080p')
 
 
-class VideoSerializer(serializers.ModelSerializer):
-    video_120p = serializers.SerializerMethodField()
-    video_360p = serializers.SerializerMethodField()
-    video_720p = serializers.SerializerMethodField()
-    video_1080p = serializers.SerializerMethodField()
+def get_legacy_manifest(video):
+    """
+    Manifest for videos processed before media_manifest existed. The old
+    pipeline only wrote the four MP4s below MEDIA_ROOT, and not always all
+    of them, so only the files that exist are listed. Only used until
+    "manage.py rebuild_media_manifests" has filled in the real manifest.
+    """
+    storage = get_media_storage()
+    if not video.video_file or not isinstance(storage, LocalMediaStorage):
+        return {}
+    base_name = os.path.splitext(os.path.basename(video.video_file.name))[0]
+    names = [(resolution, f"videos/{video.id}/{base_name}_{resolution}.mp4") for resolution in LEGACY_RESOLUTIONS]
+    return {'renditions': [
+        {'resolution': resolution, 'path': name} for resolution, name in names if storage.exists(name)
+    ]}
 
+
+class VideoSerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    """
+    Serializes a video together with the media URLs from its manifest.
+    """
     class Meta:
         model = Video
         fields = ['id', 'title', 'description', 'category', 'thumbnail', 
-                  'created_at', 'new', 'video_120p', 'video_360p', 'video_720p', 'video_1080p']
+                  'created_at', 'new', 'status']
+        list_serializer_class = TimedListSerializer
 
-    def get_video_url(self, obj, quality):
+    @cached_property
+    def media_base_url(self):
         """
-        Erstellt eine vollständige URL für das Video in der angegebenen Qualität.
+        Absolute media URL, built once per serializer instead of once per field.
         """
         request = self.context.get('request')
-        if not obj.video_file:
-            return None
-        base_name = os.path.splitext(os.path.basename(obj.video_file.name))[0]
-        video_path = f"/media/videos/{obj.id}/{base_name}_{quality}.mp4"
-        return request.build_absolute_uri(video_path) if request else video_path
+        base_url = get_media_base_url()
+        return request.build_absolute_uri(base_url) if request else base_url
+
+    def to_representation(self, obj):
+        data = super().to_representation(obj)
+        data.update(self.get_media_urls(obj))
+        return data
+
+    def get_media_urls(self, obj):
+        """
+        Erstellt alle Medien-URLs in einem Durchlauf aus dem Manifest.
+        Nur tatsächlich erzeugte Renditions werden ausgegeben.
+        """
+        # Für unfertige Videos keine URLs erzeugen
+        manifest = obj.media_manifest if obj.status == Video.STATUS_READY else {}
+        if obj.status == Video.STATUS_READY and not manifest:
+            manifest = get_legacy_manifest(obj)
+        base_url = self.media_base_url
+        renditions = [
+            {**rendition, 'url': base_url + rendition['path']}
+            for rendition in manifest.get('renditions', [])
+        ]
 
-    def get_video_120p(self, obj):
-        return self.get_video_url(obj, "120p")
+        urls = {f"video_{resolution}": None for resolution in LEGACY_RESOLUTIONS}
+        for rendition in renditions:
+            urls[f"video_{rendition['resolution']}"] = rendition['url']
+        urls['hls_manifest_url'] = base_url + manifest['hls'] if 'hls' in manifest else None
+        urls['dash_manifest_url'] = base_url + manifest['dash'] if 'dash' in manifest else None
+        urls['renditions'] = renditions
+        urls['thumbnail_srcset'] = build_srcset(manifest.get('thumbnails', []), base_url)
+        return urls
 
-    def get_video_360p(self, obj):
-        return self.get_video_url(obj, "360p")
 
-    def get_video_720p(self, obj):
-        return self.get_video_url(obj, "720p")
+class VideoDetailSerializer(VideoSerializer):
+    """
+    Video representation of the detail view. Adds the seek preview track,
+    which only the player needs, so catalog pages stay small.
+    """
 
-    def get_video_1080p(self, obj):
-        return self.get_video_url(obj, "1080p")
+    def get_media_urls(self, obj):
+        urls = super().get_media_urls(obj)
+        trickplay = obj.media_manifest.get('trickplay') if obj.status == Video.STATUS_READY else None
+        urls['trickplay'] = {
+            'vtt_url': self.media_base_url + trickplay['vtt'],
+            'interval': trickplay['interval'],
+        } if trickplay else None
+        return urls
 
 
-class VideoProgressSerializer(serializers.ModelSerializer):
-    video = VideoSerializer()
+class VideoSummarySerializer(serializers.ModelSerializer):
+    """
+    Slim video representation for lists embedded in other resources.
+    """
+    class Meta:
+        model = Video
+        fields = ['id', 'title', 'category', 'thumbnail']
+
+
+class VideoProgressSerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    video = VideoSummarySerializer()
     class Meta:
         model = VideoProgress
         fields = ['video', 'started', 'last_position', 'completed', 'updated_at']
+        list_serializer_class = TimedListSerializer
 
 
 class VideoProgressUpdateSerializer(serializers.Serializer):
@@ -53,16 +119,34 @@ class VideoProgressUpdateSerializer(serializers.Serializer):
         Save or update the progress of the video for the given user.
         """
         last_position = self.validated_data['last_position']
+
+        if settings.VIDEO_PROGRESS_WRITE_BEHIND:
+            # Nur in Redis merken, ein Worker-Job schreibt gesammelt in die DB
+            buffer_progress(user.id, video.id, last_position)
+            return None
         
-        video_progress, created = VideoProgress.objects.get_or_create(
-            user=user,
-            video=video,
-            defaults={'last_position': last_position, 'started': True}
+        # Ein einziges INSERT ... ON CONFLICT DO UPDATE pro Heartbeat
+        video_progress = VideoProgress(user=user, video=video, last_position=last_position, started=True)
+        VideoProgress.objects.bulk_create(
+            [video_progress],
+            update_conflicts=True,
+            unique_fields=['user', 'video'],
+            update_fields=['last_position', 'started', 'updated_at'],
         )
+        return video_progress
 
-        if not created:
-            video_progress.last_position = last_position
-            video_progress.started = True
-            video_progress.save()
 
-        return video_progress
\ No newline at end of file
+class VideoUploadSerializer(serializers.ModelSerializer):
+    """
+    Validates the metadata of a new resumable upload.
+    """
+    class Meta:
+        model = VideoUpload
+        fields = ['title', 'description', 'category', 'filename', 'upload_length']
+
+    def validate_upload_length(self, value):
+        if value <= 0:
+            raise serializers.ValidationError('Upload-Length must be positive.')
+        if value > settings.VIDEO_UPLOAD_MAX_SIZE:
+            raise serializers.ValidationError(f'Uploads are limited to {settings.VIDEO_UPLOAD_MAX_SIZE} bytes.')
+        return value
@@ -1,6 +1,7 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from apps.videos.views import VideoListView, VideoProgressViewSet, VideoDetailView
+from apps.videos.views import VideoListView, VideoProgressViewSet, VideoDetailView, VideoProcessingStatusView
+from apps.videos.api.views import VideoUploadCreateView, VideoUploadDetailView
 
 router = DefaultRouter()
 router.register(r'video-progress', VideoProgressViewSet, basename='video-progress')
@@ -8,5 +9,8 @@ router.register(r'video-progress', VideoProgressViewSet, basename='video-progres
 urlpatterns = [
     path('videos/', VideoListView.as_view(), name='video-list'),
     path('videos/<int:pk>/', VideoDetailView.as_view(), name='video-detail'),
+    path('videos/<int:pk>/processing/', VideoProcessingStatusView.as_view(), name='video-processing'),
+    path('uploads/', VideoUploadCreateView.as_view(), name='video-upload-list'),
+    path('uploads/<uuid:pk>/', VideoUploadDetailView.as_view(), name='video-upload-detail'),
     path('', include(router.urls)),
 ]
@@ -0,0 +1,143 @@
+import io
+from django.conf import settings
+from django.shortcuts import get_object_or_404
+from django.urls import reverse
+from django_redis import get_redis_connection
+from rest_framework import status
+from rest_framework.permissions import IsAdminUser
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from apps.videos.api.serializers import VideoUploadSerializer
+from apps.videos.models import VideoUpload
+from apps.videos.uploads import (TUS_CHECKSUM_ALGORITHMS, TUS_EXTENSIONS, TUS_VERSION, UPLOAD_LOCK_KEY,
+                                 ChecksumMismatch, complete_upload, create_partial_file, parse_upload_checksum,
+                                 parse_upload_metadata, remove_partial_file, write_chunk)
+
+HTTP_460_CHECKSUM_MISMATCH = 460
+
+
+def tus_response(status_code, headers=None, data=None):
+    """
+    Returns a response carrying the Tus-Resumable header.
+    """
+    return Response(data, status=status_code, headers={'Tus-Resumable': TUS_VERSION, **(headers or {})})
+
+
+def check_tus_version(request):
+    """
+    Returns an error response unless the client speaks the supported tus version.
+    """
+    if request.headers.get('Tus-Resumable') != TUS_VERSION:
+        return tus_response(status.HTTP_412_PRECONDITION_FAILED, {'Tus-Version': TUS_VERSION})
+    return None
+
+
+class VideoUploadCreateView(APIView):
+    """
+    Creates resumable uploads (tus creation extension).
+    """
+    permission_classes = [IsAdminUser]
+
+    def options(self, request, *args, **kwargs):
+        """
+        Announces the supported tus version, extensions and limits.
+        """
+        return tus_response(status.HTTP_204_NO_CONTENT, {
+            'Tus-Version': TUS_VERSION,
+            'Tus-Extension': TUS_EXTENSIONS,
+            'Tus-Max-Size': str(settings.VIDEO_UPLOAD_MAX_SIZE),
+            'Tus-Checksum-Algorithm': ','.join(TUS_CHECKSUM_ALGORITHMS),
+        })
+
+    def post(self, request):
+        """
+        Registers a new upload from the Upload-Length and Upload-Metadata
+        headers (title, description, category, filename).
+        """
+        error = check_tus_version(request)
+        if error:
+            return error
+        metadata = parse_upload_metadata(request.headers.get('Upload-Metadata'))
+        if metadata is None:
+            return tus_response(status.HTTP_400_BAD_REQUEST, data={'error': 'Invalid Upload-Metadata header.'})
+
+        serializer = VideoUploadSerializer(data={**metadata, 'upload_length': request.headers.get('Upload-Length')})
+        if not serializer.is_valid():
+            return tus_response(status.HTTP_400_BAD_REQUEST, data=serializer.errors)
+        upload = serializer.save(user=request.user)
+        create_partial_file(upload)
+
+        location = request.build_absolute_uri(reverse('video-upload-detail', args=[upload.id]))
+        return tus_response(status.HTTP_201_CREATED, {'Location': location, 'Upload-Offset': '0'})
+
+
+class VideoUploadDetailView(APIView):
+    """
+    Reports the offset of an upload, appends chunks and terminates uploads.
+    """
+    permission_classes = [IsAdminUser]
+
+    def head(self, request, pk):
+        """
+        Returns how many bytes have been stored, so the client can resume.
+        """
+        upload = get_object_or_404(VideoUpload, pk=pk, user=request.user)
+        return tus_response(status.HTTP_200_OK, {
+            'Upload-Offset': str(upload.offset),
+            'Upload-Length': str(upload.upload_length),
+            'Cache-Control': 'no-store',
+        })
+
+    def patch(self, request, pk):
+        """
+        Appends the request body at Upload-Offset. The body is streamed to
+        disk; once the last byte has arrived the video is created and its
+        processing is enqueued.
+        """
+        error = check_tus_version(request)
+        if error:
+            return error
+        if request.content_type != 'application/offset+octet-stream':
+            return tus_response(status.HTTP_415_UNSUPPORTED_MEDIA_TYPE)
+        upload = get_object_or_404(VideoUpload, pk=pk, user=request.user)
+
+        checksum = None
+        if 'Upload-Checksum' in request.headers:
+            checksum = parse_upload_checksum(request.headers['Upload-Checksum'])
+            if checksum is None or checksum[0] not in TUS_CHECKSUM_ALGORITHMS:
+                return tus_response(status.HTTP_400_BAD_REQUEST, data={'error': 'Unsupported Upload-Checksum.'})
+
+        # Zwei gleichzeitige PATCHes auf denselben Upload würden sich überschreiben
+        lock = get_redis_connection('default').lock(
+            UPLOAD_LOCK_KEY.format(upload_id=upload.id), timeout=settings.VIDEO_UPLOAD_LOCK_TIMEOUT)
+        if not lock.acquire(blocking=False):
+            return tus_response(status.HTTP_423_LOCKED)
+        try:
+            upload.refresh_from_db()
+            if str(upload.offset) != request.headers.get('Upload-Offset') or upload.is_complete:
+                return tus_response(status.HTTP_409_CONFLICT, {'Upload-Offset': str(upload.offset)})
+            try:
+                written = write_chunk(upload, request.stream or io.BytesIO(), checksum)
+            except ChecksumMismatch:
+                return tus_response(HTTP_460_CHECKSUM_MISMATCH, {'Upload-Offset': str(upload.offset)})
+
+            upload.offset += written
+            upload.save(update_fields=['offset', 'updated_at'])
+            headers = {'Upload-Offset': str(upload.offset)}
+            if upload.is_complete:
+                headers['Video-Id'] = str(complete_upload(upload).id)
+            return tus_response(status.HTTP_204_NO_CONTENT, headers)
+        finally:
+            lock.release()
+
+    def delete(self, request, pk):
+        """
+        Cancels an upload and removes its partial file (tus termination).
+        """
+        error = check_tus_version(request)
+        if error:
+            return error
+        upload = get_object_or_404(VideoUpload, pk=pk, user=request.user)
+        remove_partial_file(upload)
+        upload.delete()
+        return tus_response(status.HTTP_204_NO_CONTENT)
@@ -0,0 +1,68 @@
+import hashlib
+import time
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.http import quote_etag
+
+CATALOG_VERSION_KEY = 'videos:catalog:version'
+
+
+def get_catalog_version():
+    """
+    Returns the current catalog version. The version starts at the
+    current timestamp and only grows, so ETags of an earlier version are
+    not reused after the cache was cleared. It is not a modification time.
+    """
+    version = cache.get(CATALOG_VERSION_KEY)
+    if version is None:
+        cache.add(CATALOG_VERSION_KEY, int(time.time()), None)
+        version = cache.get(CATALOG_VERSION_KEY)
+    return version
+
+
+def invalidate_catalog():
+    """
+    Bumps the catalog version, so every cached catalog page is stale.
+    Called after the commit, otherwise a concurrent request could cache
+    the old data under the new version.
+    """
+    # incr ist atomar, gleichzeitige Änderungen gehen nicht verloren
+    cache.add(CATALOG_VERSION_KEY, int(time.time()), None)
+    cache.incr(CATALOG_VERSION_KEY)
+
+
+def get_request_fingerprint(request):
+    """
+    Identifies everything in the request that changes the catalog response.
+    """
+    # Staff sieht auf Wunsch auch unfertige Videos, daher eigener Cache-Eintrag
+    key = f"{request.scheme}://{request.get_host()}{request.get_full_path()}|{request.user.is_staff}"
+    return hashlib.md5(key.encode()).hexdigest()
+
+
+def get_catalog_cache_key(version, request):
+    """
+    Returns the cache key of a catalog page for the given version.
+    """
+    return f"videos:catalog:{version}:{get_request_fingerprint(request)}"
+
+
+def get_catalog_etag(version, request):
+    """
+    Returns the ETag of a catalog page for the given version.
+    """
+    return quote_etag(f"{version:x}-{get_request_fingerprint(request)[:12]}")
+
+
+def get_cached_catalog(version, request):
+    """
+    Returns the cached catalog data or None.
+    """
+    return cache.get(get_catalog_cache_key(version, request))
+
+
+def set_cached_catalog(version, request, data):
+    """
+    Stores the serialized catalog data for the given version.
+    """
+    cache.set(get_catalog_cache_key(version, request), data, settings.VIDEO_CATALOG_CACHE_TIMEOUT)
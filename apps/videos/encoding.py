@@ -0,0 +1,75 @@
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from rq import get_current_job
+
+RATE_CONTROLS = ('bitrate', 'crf', 'capped_crf')
+PROFILE_DEFAULTS = {
+    'codec': 'libx264',
+    'preset': 'medium',
+    'tune': None,
+    'rate_control': 'bitrate',
+    'crf': 23,
+    'two_pass': False,
+    'gop': None,
+    'threads': 0,
+    'pix_fmt': 'yuv420p',
+}
+
+
+def get_encoding_profile(name=None):
+    """
+    Returns the encoding profile with the given name. Without a name the
+    profile of the queue the current job runs on is used, falling back to
+    VIDEO_ENCODING_PROFILE outside of a worker.
+    """
+    if name is None:
+        job = get_current_job()
+        queue_name = job.origin if job else None
+        name = settings.VIDEO_QUEUE_PROFILES.get(queue_name, settings.VIDEO_ENCODING_PROFILE)
+
+    if name not in settings.VIDEO_ENCODING_PROFILES:
+        raise ImproperlyConfigured(f"Unknown video encoding profile '{name}'.")
+    profile = {**PROFILE_DEFAULTS, **settings.VIDEO_ENCODING_PROFILES[name], 'name': name}
+
+    if profile['rate_control'] not in RATE_CONTROLS:
+        raise ImproperlyConfigured(f"Unknown rate control '{profile['rate_control']}' in profile '{name}'.")
+    # Ohne Keyframe auf jeder Segmentgrenze können HLS/DASH nicht sauber schneiden
+    profile['gop'] = profile['gop'] or settings.VIDEO_STREAM_SEGMENT_DURATION
+    if settings.VIDEO_STREAM_SEGMENT_DURATION % profile['gop']:
+        raise ImproperlyConfigured(
+            f"The GOP of profile '{name}' ({profile['gop']}s) must divide the stream "
+            f"segment duration ({settings.VIDEO_STREAM_SEGMENT_DURATION}s).")
+    return profile
+
+
+def is_two_pass(profile):
+    """
+    Two-pass encoding only applies to bitrate targeted encodes.
+    """
+    return profile['two_pass'] and profile['rate_control'] == 'bitrate'
+
+
+def build_video_codec_args(profile, bitrate, pass_number=None, passlog_file=None):
+    """
+    Returns the ffmpeg video encoder options of one output for a profile.
+    With capped CRF the bitrate of the rendition becomes the upper limit.
+    """
+    args = ["-c:v", profile['codec'], "-preset", profile['preset']]
+    if profile['tune']:
+        args += ["-tune", profile['tune']]
+
+    if profile['rate_control'] == 'crf':
+        args += ["-crf", str(profile['crf'])]
+    elif profile['rate_control'] == 'capped_crf':
+        args += ["-crf", str(profile['crf']), "-maxrate", f"{bitrate}k", "-bufsize", f"{bitrate * 2}k"]
+    else:
+        args += ["-b:v", f"{bitrate}k"]
+        if pass_number:
+            args += ["-pass", str(pass_number), "-passlogfile", passlog_file]
+
+    args += [
+        "-force_key_frames", f"expr:gte(t,n_forced*{profile['gop']})",
+        "-pix_fmt", profile['pix_fmt'],
+        "-threads", str(profile['threads']),
+    ]
+    return args
@@ -0,0 +1,68 @@
+from moviepy.video.io.ffmpeg_reader import ffmpeg_parse_infos
+
+# Bits pro Pixel und Frame, ab denen eine Quelle als "normal komplex" gilt
+REFERENCE_BITS_PER_PIXEL = 0.1
+MIN_COMPLEXITY_FACTOR = 0.6
+HIGH_FRAME_RATE = 40
+HIGH_FRAME_RATE_FACTOR = 1.5
+MIN_VIDEO_BITRATE = 200
+
+
+def probe_video(video_path):
+    """
+    Reads resolution, frame rate, duration, bitrate and audio presence
+    of a source file with the ffmpeg bundled for moviepy.
+    """
+    infos = ffmpeg_parse_infos(video_path)
+    width, height = infos.get('video_size') or (None, None)
+    return {
+        'width': width,
+        'height': height,
+        'fps': infos.get('video_fps'),
+        'duration': infos.get('duration'),
+        'bitrate': infos.get('video_bitrate') or infos.get('bitrate'),
+        'has_audio': infos.get('audio_found', False),
+    }
+
+
+def get_complexity_factor(probe):
+    """
+    Estimates how demanding the source is from its bits per pixel. Simple
+    content (slides, animation) gets less bitrate than the ladder default.
+    """
+    width, height, fps, bitrate = probe['width'], probe['height'], probe['fps'], probe['bitrate']
+    if not all((width, height, fps, bitrate)):
+        return 1.0
+    bits_per_pixel = bitrate * 1000 / (width * height * fps)
+    return max(MIN_COMPLEXITY_FACTOR, min(bits_per_pixel / REFERENCE_BITS_PER_PIXEL, 1.0))
+
+
+def scale_width(probe, height):
+    """
+    Returns the even width that keeps the aspect ratio of the source.
+    """
+    width = round(probe['width'] * height / probe['height'] / 2) * 2
+    return max(width, 2)
+
+
+def select_renditions(probe, ladder):
+    """
+    Chooses the renditions for a source: rungs above the source height are
+    skipped (the lowest rung is always kept), widths follow the source
+    aspect ratio and bitrates are tuned to frame rate and complexity.
+    """
+    if not probe.get('width') or not probe.get('height'):
+        return list(ladder)
+
+    rungs = [rung for rung in ladder if rung[2] <= probe['height']] or [ladder[0]]
+    complexity = get_complexity_factor(probe)
+    fps_factor = HIGH_FRAME_RATE_FACTOR if (probe['fps'] or 0) > HIGH_FRAME_RATE else 1.0
+
+    renditions = []
+    for resolution, _, height, bitrate in rungs:
+        bitrate = int(bitrate * fps_factor * complexity)
+        if probe['bitrate']:
+            # Mehr Bitrate als die Quelle selbst bringt keine Qualität
+            bitrate = min(bitrate, int(probe['bitrate']))
+        renditions.append((resolution, scale_width(probe, height), height, max(bitrate, MIN_VIDEO_BITRATE)))
+    return renditions
@@ -0,0 +1,282 @@
+import copy
+import json
+import math
+import os
+import random
+import tempfile
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext, setup_test_environment, teardown_test_environment
+from django.urls import reverse
+from django_redis import get_redis_connection
+from rest_framework_simplejwt.tokens import RefreshToken
+from apps.users.models import UserAccount
+from apps.videos.models import Video, VideoProgress
+from apps.videos.progress_buffer import FLUSH_SCHEDULED_KEY, get_key
+
+ENDPOINTS = ('list', 'detail', 'in_progress', 'save_progress')
+RESOLUTIONS = ('120p', '360p', '720p', '1080p')
+BENCH_CACHE_PREFIX = 'videoflix-bench'
+
+
+def parse_list(value, cast=str):
+    """
+    Parses a comma separated command line value.
+    """
+    return [cast(item.strip()) for item in value.split(',') if item.strip()]
+
+
+def percentile(values, percent):
+    """
+    Returns the nearest-rank percentile of a list of numbers.
+    """
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[max(math.ceil(percent / 100 * len(ordered)) - 1, 0)]
+
+
+def summarize(values, digits=2):
+    """
+    Reduces a list of measurements to mean, p50, p95, p99 and max.
+    """
+    if not values:
+        return None
+    return {
+        'mean': round(sum(values) / len(values), digits),
+        'p50': round(percentile(values, 50), digits),
+        'p95': round(percentile(values, 95), digits),
+        'p99': round(percentile(values, 99), digits),
+        'max': round(max(values), digits),
+    }
+
+
+class Command(BaseCommand):
+    """
+    Load benchmark for the hot API endpoints. Seeds a throwaway test database
+    with videos, users and progress rows, drives the endpoints through the
+    Django test client at several concurrency levels and reports latency
+    percentiles, queries per request and allocations as JSON.
+    """
+    help = 'Benchmarks the catalog, detail and progress endpoints against a seeded test database.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--videos', type=int, default=1000, help='Number of seeded videos.')
+        parser.add_argument('--users', type=int, default=100, help='Number of seeded users.')
+        parser.add_argument('--progress-per-user', type=int, default=30, help='VideoProgress rows per user.')
+        parser.add_argument('--requests', type=int, default=500, help='Requests per endpoint and concurrency level.')
+        parser.add_argument('--concurrency', default='1,8', help='Concurrent clients, comma separated.')
+        parser.add_argument('--endpoints', default=','.join(ENDPOINTS), help=f"Any of {', '.join(ENDPOINTS)}.")
+        parser.add_argument('--allocation-samples', type=int, default=50,
+                            help='Sequential requests per endpoint measured with tracemalloc.')
+        parser.add_argument('--write-behind', action='store_true',
+                            help='Buffer progress in Redis under the benchmark key prefix.')
+        parser.add_argument('--seed', type=int, default=42, help='Random seed for data and request order.')
+        parser.add_argument('--output', default=None, help='Write the JSON report to this file.')
+
+    def handle(self, *args, **options):
+        endpoints = parse_list(options['endpoints'])
+        if set(endpoints) - set(ENDPOINTS):
+            raise CommandError(f"Unknown endpoint(s): {', '.join(set(endpoints) - set(ENDPOINTS))}")
+        concurrency_levels = parse_list(options['concurrency'], int)
+        self.random = random.Random(options['seed'])
+
+        # Eigener Cache-Prefix, damit der Benchmark keine echten Katalogseiten
+        # verdrängt; der Progress-Buffer hängt ebenfalls an diesem Prefix
+        caches = copy.deepcopy(settings.CACHES)
+        caches['default']['KEY_PREFIX'] = BENCH_CACHE_PREFIX
+
+        setup_test_environment()
+        with tempfile.TemporaryDirectory(prefix='bench_api_') as directory, \
+                override_settings(CACHES=caches, VIDEO_PROGRESS_WRITE_BEHIND=options['write_behind'],
+                                  REQUEST_METRICS_ENABLED=False):
+            old_name = self.create_database(directory)
+            redis = get_redis_connection('default')
+            # Als wäre ein Flush schon geplant: kein Job landet in der echten Queue
+            redis.set(get_key(FLUSH_SCHEDULED_KEY), 1)
+            try:
+                self.stderr.write('Seeding benchmark data...')
+                self.seed(options['videos'], options['users'], options['progress_per_user'])
+                results = []
+                for endpoint in endpoints:
+                    allocations = self.measure_allocations(endpoint, options['allocation_samples'])
+                    for concurrency in concurrency_levels:
+                        self.stderr.write(f"{endpoint}, x{concurrency}...")
+                        result = self.run_load(endpoint, options['requests'], concurrency)
+                        result['allocated_kb'] = allocations
+                        results.append(result)
+            finally:
+                for key in redis.scan_iter(f"{BENCH_CACHE_PREFIX}:*"):
+                    redis.delete(key)
+                connection.creation.destroy_test_db(old_name, verbosity=0)
+                teardown_test_environment()
+
+        report = json.dumps({
+            'dataset': {
+                'videos': options['videos'],
+                'users': options['users'],
+                'progress_per_user': options['progress_per_user'],
+                'database': connection.vendor,
+                'write_behind': options['write_behind'],
+            },
+            'results': results,
+        }, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as output_file:
+                output_file.write(report)
+        else:
+            self.stdout.write(report)
+
+    def create_database(self, directory):
+        """
+        Creates the test database. SQLite gets a file instead of the shared
+        in-memory database, so concurrent clients lock like in production.
+        """
+        if connection.vendor == 'sqlite':
+            connection.settings_dict['TEST']['NAME'] = os.path.join(directory, 'bench.sqlite3')
+        return connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+
+    def seed(self, video_count, user_count, progress_per_user):
+        """
+        Seeds ready videos with full manifests, users and progress rows.
+        """
+        categories = [choice for choice, _ in Video.CATEGORY_CHOICES]
+        Video.objects.bulk_create(
+            [
+                Video(
+                    title=f"Benchmark Video {index}",
+                    description="Synthetic video for the API benchmark. " * 5,
+                    category=categories[index % len(categories)],
+                    video_file=f"videos/bench_{index}.mp4",
+                    thumbnail=f"thumbnails/bench_{index}.jpg",
+                    status=Video.STATUS_READY,
+                    media_manifest=self.build_manifest(index),
+                )
+                for index in range(video_count)
+            ],
+            batch_size=500,
+        )
+        self.video_ids = list(Video.objects.values_list('id', flat=True))
+
+        # Einmal hashen reicht, alle Benchmark-User teilen sich das Passwort
+        password = make_password('benchmark')
+        UserAccount.objects.bulk_create(
+            [UserAccount(email=f"bench{index}@example.com", password=password) for index in range(user_count)],
+            batch_size=500,
+        )
+        users = list(UserAccount.objects.all())
+        self.tokens = [str(RefreshToken.for_user(user).access_token) for user in users]
+
+        VideoProgress.objects.bulk_create(
+            [
+                VideoProgress(user=user, video_id=video_id, started=True,
+                              completed=self.random.random() < 0.2,
+                              last_position=round(self.random.uniform(0, 3600), 2))
+                for user in users
+                for video_id in self.random.sample(self.video_ids, min(progress_per_user, len(self.video_ids)))
+            ],
+            batch_size=1000,
+        )
+
+    def build_manifest(self, index):
+        """
+        Returns a manifest like the one the processing pipeline writes.
+        """
+        renditions = [
+            {'resolution': resolution, 'path': f"videos/{index}/bench_{index}_{resolution}.mp4",
+             'width': None, 'height': int(resolution[:-1]), 'bitrate': None, 'size': None, 'duration': 600.0}
+            for resolution in RESOLUTIONS
+        ]
+        return {'renditions': renditions, 'hls': f"videos/{index}/hls/master.m3u8"}
+
+    def build_request(self, endpoint):
+        """
+        Returns (method, url, data, token) for a random request to the endpoint.
+        """
+        token = self.random.choice(self.tokens)
+        video_id = self.random.choice(self.video_ids)
+        if endpoint == 'list':
+            category = self.random.choice([None] + [choice for choice, _ in Video.CATEGORY_CHOICES])
+            url = reverse('video-list') + (f"?category={category}" if category else '')
+            return 'get', url, None, token
+        if endpoint == 'detail':
+            return 'get', reverse('video-detail', args=[video_id]), None, token
+        if endpoint == 'in_progress':
+            return 'get', reverse('video-progress-in-progress'), None, token
+        position = round(self.random.uniform(0, 3600), 2)
+        return 'post', reverse('video-progress-save-progress', args=[video_id]), {'last_position': position}, token
+
+    def send(self, client, request):
+        """
+        Sends one request and returns its latency in ms, query count and status code.
+        """
+        method, url, data, token = request
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            response = getattr(client, method)(url, data=data, content_type='application/json',
+                                               HTTP_AUTHORIZATION=f"Bearer {token}")
+            latency = (time.perf_counter() - started) * 1000
+        return latency, len(queries), response.status_code
+
+    def run_load(self, endpoint, request_count, concurrency):
+        """
+        Sends the requests from `concurrency` threads, each with its own client.
+        """
+        requests = [self.build_request(endpoint) for _ in range(request_count)]
+        batches = [requests[index::concurrency] for index in range(concurrency)]
+        start_barrier = threading.Barrier(concurrency)
+
+        def worker(batch):
+            client = Client()
+            start_barrier.wait()
+            try:
+                return [self.send(client, request) for request in batch]
+            finally:
+                connections.close_all()
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            samples = [sample for batch in executor.map(worker, batches) for sample in batch]
+        wall_time = time.perf_counter() - started
+
+        latencies = [latency for latency, _, _ in samples]
+        return {
+            'endpoint': endpoint,
+            'concurrency': concurrency,
+            'requests': len(samples),
+            'errors': sum(1 for _, _, status_code in samples if status_code >= 400),
+            'throughput_rps': round(len(samples) / wall_time, 1),
+            'latency_ms': summarize(latencies),
+            'queries': summarize([query_count for _, query_count, _ in samples]),
+        }
+
+    def measure_allocations(self, endpoint, sample_count):
+        """
+        Measures the memory allocated per request with tracemalloc. Runs
+        sequentially and separate from the load run, as tracing slows every
+        request down and cannot attribute allocations across threads.
+        """
+        if not sample_count:
+            return None
+        client = Client()
+        self.send(client, self.build_request(endpoint))  # Aufwärmen, z.B. Cache und Imports
+
+        allocated = []
+        tracemalloc.start()
+        try:
+            for _ in range(sample_count):
+                tracemalloc.reset_peak()
+                baseline, _ = tracemalloc.get_traced_memory()
+                self.send(client, self.build_request(endpoint))
+                _, peak = tracemalloc.get_traced_memory()
+                allocated.append((peak - baseline) / 1024)
+        finally:
+            tracemalloc.stop()
+        return summarize(allocated, digits=1)
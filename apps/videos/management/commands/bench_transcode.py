@@ -0,0 +1,226 @@
+import contextlib
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import psutil
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from apps.videos.encoding import get_encoding_profile
+from apps.videos.storage import LocalMediaStorage
+from apps.videos.tasks import (build_outputs, convert_video_renditions, create_thumbnails, encode_video, get_renditions,
+                               get_rendition_target, get_stream_directory, hash_file)
+from apps.videos.trickplay import TRICKPLAY_DIRECTORY
+
+MODES = ('single_pass', 'parallel', 'chunked')
+RSS_SAMPLE_INTERVAL = 0.1  # Sekunden
+
+
+def parse_list(value, cast=str):
+    """
+    Parses a comma separated command line value.
+    """
+    return [cast(item.strip()) for item in value.split(',') if item.strip()]
+
+
+class PeakRSSSampler(threading.Thread):
+    """
+    Samples the summed RSS of this process and all its children (the ffmpeg
+    processes) and keeps the peak.
+    """
+
+    def __init__(self):
+        super().__init__(daemon=True)
+        self.process = psutil.Process()
+        self.peak = 0
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.is_set():
+            self.peak = max(self.peak, self.sample())
+            self.stopped.wait(RSS_SAMPLE_INTERVAL)
+
+    def sample(self):
+        rss = self.process.memory_info().rss
+        for child in self.process.children(recursive=True):
+            with contextlib.suppress(psutil.Error):
+                rss += child.memory_info().rss
+        return rss
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+        return self.peak
+
+
+class Command(BaseCommand):
+    """
+    Benchmarks the transcoding pipeline with synthetic testsrc sources and
+    prints wall time, CPU time, realtime factor, peak RSS and output sizes
+    as JSON.
+    """
+    help = 'Benchmarks the video transcoding pipeline with synthetic sources.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--durations', default='10,60', help='Source lengths in seconds.')
+        parser.add_argument('--resolutions', default='480,1080', help='Source heights (16:9).')
+        parser.add_argument('--fps', type=int, default=25, help='Frame rate of the sources.')
+        parser.add_argument('--pattern', default='testsrc2', help='lavfi source (testsrc, testsrc2, ...).')
+        parser.add_argument('--profiles', default=None,
+                            help='Encoding profiles, defaults to all of VIDEO_ENCODING_PROFILES.')
+        parser.add_argument('--modes', default='single_pass', help=f"Any of {', '.join(MODES)}.")
+        parser.add_argument('--concurrency', default='1', help='Number of sources encoded at the same time.')
+        parser.add_argument('--output', default=None, help='Write the JSON report to this file.')
+        parser.add_argument('--work-dir', default=None, help='Directory for sources and outputs.')
+
+    def handle(self, *args, **options):
+        durations = parse_list(options['durations'], int)
+        heights = parse_list(options['resolutions'], int)
+        profiles = parse_list(options['profiles']) if options['profiles'] else list(settings.VIDEO_ENCODING_PROFILES)
+        modes = parse_list(options['modes'])
+        concurrency_levels = parse_list(options['concurrency'], int)
+        if set(modes) - set(MODES):
+            raise CommandError(f"Unknown mode(s): {', '.join(set(modes) - set(MODES))}")
+        if shutil.which('ffmpeg') is None:
+            raise CommandError('ffmpeg was not found on the PATH.')
+
+        work_directory = tempfile.mkdtemp(prefix='bench_transcode_', dir=options['work_dir'])
+        results = []
+        try:
+            for duration in durations:
+                for height in heights:
+                    source = self.generate_source(work_directory, duration, height, options['fps'], options['pattern'])
+                    for profile_name in profiles:
+                        profile = get_encoding_profile(profile_name)
+                        for mode in modes:
+                            for concurrency in concurrency_levels:
+                                self.stderr.write(f"{duration}s {height}p, {profile_name}, {mode}, x{concurrency}...")
+                                results.append(self.benchmark(source, duration, height, profile, mode, concurrency))
+        finally:
+            shutil.rmtree(work_directory, ignore_errors=True)
+
+        report = json.dumps({'environment': self.get_environment(), 'results': results}, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as output_file:
+                output_file.write(report)
+        else:
+            self.stdout.write(report)
+
+    def generate_source(self, work_directory, duration, height, fps, pattern):
+        """
+        Renders a synthetic source with test pattern and sine tone.
+        """
+        width = round(height * 16 / 9 / 2) * 2
+        source = os.path.join(work_directory, f'source_{duration}s_{height}p.mp4')
+        cmd = [
+            "ffmpeg", "-y", "-loglevel", "error",
+            "-f", "lavfi", "-i", f"{pattern}=duration={duration}:size={width}x{height}:rate={fps}",
+            "-f", "lavfi", "-i", f"sine=frequency=440:duration={duration}",
+            "-c:v", "libx264", "-preset", "ultrafast", "-pix_fmt", "yuv420p",
+            "-c:a", "aac", "-shortest", source,
+        ]
+        subprocess.run(cmd, check=True)
+        return source
+
+    def benchmark(self, source, duration, height, profile, mode, concurrency):
+        """
+        Runs the pipeline for `concurrency` copies of the source at once and
+        measures the whole batch.
+        """
+        run_directory = tempfile.mkdtemp(prefix=f"{profile['name']}_{mode}_", dir=os.path.dirname(source))
+        copies = []
+        for index in range(concurrency):
+            copy_directory = os.path.join(run_directory, str(index))
+            os.makedirs(copy_directory)
+            copies.append(shutil.copy(source, copy_directory))
+
+        process = psutil.Process()
+        cpu_before = process.cpu_times()
+        sampler = PeakRSSSampler()
+        sampler.start()
+        started = time.perf_counter()
+        try:
+            # Ausgaben der Pipeline gehen nach stderr, der JSON-Report bleibt sauber
+            with contextlib.redirect_stdout(sys.stderr):
+                with ThreadPoolExecutor(max_workers=concurrency) as executor:
+                    renditions = list(executor.map(lambda path: self.run_pipeline(path, profile, mode), copies))[0]
+            wall_time = time.perf_counter() - started
+        finally:
+            peak_rss = sampler.stop()
+        cpu_after = process.cpu_times()
+        # children_* enthält die beendeten ffmpeg-Prozesse
+        cpu_time = sum(
+            getattr(cpu_after, field) - getattr(cpu_before, field)
+            for field in ('user', 'system', 'children_user', 'children_system')
+        )
+
+        result = {
+            'source': {'duration': duration, 'height': height},
+            'profile': profile['name'],
+            'mode': mode,
+            'concurrency': concurrency,
+            'renditions': [resolution for resolution, _, _, _ in renditions],
+            'wall_time': round(wall_time, 3),
+            'cpu_time': round(cpu_time, 3),
+            'realtime_factor': round(duration * concurrency / wall_time, 2),
+            'peak_rss_mb': round(peak_rss / 1024 ** 2, 1),
+            'output_bytes': self.get_output_sizes(copies[0], renditions),
+        }
+        shutil.rmtree(run_directory, ignore_errors=True)
+        return result
+
+    def run_pipeline(self, video_path, profile, mode):
+        """
+        Runs one source through the steps of process_video (hash,
+        thumbnails, encode with the seek preview tap, packaging and sprite
+        sheets) without touching the database or MEDIA_ROOT. The parallel
+        mode encodes every rendition on its own like the convert_video jobs.
+        """
+        # Thumbnails und Vorschauen landen neben der Kopie der Quelle
+        storage = LocalMediaStorage(os.path.dirname(video_path))
+        hash_file(video_path)
+        create_thumbnails(video_path, None, None, storage)
+        renditions = get_renditions(video_path)
+        if mode == 'parallel':
+            with ThreadPoolExecutor(max_workers=len(renditions)) as executor:
+                list(executor.map(lambda rendition: convert_video_renditions(video_path, [rendition], profile=profile),
+                                  renditions))
+        else:
+            encode_video(video_path, renditions, profile=profile, mode=mode)
+        build_outputs(video_path, None, renditions, storage)
+        return renditions
+
+    def get_output_sizes(self, video_path, renditions):
+        """
+        Returns the size of every rendition, streaming package and the seek
+        previews in bytes.
+        """
+        sizes = {
+            resolution: os.path.getsize(get_rendition_target(video_path, resolution))
+            for resolution, _, _, _ in renditions
+        }
+        for output_name in [*settings.VIDEO_STREAMING_FORMATS, TRICKPLAY_DIRECTORY]:
+            directory = get_stream_directory(video_path, output_name)
+            sizes[output_name] = sum(
+                os.path.getsize(os.path.join(root, file))
+                for root, _, files in os.walk(directory) for file in files
+            )
+        return sizes
+
+    def get_environment(self):
+        """
+        Describes the machine, so reports of different hosts can be told apart.
+        """
+        version = subprocess.run(["ffmpeg", "-version"], capture_output=True, text=True).stdout.split('\n')[0]
+        return {
+            'cpu_count': os.cpu_count(),
+            'memory_mb': round(psutil.virtual_memory().total / 1024 ** 2),
+            'ffmpeg': version,
+            'streaming_formats': settings.VIDEO_STREAMING_FORMATS,
+            'adaptive_ladder': settings.VIDEO_ADAPTIVE_LADDER,
+        }
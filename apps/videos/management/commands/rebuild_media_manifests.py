@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand, CommandError
+from apps.videos.models import Video
+from apps.videos.storage import LocalMediaStorage, get_media_storage
+from apps.videos.tasks import RENDITIONS, build_media_manifest, save_media_manifest
+
+
+class Command(BaseCommand):
+    """
+    Backfills media_manifest for videos that were processed before the
+    manifest existed. The renditions and streaming manifests are read from
+    the files already stored under MEDIA_ROOT/videos/<id>/.
+    """
+    help = 'Rebuilds the media manifest of processed videos from their stored files.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true',
+                            help='Rebuild every manifest, not only the empty ones.')
+        parser.add_argument('--dry-run', action='store_true', help='Only report what would be written.')
+
+    def handle(self, *args, **options):
+        storage = get_media_storage()
+        if not isinstance(storage, LocalMediaStorage):
+            raise CommandError("Manifests can only be rebuilt from the local media storage.")
+
+        videos = Video.objects.exclude(video_file='').exclude(video_file__isnull=True).order_by('id')
+        if not options['all']:
+            videos = videos.filter(media_manifest={})
+
+        rebuilt = skipped = 0
+        for video in videos.iterator():
+            manifest = build_media_manifest(video.video_file.path, video.id, RENDITIONS, storage)
+            if not manifest['renditions']:
+                self.stderr.write(f"Video {video.id}: no renditions found, skipped")
+                skipped += 1
+                continue
+            if not options['dry_run']:
+                save_media_manifest(video.id, manifest)
+            self.stdout.write(f"Video {video.id}: {len(manifest['renditions'])} renditions"
+                              f"{', hls' if 'hls' in manifest else ''}{', dash' if 'dash' in manifest else ''}")
+            rebuilt += 1
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {rebuilt} manifests, skipped {skipped}."))
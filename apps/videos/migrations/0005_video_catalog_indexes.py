@@ -0,0 +1,25 @@
+# Generated by Django 5.1.4 on 2026-10-18 18:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('videos', '0004_alter_videoprogress_last_position'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='video',
+            index=models.Index(fields=['-created_at', '-id'], name='video_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='video',
+            index=models.Index(fields=['category', '-created_at', '-id'], name='video_category_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='video',
+            index=models.Index(fields=['new', '-created_at', '-id'], name='video_new_created_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.4 on 2026-10-18 18:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('videos', '0005_video_catalog_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='video',
+            name='media_manifest',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.1.4 on 2026-10-18 18:08
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def remove_duplicate_progress(apps, schema_editor):
+    """
+    Keeps only the most recently updated progress row per user and video.
+    """
+    VideoProgress = apps.get_model('videos', 'VideoProgress')
+    seen = set()
+    duplicate_ids = []
+    for progress in VideoProgress.objects.order_by('user_id', 'video_id', '-updated_at', '-id').iterator():
+        key = (progress.user_id, progress.video_id)
+        if key in seen:
+            duplicate_ids.append(progress.id)
+        else:
+            seen.add(key)
+    VideoProgress.objects.filter(id__in=duplicate_ids).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('videos', '0006_video_media_manifest'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicate_progress, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='videoprogress',
+            constraint=models.UniqueConstraint(fields=('user', 'video'), name='unique_video_progress_per_user'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.1.4 on 2026-10-18 18:10
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('videos', '0007_videoprogress_unique_user_video'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='videoprogress',
+            options={'ordering': ['-updated_at']},
+        ),
+        migrations.AddIndex(
+            model_name='videoprogress',
+            index=models.Index(condition=models.Q(('started', True)), fields=['user', 'completed', '-updated_at'], name='progress_continue_watching_idx'),
+        ),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 5.1.4 on 2026-10-18 18:12
+
+from django.db import migrations, models
+
+
+def mark_existing_videos_ready(apps, schema_editor):
+    """
+    Videos uploaded before the status field existed have already been processed.
+    """
+    Video = apps.get_model('videos', 'Video')
+    Video.objects.exclude(video_file='').exclude(video_file__isnull=True).update(status='ready')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('videos', '0008_videoprogress_continue_watching_index'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='video',
+            name='video_created_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='video',
+            name='video_category_created_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='video',
+            name='video_new_created_idx',
+        ),
+        migrations.AddField(
+            model_name='video',
+            name='status',
+            field=models.CharField(choices=[('uploaded', 'Uploaded'), ('transcoding', 'Transcoding'), ('ready', 'Ready'), ('failed', 'Failed')], default='uploaded', max_length=16),
+        ),
+        migrations.RunPython(mark_existing_videos_ready, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='video',
+            index=models.Index(fields=['status', '-created_at', '-id'], name='video_status_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='video',
+            index=models.Index(fields=['status', 'category', '-created_at', '-id'], name='video_status_category_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='video',
+            index=models.Index(fields=['status', 'new', '-created_at', '-id'], name='video_status_new_idx'),
+        ),
+    ]
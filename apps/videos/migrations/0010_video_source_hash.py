@@ -0,0 +1,18 @@
+# Generated by Django 5.1.4 on 2026-10-18 18:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('videos', '0009_video_status'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='video',
+            name='source_hash',
+            field=models.CharField(blank=True, db_index=True, max_length=64),
+        ),
+    ]
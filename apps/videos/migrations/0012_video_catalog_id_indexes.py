@@ -0,0 +1,37 @@
+# Generated by Django 5.1.4 on 2026-10-18 19:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('videos', '0011_videoupload'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='video',
+            name='video_status_created_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='video',
+            name='video_status_category_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='video',
+            name='video_status_new_idx',
+        ),
+        migrations.AddIndex(
+            model_name='video',
+            index=models.Index(fields=['status', '-id'], name='video_status_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='video',
+            index=models.Index(fields=['status', 'category', '-id'], name='video_status_category_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='video',
+            index=models.Index(fields=['status', 'new', '-id'], name='video_status_new_id_idx'),
+        ),
+    ]
@@ -1,3 +1,6 @@
+import os
+import uuid
+from django.conf import settings
 from django.db import models
 from datetime import date
 from apps.users.models import UserAccount
@@ -9,6 +12,16 @@ class Video(models.Model):
         ('drama', 'Drama'),
         ('romance', 'Romance'),
     ]
+    STATUS_UPLOADED = 'uploaded'
+    STATUS_TRANSCODING = 'transcoding'
+    STATUS_READY = 'ready'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_UPLOADED, 'Uploaded'),
+        (STATUS_TRANSCODING, 'Transcoding'),
+        (STATUS_READY, 'Ready'),
+        (STATUS_FAILED, 'Failed'),
+    ]
         
     created_at = models.DateField(default=date.today)
     title = models.CharField(max_length=100)
@@ -17,6 +30,19 @@ class Video(models.Model):
     thumbnail = models.ImageField(upload_to='thumbnails', blank=False, null=True)
     category = models.CharField(max_length=16, choices=CATEGORY_CHOICES, default='new')
     new = models.BooleanField(default=True)
+    status = models.CharField(max_length=16, choices=STATUS_CHOICES, default=STATUS_UPLOADED)
+    # Von process_video geschrieben: Renditions, HLS/DASH-Manifeste
+    media_manifest = models.JSONField(default=dict, blank=True)
+    # SHA-256 der Quelldatei, gleiche Uploads übernehmen vorhandene Renditions
+    source_hash = models.CharField(max_length=64, blank=True, db_index=True)
+
+    class Meta:
+        indexes = [
+            # Passend zur Cursor-Pagination nach -id
+            models.Index(fields=['status', '-id'], name='video_status_id_idx'),
+            models.Index(fields=['status', 'category', '-id'], name='video_status_category_id_idx'),
+            models.Index(fields=['status', 'new', '-id'], name='video_status_new_id_idx'),
+        ]
 
     def __str__(self):
         return self.title
@@ -30,5 +56,45 @@ class VideoProgress(models.Model):
     completed = models.BooleanField(default=False)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        ordering = ['-updated_at']
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'video'], name='unique_video_progress_per_user'),
+        ]
+        indexes = [
+            # "Weiterschauen": nur begonnene Videos, neueste zuerst
+            models.Index(fields=['user', 'completed', '-updated_at'], condition=models.Q(started=True),
+                         name='progress_continue_watching_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.user.email} - {self.video.title} - {self.last_position}"
+
+
+class VideoUpload(models.Model):
+    """
+    A resumable upload. Chunks are appended to a partial file until
+    upload_length bytes have arrived, then the video is created.
+    """
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(UserAccount, on_delete=models.CASCADE, related_name='video_uploads')
+    title = models.CharField(max_length=100)
+    description = models.TextField(max_length=500)
+    category = models.CharField(max_length=16, choices=Video.CATEGORY_CHOICES)
+    filename = models.CharField(max_length=255)
+    upload_length = models.BigIntegerField()
+    offset = models.BigIntegerField(default=0)
+    video = models.OneToOneField(Video, on_delete=models.SET_NULL, null=True, blank=True, related_name='upload')
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    @property
+    def partial_path(self):
+        return os.path.join(settings.MEDIA_ROOT, 'uploads', f'{self.id}.part')
+
+    @property
+    def is_complete(self):
+        return self.offset >= self.upload_length
+
     def __str__(self):
-        return f"{self.user.email} - {self.video.title} - {self.last_position}"
\ No newline at end of file
+        return f"{self.filename} ({self.offset}/{self.upload_length})"
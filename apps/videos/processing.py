@@ -0,0 +1,113 @@
+import json
+import time
+from django_redis import get_redis_connection
+
+PROCESSING_STATUS_KEY = 'videoflix:processing:{video_id}'
+PROCESSING_STATUS_TIMEOUT = 60 * 60 * 24  # 1 Tag
+
+
+def set_processing_stage(video_id, stage, error=None):
+    """
+    Publishes the current processing stage of a video.
+    """
+    status = {'stage': stage, 'updated_at': time.time()}
+    if error:
+        status['error'] = error
+    publish_status(video_id, {'stage': status})
+
+
+def set_rendition_progress(video_id, resolutions, progress):
+    """
+    Publishes the encoding progress of one or several renditions.
+    """
+    entry = json.dumps({**progress, 'updated_at': time.time()})
+    publish_status(video_id, {f'rendition:{resolution}': entry for resolution in resolutions}, encoded=True)
+
+
+def publish_status(video_id, fields, encoded=False):
+    """
+    Writes status fields to the Redis hash of the video.
+    """
+    if not encoded:
+        fields = {name: json.dumps(value) for name, value in fields.items()}
+    key = PROCESSING_STATUS_KEY.format(video_id=video_id)
+    connection = get_redis_connection('default')
+    with connection.pipeline() as pipeline:
+        pipeline.hset(key, mapping=fields)
+        pipeline.expire(key, PROCESSING_STATUS_TIMEOUT)
+        pipeline.execute()
+
+
+def get_processing_status(video_id):
+    """
+    Returns the published processing status of a video, or None.
+    """
+    connection = get_redis_connection('default')
+    fields = connection.hgetall(PROCESSING_STATUS_KEY.format(video_id=video_id))
+    if not fields:
+        return None
+
+    status = {'stage': None, 'renditions': {}}
+    for name, value in fields.items():
+        name, value = name.decode(), json.loads(value)
+        if name == 'stage':
+            status['stage'] = value.pop('stage')
+            status.update(value)
+        elif name.startswith('rendition:'):
+            status['renditions'][name.split(':', 1)[1]] = value
+    return status
+
+
+def parse_ffmpeg_progress(lines, duration=None):
+    """
+    Turns the key=value lines of "ffmpeg -progress" into one dict per
+    report with percent, fps, speed and ETA in seconds.
+    """
+    block = {}
+    for line in lines:
+        key, _, value = line.strip().partition('=')
+        if not key:
+            continue
+        block[key] = value.strip()
+        if key != 'progress':
+            continue
+
+        yield build_progress_report(block, duration)
+        block = {}
+
+
+def build_progress_report(block, duration):
+    """
+    Builds a progress report from one block of ffmpeg -progress output.
+    """
+    # out_time_ms enthält bei ffmpeg trotz des Namens Mikrosekunden
+    out_time_us = block.get('out_time_us') or block.get('out_time_ms') or '0'
+    position = max(int(out_time_us) if out_time_us.lstrip('-').isdigit() else 0, 0) / 1_000_000
+    speed = parse_float(block.get('speed', '').rstrip('x'))
+    finished = block.get('progress') == 'end'
+
+    report = {
+        'state': 'done' if finished else 'running',
+        'position': round(position, 2),
+        'fps': parse_float(block.get('fps')),
+        'speed': speed,
+        'percent': None,
+        'eta': None,
+    }
+    if finished:
+        report.update(percent=100.0, eta=0)
+    elif duration:
+        report['percent'] = round(min(position / duration * 100, 100), 1)
+        if speed:
+            report['eta'] = round(max(duration - position, 0) / speed)
+    return report
+
+
+def parse_float(value):
+    """
+    Parses a float from ffmpeg output, returning None for "N/A" and the like.
+    """
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
@@ -0,0 +1,189 @@
+import logging
+from datetime import timedelta
+from decimal import Decimal
+from django.conf import settings
+from django.utils import timezone
+from django_redis import get_redis_connection
+from redis.exceptions import ResponseError
+from apps.users.models import UserAccount
+from apps.videos.models import Video, VideoProgress
+from apps.videos.queues import MAINTENANCE_QUEUE, get_queue
+from videoflix_backend.jobs import instrument_job
+
+logger = logging.getLogger(__name__)
+
+# {prefix} ist der KEY_PREFIX des Caches, Tests und Benchmark haben eigene Buffer
+BUFFER_KEY = '{prefix}:progress:buffer:{user_id}'
+FLUSHING_KEY = '{prefix}:progress:flushing:{user_id}'
+DIRTY_USERS_KEY = '{prefix}:progress:dirty'
+FLUSHING_USERS_KEY = '{prefix}:progress:flushing-users'
+FLUSH_SCHEDULED_KEY = '{prefix}:progress:flush-scheduled'
+FLUSH_BATCH_SIZE = 500
+CONTINUE_WATCHING_VIDEO_FIELDS = ('id', 'title', 'category', 'thumbnail')
+
+
+def get_key(template, **kwargs):
+    """
+    Builds a buffer key below the key prefix of the default cache.
+    """
+    return template.format(prefix=settings.CACHES['default']['KEY_PREFIX'], **kwargs)
+
+
+def buffer_progress(user_id, video_id, last_position):
+    """
+    Records the latest position of a video in Redis instead of the database
+    and makes sure a flush job is scheduled.
+    """
+    connection = get_redis_connection('default')
+    interval = settings.VIDEO_PROGRESS_FLUSH_INTERVAL
+
+    with connection.pipeline() as pipeline:
+        pipeline.hset(get_key(BUFFER_KEY, user_id=user_id), video_id, str(last_position))
+        pipeline.sadd(get_key(DIRTY_USERS_KEY), user_id)
+        pipeline.set(get_key(FLUSH_SCHEDULED_KEY), 1, nx=True, ex=interval)
+        _, _, flush_needed = pipeline.execute()
+
+    if flush_needed:
+        queue = get_queue(MAINTENANCE_QUEUE)
+        queue.enqueue_in(timedelta(seconds=interval), flush_progress_buffer)
+
+
+def get_buffered_progress(user_id):
+    """
+    Returns the buffered positions of a user as {video_id: position},
+    including the ones that are currently being flushed.
+    """
+    connection = get_redis_connection('default')
+    with connection.pipeline() as pipeline:
+        pipeline.hgetall(get_key(FLUSHING_KEY, user_id=user_id))
+        pipeline.hgetall(get_key(BUFFER_KEY, user_id=user_id))
+        flushing, buffered = pipeline.execute()
+
+    positions = {}
+    for entries in (flushing, buffered):
+        for video_id, position in entries.items():
+            positions[int(video_id)] = Decimal(position.decode())
+    return positions
+
+
+def apply_buffered_progress(user, progress_list):
+    """
+    Overlays the buffered positions on the progress rows of a user and
+    adds rows that have only been buffered so far.
+    """
+    positions = get_buffered_progress(user.id)
+    if not positions:
+        return progress_list
+
+    now = timezone.now()
+    for progress in progress_list:
+        if progress.video_id in positions:
+            progress.last_position = positions.pop(progress.video_id)
+            progress.updated_at = now
+
+    known_video_ids = set(VideoProgress.objects.filter(
+        user=user, video_id__in=positions).values_list('video_id', flat=True))
+    for video in Video.objects.filter(id__in=set(positions) - known_video_ids).only(*CONTINUE_WATCHING_VIDEO_FIELDS):
+        progress_list.append(VideoProgress(user=user, video=video, started=True,
+                                           last_position=positions[video.id], updated_at=now))
+    return progress_list
+
+
+def save_buffered_progress(entries):
+    """
+    Writes buffered positions ({(user_id, video_id): position}) to the
+    database with a single upsert.
+    """
+    # Inzwischen gelöschte Videos und Benutzer überspringen, sonst scheitert
+    # der ganze Batch am Foreign Key und landet immer wieder im Buffer
+    video_ids = set(Video.objects.filter(
+        id__in={video_id for _, video_id in entries}).values_list('id', flat=True))
+    user_ids = set(UserAccount.objects.filter(
+        id__in={user_id for user_id, _ in entries}).values_list('id', flat=True))
+    VideoProgress.objects.bulk_create(
+        [
+            VideoProgress(user_id=user_id, video_id=video_id, started=True, last_position=position)
+            for (user_id, video_id), position in entries.items()
+            if video_id in video_ids and user_id in user_ids
+        ],
+        update_conflicts=True,
+        unique_fields=['user', 'video'],
+        update_fields=['last_position', 'started', 'updated_at'],
+    )
+
+
+@instrument_job
+def flush_progress_buffer():
+    """
+    Periodic worker job that moves all buffered positions into the database.
+    Users whose flush was interrupted (e.g. the worker died) are flushed
+    again, their leftover entries are merged with the new ones.
+    """
+    connection = get_redis_connection('default')
+    connection.sunionstore(get_key(DIRTY_USERS_KEY), [get_key(DIRTY_USERS_KEY), get_key(FLUSHING_USERS_KEY)])
+    flushed = 0
+
+    while True:
+        user_ids = connection.spop(get_key(DIRTY_USERS_KEY), FLUSH_BATCH_SIZE)
+        if not user_ids:
+            break
+
+        entries = {}
+        flushing_keys = {}
+        for raw_user_id in user_ids:
+            user_id = int(raw_user_id)
+            flushing_key = get_key(FLUSHING_KEY, user_id=user_id)
+            connection.sadd(get_key(FLUSHING_USERS_KEY), user_id)
+            move_to_flushing_key(connection, get_key(BUFFER_KEY, user_id=user_id), flushing_key)
+            positions = connection.hgetall(flushing_key)
+            if not positions:
+                connection.srem(get_key(FLUSHING_USERS_KEY), user_id)
+                continue
+            flushing_keys[user_id] = flushing_key
+            for video_id, position in positions.items():
+                entries[(user_id, int(video_id))] = Decimal(position.decode())
+
+        try:
+            flushed += len(entries)
+            save_buffered_progress(entries)
+        except Exception:
+            restore_flushing_keys(connection, flushing_keys)
+            raise
+        if flushing_keys:
+            connection.delete(*flushing_keys.values())
+            connection.srem(get_key(FLUSHING_USERS_KEY), *flushing_keys)
+
+    logger.info("Flushed %s buffered progress entries", flushed)
+    return flushed
+
+
+def move_to_flushing_key(connection, buffer_key, flushing_key):
+    """
+    Moves the buffer of a user to its flushing key. New heartbeats go to a
+    fresh buffer from here on. Entries left by an interrupted flush are
+    kept, buffered positions are newer and win.
+    """
+    try:
+        if connection.renamenx(buffer_key, flushing_key):
+            return
+        merge_key = f"{flushing_key}:merge"
+        connection.rename(buffer_key, merge_key)
+    except ResponseError:
+        # Kein Buffer, nur der Rest eines abgebrochenen Flushs
+        return
+    connection.hset(flushing_key, mapping=connection.hgetall(merge_key))
+    connection.delete(merge_key)
+
+
+def restore_flushing_keys(connection, flushing_keys):
+    """
+    Puts entries back into the buffer after a failed flush. Positions that
+    arrived in the meantime are newer and win.
+    """
+    for user_id, flushing_key in flushing_keys.items():
+        buffer_key = get_key(BUFFER_KEY, user_id=user_id)
+        for video_id, position in connection.hgetall(flushing_key).items():
+            connection.hsetnx(buffer_key, video_id, position)
+        connection.delete(flushing_key)
+        connection.srem(get_key(FLUSHING_USERS_KEY), user_id)
+        connection.sadd(get_key(DIRTY_USERS_KEY), user_id)
@@ -0,0 +1,35 @@
+import os
+from django.conf import settings
+from moviepy.video.io.ffmpeg_reader import ffmpeg_parse_infos
+import django_rq
+
+TRANSCODE_HIGH_QUEUE = 'transcode-high'
+TRANSCODE_BULK_QUEUE = 'transcode-bulk'
+MAINTENANCE_QUEUE = 'maintenance'
+EMAIL_QUEUE = 'email'
+
+
+def get_queue(name):
+    """
+    Returns the RQ queue with the given name.
+    """
+    return django_rq.get_queue(name, autocommit=True)
+
+
+def select_transcode_queue(video_path):
+    """
+    Routes short, small sources to the high priority queue so they are not
+    stuck behind long uploads. Everything else, including sources that
+    cannot be probed, goes to the bulk queue.
+    """
+    try:
+        # Die Größe ist billig, erst danach wird ffmpeg gestartet
+        if os.path.getsize(video_path) > settings.VIDEO_PRIORITY_MAX_SIZE:
+            return TRANSCODE_BULK_QUEUE
+        duration = ffmpeg_parse_infos(video_path).get('duration')
+    except (IOError, OSError):
+        return TRANSCODE_BULK_QUEUE
+
+    if duration and duration <= settings.VIDEO_PRIORITY_MAX_DURATION:
+        return TRANSCODE_HIGH_QUEUE
+    return TRANSCODE_BULK_QUEUE
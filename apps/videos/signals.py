@@ -1,23 +1,48 @@
-from apps.videos.tasks import process_video, remove_video_files
+from functools import partial
+from apps.videos.tasks import process_video, remove_video_files, enqueue_parallel_processing
 from apps.videos.models import Video
+from apps.videos.cache import invalidate_catalog
+from apps.videos.queues import MAINTENANCE_QUEUE, get_queue, select_transcode_queue
+from django.conf import settings
+from django.db import transaction
 from django.dispatch import receiver
 from django.db.models.signals import post_save, post_delete
-import django_rq
+from rq import Retry
 
 @receiver(post_save, sender=Video)
 def handle_video_creation(sender, instance, created, **kwargs):
     """
-    Handles video processing after a new video is uploaded.
+    Handles video processing after a new video is uploaded
+    and invalidates the cached catalog on every change.
     """
+    transaction.on_commit(invalidate_catalog)
     if created and instance.video_file:
-        queue = django_rq.get_queue('default', autocommit=True)
-        queue.enqueue(process_video, instance.video_file.path, instance.id, instance.thumbnail.path)
+        # Über die Upload-API kommen Videos ohne Thumbnail
+        thumbnail_path = instance.thumbnail.path if instance.thumbnail else None
+        # Erst nach dem Commit: der Worker muss das Video schon sehen, und
+        # der ffmpeg-Probe soll die Admin-Transaktion nicht aufhalten
+        transaction.on_commit(partial(enqueue_video_processing, instance.video_file.path, instance.id, thumbnail_path))
+
+
+def enqueue_video_processing(video_path, video_id, thumbnail_path):
+    """
+    Enqueues the processing of a new video on the matching transcode queue.
+    """
+    queue = get_queue(select_transcode_queue(video_path))
+    if settings.VIDEO_PROCESSING_MODE == 'parallel':
+        enqueue_parallel_processing(queue, video_path, video_id, thumbnail_path)
+    else:
+        # Ein Retry überspringt bereits fertige Renditions
+        queue.enqueue(process_video, video_path, video_id, thumbnail_path,
+                      retry=Retry(max=settings.VIDEO_PROCESSING_RETRIES, interval=settings.VIDEO_RETRY_INTERVALS))
 
 @receiver(post_delete, sender=Video)
 def handle_video_deletion(sender, instance, **kwargs):
     """
-    Ensures that all associated files of a deleted video are removed.
+    Ensures that all associated files of a deleted video are removed
+    and invalidates the cached catalog.
     """
+    transaction.on_commit(invalidate_catalog)
     if instance.video_file:
-        queue = django_rq.get_queue('default', autocommit=True)
-        queue.enqueue(remove_video_files, instance.id)
+        # Bei einem Rollback bleiben die Dateien erhalten
+        transaction.on_commit(partial(get_queue(MAINTENANCE_QUEUE).enqueue, remove_video_files, instance.id))
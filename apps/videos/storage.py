@@ -0,0 +1,251 @@
+import contextlib
+import logging
+import os
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from apps.videos.streaming import guess_content_type
+
+logger = logging.getLogger(__name__)
+
+S3_DELETE_BATCH_SIZE = 1000
+
+
+class LocalMediaStorage:
+    """
+    Stores the processed media below MEDIA_ROOT. Names are relative to
+    MEDIA_ROOT, e.g. "videos/1/sample_360p.mp4".
+    """
+
+    def __init__(self, location=None):
+        self.location = location or settings.MEDIA_ROOT
+
+    def path(self, name):
+        """
+        Returns the absolute path of a stored file.
+        """
+        return os.path.join(self.location, name)
+
+    def exists(self, name):
+        return os.path.exists(self.path(name))
+
+    def has_prefix(self, prefix):
+        """
+        Checks whether anything is stored below the directory prefix.
+        """
+        directory = self.path(prefix)
+        return os.path.isdir(directory) and bool(os.listdir(directory))
+
+    def save_files(self, files):
+        """
+        Hardlinks local files into the storage, falling back to copies.
+        files is a list of (local path, name) tuples. Like in S3 the local
+        files are kept, the caller removes them once the outputs have been
+        recorded, so a retry still finds them.
+        """
+        for local_path, name in files:
+            target_path = self.path(name)
+            os.makedirs(os.path.dirname(target_path), exist_ok=True)
+            # Erst vollständig schreiben, dann atomar ersetzen (Retry überschreibt)
+            partial_path = f"{target_path}.part"
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(partial_path)
+            try:
+                os.link(local_path, partial_path)
+            except OSError:
+                shutil.copy2(local_path, partial_path)
+            os.replace(partial_path, target_path)
+            logger.debug("Stored %s as %s", local_path, target_path)
+
+    def copy_prefix(self, source_prefix, target_prefix):
+        """
+        Recreates a directory tree with hardlinks, falling back to copies.
+        """
+        source_directory = self.path(source_prefix)
+        for root, _, files in os.walk(source_directory):
+            target_root = os.path.join(self.path(target_prefix), os.path.relpath(root, source_directory))
+            os.makedirs(target_root, exist_ok=True)
+            for file in files:
+                target_path = os.path.join(target_root, file)
+                if os.path.exists(target_path):
+                    continue
+                try:
+                    os.link(os.path.join(root, file), target_path)
+                except OSError:
+                    shutil.copy2(os.path.join(root, file), target_path)
+
+    def delete_prefix(self, prefix):
+        """
+        Deletes everything whose name starts with prefix. A prefix ending
+        in "/" removes the whole directory.
+        """
+        directory, file_prefix = os.path.split(self.path(prefix))
+        if not os.path.isdir(directory):
+            return
+        if not file_prefix:
+            shutil.rmtree(directory)
+            return
+        for entry in os.listdir(directory):
+            if entry.startswith(file_prefix):
+                entry_path = os.path.join(directory, entry)
+                if os.path.isdir(entry_path):
+                    shutil.rmtree(entry_path)
+                else:
+                    os.remove(entry_path)
+
+
+class S3MediaStorage:
+    """
+    Stores the processed media in an S3-compatible bucket (AWS S3, MinIO,
+    ...). Large files are sent as parallel multipart uploads and several
+    files are uploaded at the same time.
+    """
+
+    def __init__(self, bucket, endpoint_url=None, region=None, access_key_id=None, secret_access_key=None,
+                 multipart_threshold=8 * 1024 * 1024, multipart_chunksize=8 * 1024 * 1024, max_concurrency=8):
+        try:
+            import boto3
+            from boto3.s3.transfer import TransferConfig
+            from botocore.config import Config
+        except ImportError as error:
+            raise ImproperlyConfigured("VIDEO_STORAGE_BACKEND 's3' requires boto3 (pip install boto3).") from error
+        if not bucket:
+            raise ImproperlyConfigured("VIDEO_STORAGE_S3_BUCKET must be set for the 's3' storage backend.")
+
+        self.bucket = bucket
+        self.max_concurrency = max_concurrency
+        # Ein Client für alle Threads, genug Verbindungen für Dateien x Parts
+        self.client = boto3.client(
+            's3', endpoint_url=endpoint_url, region_name=region, aws_access_key_id=access_key_id,
+            aws_secret_access_key=secret_access_key,
+            config=Config(max_pool_connections=max_concurrency * max_concurrency),
+        )
+        self.transfer_config = TransferConfig(
+            multipart_threshold=multipart_threshold,
+            multipart_chunksize=multipart_chunksize,
+            max_concurrency=max_concurrency,
+        )
+
+    def path(self, name):
+        """
+        Objects have no local path.
+        """
+        return None
+
+    def exists(self, name):
+        from botocore.exceptions import ClientError
+        try:
+            self.client.head_object(Bucket=self.bucket, Key=name)
+        except ClientError as error:
+            if error.response['Error']['Code'] in ('404', 'NoSuchKey', 'NotFound'):
+                return False
+            raise
+        return True
+
+    def has_prefix(self, prefix):
+        response = self.client.list_objects_v2(Bucket=self.bucket, Prefix=prefix, MaxKeys=1)
+        return response.get('KeyCount', 0) > 0
+
+    def list_keys(self, prefix):
+        """
+        Yields the keys of all objects whose name starts with prefix.
+        """
+        for page in self.client.get_paginator('list_objects_v2').paginate(Bucket=self.bucket, Prefix=prefix):
+            for item in page.get('Contents', []):
+                yield item['Key']
+
+    def save_files(self, files):
+        """
+        Uploads local files in parallel. files is a list of (local path,
+        name) tuples. The local files are kept, the caller removes them
+        once the upload has been recorded.
+        """
+        def upload(local_path, name):
+            self.client.upload_file(local_path, self.bucket, name, Config=self.transfer_config,
+                                    ExtraArgs={'ContentType': guess_content_type(name)})
+            logger.debug("Uploaded %s to s3://%s/%s", local_path, self.bucket, name)
+
+        with ThreadPoolExecutor(max_workers=self.max_concurrency) as executor:
+            for future in [executor.submit(upload, local_path, name) for local_path, name in files]:
+                future.result()
+
+    def copy_prefix(self, source_prefix, target_prefix):
+        """
+        Copies all objects below source_prefix on the server side.
+        """
+        def copy(key):
+            target_key = target_prefix + key[len(source_prefix):]
+            self.client.copy({'Bucket': self.bucket, 'Key': key}, self.bucket, target_key,
+                             Config=self.transfer_config)
+
+        with ThreadPoolExecutor(max_workers=self.max_concurrency) as executor:
+            for future in [executor.submit(copy, key) for key in self.list_keys(source_prefix)]:
+                future.result()
+
+    def delete_prefix(self, prefix):
+        """
+        Deletes all objects whose name starts with prefix.
+        """
+        keys = list(self.list_keys(prefix))
+        for start in range(0, len(keys), S3_DELETE_BATCH_SIZE):
+            batch = keys[start:start + S3_DELETE_BATCH_SIZE]
+            self.client.delete_objects(Bucket=self.bucket, Delete={
+                'Objects': [{'Key': key} for key in batch], 'Quiet': True})
+
+
+def get_media_storage():
+    """
+    Returns the storage configured in VIDEO_STORAGE_BACKEND. The instance
+    is shared, so the S3 client and its connection pool are only built
+    once per process.
+    """
+    return build_media_storage(settings.VIDEO_STORAGE_BACKEND)
+
+
+@lru_cache(maxsize=None)
+def build_media_storage(backend):
+    """
+    Builds the storage for a backend name, cached per backend.
+    """
+    if backend == 'local':
+        return LocalMediaStorage()
+    if backend == 's3':
+        return S3MediaStorage(
+            bucket=settings.VIDEO_STORAGE_S3_BUCKET,
+            endpoint_url=settings.VIDEO_STORAGE_S3_ENDPOINT_URL,
+            region=settings.VIDEO_STORAGE_S3_REGION,
+            access_key_id=settings.VIDEO_STORAGE_S3_ACCESS_KEY_ID,
+            secret_access_key=settings.VIDEO_STORAGE_S3_SECRET_ACCESS_KEY,
+            multipart_threshold=settings.VIDEO_STORAGE_S3_MULTIPART_THRESHOLD,
+            multipart_chunksize=settings.VIDEO_STORAGE_S3_MULTIPART_CHUNKSIZE,
+            max_concurrency=settings.VIDEO_STORAGE_S3_MAX_CONCURRENCY,
+        )
+    raise ImproperlyConfigured(f"Unknown VIDEO_STORAGE_BACKEND '{backend}'.")
+
+
+@receiver(setting_changed)
+def reset_media_storage(setting, **kwargs):
+    """
+    Drops the cached storage when a test overrides MEDIA_ROOT or one of
+    the VIDEO_STORAGE_* settings.
+    """
+    if setting == 'MEDIA_ROOT' or setting.startswith('VIDEO_STORAGE_'):
+        build_media_storage.cache_clear()
+
+
+def get_media_base_url():
+    """
+    Returns the URL the stored media names are appended to. Only depends
+    on the settings, so serializers do not need to build a storage client.
+    """
+    if settings.VIDEO_STORAGE_BACKEND != 's3':
+        return settings.MEDIA_URL
+    if settings.VIDEO_STORAGE_S3_PUBLIC_URL:
+        return settings.VIDEO_STORAGE_S3_PUBLIC_URL.rstrip('/') + '/'
+    if settings.VIDEO_STORAGE_S3_ENDPOINT_URL:
+        return f"{settings.VIDEO_STORAGE_S3_ENDPOINT_URL.rstrip('/')}/{settings.VIDEO_STORAGE_S3_BUCKET}/"
+    return f"https://{settings.VIDEO_STORAGE_S3_BUCKET}.s3.amazonaws.com/"
@@ -0,0 +1,148 @@
+import mimetypes
+import os
+import re
+import uuid
+from django.utils.http import http_date, quote_etag
+
+# Streaming-Formate, die mimetypes nicht überall kennt
+mimetypes.add_type('application/vnd.apple.mpegurl', '.m3u8')
+mimetypes.add_type('video/mp2t', '.ts')
+mimetypes.add_type('application/dash+xml', '.mpd')
+mimetypes.add_type('video/iso.segment', '.m4s')
+
+RANGE_RE = re.compile(r'^\s*(\d*)\s*-\s*(\d*)\s*$')
+MAX_RANGES = 16
+CHUNK_SIZE = 64 * 1024
+
+
+def guess_content_type(path):
+    """
+    Returns the content type of a media file based on its extension.
+    """
+    content_type, _ = mimetypes.guess_type(path)
+    return content_type or 'application/octet-stream'
+
+
+def file_etag(stat):
+    """
+    Builds a strong ETag from the size and modification time of a file.
+    """
+    return quote_etag(f"{stat.st_size:x}-{int(stat.st_mtime_ns):x}")
+
+
+def file_last_modified(stat):
+    """
+    Returns the Last-Modified header value of a file.
+    """
+    return http_date(stat.st_mtime)
+
+
+def parse_range_header(header, size):
+    """
+    Parses a "bytes=..." Range header into a list of (start, end) tuples
+    with inclusive ends. Returns None if the header should be ignored and
+    an empty list if none of the ranges can be satisfied.
+    """
+    unit, _, ranges_spec = header.partition('=')
+    if unit.strip().lower() != 'bytes' or not ranges_spec:
+        return None
+
+    specs = ranges_spec.split(',')
+    if len(specs) > MAX_RANGES:
+        return None
+
+    ranges = []
+    for spec in specs:
+        match = RANGE_RE.match(spec)
+        if not match:
+            return None
+        first, last = match.groups()
+        if not first and not last:
+            return None
+
+        if not first:
+            # Suffix-Range: die letzten N Bytes
+            length = int(last)
+            if length == 0:
+                continue
+            start, end = max(size - length, 0), size - 1
+        else:
+            start = int(first)
+            end = min(int(last), size - 1) if last else size - 1
+            if last and int(last) < start:
+                return None
+            if start >= size:
+                continue
+        ranges.append((start, end))
+    return ranges
+
+
+def iter_file_range(file, start, end):
+    """
+    Yields the bytes between start and end (inclusive) in chunks.
+    """
+    file.seek(start)
+    remaining = end - start + 1
+    while remaining > 0:
+        chunk = file.read(min(CHUNK_SIZE, remaining))
+        if not chunk:
+            break
+        remaining -= len(chunk)
+        yield chunk
+
+
+def build_multipart_ranges(file, ranges, content_type, size):
+    """
+    Prepares a multipart/byteranges body for several ranges.
+    Returns the boundary, the total content length and a generator.
+    """
+    boundary = uuid.uuid4().hex
+    headers = [
+        (f"--{boundary}\r\n"
+         f"Content-Type: {content_type}\r\n"
+         f"Content-Range: bytes {start}-{end}/{size}\r\n\r\n").encode()
+        for start, end in ranges
+    ]
+    closing = f"\r\n--{boundary}--\r\n".encode()
+    content_length = (
+        sum(len(header) for header in headers)
+        + sum(end - start + 1 for start, end in ranges)
+        + 2 * (len(ranges) - 1)
+        + len(closing)
+    )
+
+    def stream():
+        try:
+            for index, ((start, end), header) in enumerate(zip(ranges, headers)):
+                if index:
+                    yield b"\r\n"
+                yield header
+                yield from iter_file_range(file, start, end)
+            yield closing
+        finally:
+            file.close()
+
+    return boundary, content_length, stream()
+
+
+def iter_and_close(file, start, end):
+    """
+    Streams a single range and closes the file afterwards.
+    """
+    try:
+        yield from iter_file_range(file, start, end)
+    finally:
+        file.close()
+
+
+def offload_headers(path, media_root, mode, accel_prefix):
+    """
+    Returns the header that hands the file over to the web server
+    (nginx X-Accel-Redirect or Apache/lighttpd X-Sendfile).
+    """
+    if mode == 'nginx':
+        relative_path = os.path.relpath(path, media_root).replace(os.sep, '/')
+        return {'X-Accel-Redirect': f"{accel_prefix.rstrip('/')}/{relative_path}"}
+    if mode == 'sendfile':
+        return {'X-Sendfile': path}
+    return {}
@@ -1,39 +1,250 @@
+import contextlib
+import contextvars
+import hashlib
+import json
+import logging
 import os
 import shutil
 import subprocess
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from django.conf import settings
 from PIL import Image
+from rq import Retry, get_current_job
 from moviepy.video.io.VideoFileClip import VideoFileClip
+from moviepy.video.io.ffmpeg_reader import ffmpeg_parse_infos
+from apps.videos.models import Video
+from apps.videos.cache import invalidate_catalog
+from apps.videos.encoding import build_video_codec_args, get_encoding_profile, is_two_pass
+from apps.videos.ladder import probe_video, select_renditions
+from apps.videos.processing import set_processing_stage, set_rendition_progress, parse_ffmpeg_progress
+from apps.videos.storage import get_media_storage
+from apps.videos.thumbnails import build_poster_command, get_poster_offset, render_thumbnail_variants
+from apps.videos.trickplay import (TRICKPLAY_DIRECTORY, TRICKPLAY_VTT, build_trickplay_command,
+                                   build_trickplay_filter, get_trickplay_output_args, get_trickplay_size,
+                                   write_trickplay)
+from videoflix_backend.jobs import add_job_bytes, instrument_job, record_ffmpeg_run
 
+logger = logging.getLogger(__name__)
 
+HASH_CHUNK_SIZE = 1024 * 1024
+RENDITIONS = [
+    ("120p", 160, 120, 400),
+    ("360p", 640, 360, 1000),
+    ("720p", 1280, 720, 3000),
+    ("1080p", 1920, 1080, 5000),
+]
+
+
+@instrument_job
 def process_video(video_path, video_id, thumbnail_path):
     """
     Processes a video by compressing the thumbnail, 
     and converting it to different resolutions.
     """
-    print(f"Processing video {video_path} for ID {video_id}")  # Debugging
-    move_thumbnail(thumbnail_path)
+    logger.info("Processing video %s for ID %s", video_path, video_id)
+    try:
+        add_job_bytes(bytes_in=get_file_size(video_path))
+        store_thumbnail(thumbnail_path)
+        thumbnails = create_thumbnails(video_path, video_id, thumbnail_path)
+
+        # Bereits kodierte identische Uploads wiederverwenden
+        source_hash = fingerprint_source(video_path, video_id)
+        if reuse_existing_renditions(video_id, source_hash, thumbnails):
+            set_video_status(video_id, Video.STATUS_READY)
+            set_processing_stage(video_id, 'done')
+            return
+
+        # Alle passenden Auflösungen in einem Durchlauf generieren
+        set_video_status(video_id, Video.STATUS_TRANSCODING)
+        set_processing_stage(video_id, 'transcoding')
+        renditions = get_renditions(video_path)
+        encode_video(video_path, renditions, video_id=video_id)
+
+        finish_processing(video_path, video_id, renditions, thumbnails)
+    except Exception as error:
+        mark_attempt_failed(video_id, error)
+        raise
+
+
+def enqueue_parallel_processing(queue, video_path, video_id, thumbnail_path):
+    """
+    Enqueues every rendition as its own job, so idle workers can encode
+    them in parallel, plus a fan-in job that only runs once all of them
+    have finished.
+    """
+    renditions = get_renditions(video_path)
+    logger.info("Enqueueing %s rendition jobs for ID %s", len(renditions), video_id)
+    set_video_status(video_id, Video.STATUS_TRANSCODING)
+    set_processing_stage(video_id, 'transcoding')
+    rendition_jobs = [
+        queue.enqueue(convert_video, video_path, *rendition, video_id=video_id,
+                      on_failure=mark_processing_failed,
+                      retry=Retry(max=settings.VIDEO_PROCESSING_RETRIES, interval=settings.VIDEO_RETRY_INTERVALS))
+        for rendition in renditions
+    ]
+    return queue.enqueue(finalize_video, video_path, video_id, thumbnail_path, renditions,
+                         depends_on=rendition_jobs)
+
+
+@instrument_job
+def finalize_video(video_path, video_id, thumbnail_path, renditions=RENDITIONS):
+    """
+    Fan-in step of the parallel mode: stores the thumbnail and the
+    finished renditions.
+    """
+    try:
+        store_thumbnail(thumbnail_path)
+        thumbnails = create_thumbnails(video_path, video_id, thumbnail_path)
+        fingerprint_source(video_path, video_id)
+        finish_processing(video_path, video_id, renditions, thumbnails)
+    except Exception as error:
+        mark_attempt_failed(video_id, error)
+        raise
+
+
+def get_renditions(video_path):
+    """
+    Returns the renditions to produce for a source. With
+    VIDEO_ADAPTIVE_LADDER the ladder is adapted to the probed source,
+    otherwise the fixed RENDITIONS are used.
+    """
+    if not settings.VIDEO_ADAPTIVE_LADDER:
+        return RENDITIONS
+    try:
+        probe = probe_video(video_path)
+    except (IOError, OSError) as error:
+        logger.warning("Could not probe %s, using the full ladder: %s", video_path, error)
+        return RENDITIONS
+    if not probe['height']:
+        logger.warning("No video stream found in %s, using the full ladder", video_path)
+        return RENDITIONS
+    renditions = select_renditions(probe, RENDITIONS)
+    logger.info("Selected %s for %sx%s source", [rendition[0] for rendition in renditions],
+                probe['width'], probe['height'])
+    return renditions
+
+
+def encode_video(video_path, renditions, video_id=None, profile=None, mode=None):
+    """
+    Encodes the renditions of process_video: split into segments in the
+    chunked mode, otherwise in one ffmpeg run that also writes the seek
+    preview frames. bench_transcode runs the same step.
+    """
+    if (mode or settings.VIDEO_PROCESSING_MODE) == 'chunked':
+        convert_video_chunked(video_path, renditions, video_id=video_id, profile=profile)
+    else:
+        # Die Vorschaubilder fallen beim selben Dekodierdurchlauf mit ab
+        convert_video_renditions(video_path, renditions, video_id=video_id, profile=profile,
+                                 trickplay_size=get_trickplay_size(video_path))
+
+
+def build_outputs(video_path, video_id, renditions, storage):
+    """
+    Packages the streaming formats and builds the seek previews next to
+    the encoded renditions.
+    """
+    package_streams(video_path, renditions)
+    create_trickplay(video_path, video_id, storage)
+
+
+def finish_processing(video_path, video_id, renditions, thumbnails=()):
+    """
+    Packages, stores and registers the encoded renditions of a video.
+    The manifest is built from the local outputs before they are stored,
+    the local outputs are only removed once the manifest is saved.
+    """
+    set_processing_stage(video_id, 'packaging')
+    storage = get_media_storage()
+    build_outputs(video_path, video_id, renditions, storage)
+    manifest = build_media_manifest(video_path, video_id, renditions, storage)
+    manifest['thumbnails'] = list(thumbnails)
+    add_job_bytes(bytes_out=store_video_files(video_path, video_id, renditions, storage))
+    save_media_manifest(video_id, manifest)
+    discard_local_outputs(video_path, renditions)
+    set_video_status(video_id, Video.STATUS_READY)
+    set_processing_stage(video_id, 'done')
+
+
+def get_file_size(path):
+    """
+    Returns the size of a file in bytes, 0 if it does not exist.
+    """
+    return os.path.getsize(path) if os.path.exists(path) else 0
+
+
+def set_video_status(video_id, status):
+    """
+    Moves the video to the given processing status
+    (uploaded → transcoding → ready / failed).
+    """
+    Video.objects.filter(pk=video_id).update(status=status)
+    invalidate_catalog()
+
+
+def mark_processing_failed(job, connection, exc_type, exc_value, traceback):
+    """
+    Failure callback of the parallel rendition jobs: the fan-in job will
+    never run, so the video is marked as failed here.
+    """
+    mark_attempt_failed(job.kwargs.get('video_id'), exc_value, job)
 
-    # 4 Auflösungen generieren
-    convert_video(video_path, "120p", 160, 120, 400)
-    convert_video(video_path, "360p", 640, 360, 1000)
-    convert_video(video_path, "720p", 1280, 720, 3000)
-    convert_video(video_path, "1080p", 1920, 1080, 5000)
 
-    move_video_files(video_path, video_id)
+def mark_attempt_failed(video_id, error, job=None):
+    """
+    Marks the video as failed once the job has no retries left. RQ runs
+    failure handlers before it schedules the retry, so an attempt that
+    will be retried only publishes the "retrying" stage.
+    """
+    job = job or get_current_job()
+    if job is not None and job.retries_left:
+        set_processing_stage(video_id, 'retrying', error=str(error))
+        return
+    set_video_status(video_id, Video.STATUS_FAILED)
+    set_processing_stage(video_id, 'failed', error=str(error))
 
 
-def move_thumbnail(thumbnail_path):
+def store_thumbnail(thumbnail_path):
     """
-    Moves the thumbnail to /media/thumbnails/ without modifying it.
+    Stores the thumbnail under thumbnails/ without modifying it.
     """
-    target_directory = os.path.join('media', 'thumbnails')
-    ensure_directory_exists(target_directory)
+    # Bei einem Retry ist das Thumbnail schon gespeichert
+    if not thumbnail_path or not os.path.exists(thumbnail_path):
+        return
+    storage = get_media_storage()
+    name = f"thumbnails/{os.path.basename(thumbnail_path)}"
+    # Lokal liegt das hochgeladene Thumbnail bereits am Ziel
+    if storage.path(name) == os.path.abspath(thumbnail_path):
+        return
+    storage.save_files([(thumbnail_path, name)])
 
-    target_path = os.path.join(
-        target_directory, os.path.basename(thumbnail_path))
 
-    shutil.move(thumbnail_path, target_path)
-    print(f"Moved thumbnail to {target_path}")  # Debugging
+def create_thumbnails(video_path, video_id, thumbnail_path, storage=None):
+    """
+    Renders the responsive thumbnail variants and stores them under
+    thumbnails/<video id>/. Without an uploaded thumbnail a poster frame
+    is extracted from the video. Returns the manifest entries.
+    """
+    prefix = f"thumbnails/{video_id}/"
+    storage = storage or get_media_storage()
+    with tempfile.TemporaryDirectory() as directory:
+        try:
+            image_path = thumbnail_path
+            if not image_path or not os.path.exists(image_path):
+                image_path = os.path.join(directory, "poster.jpg")
+                offset = get_poster_offset(get_video_duration(video_path))
+                run_ffmpeg(build_poster_command(video_path, image_path, offset), step='poster')
+            variants = render_thumbnail_variants(image_path, directory)
+        except (OSError, subprocess.CalledProcessError) as error:
+            # Ohne Varianten bleibt das Video trotzdem abspielbar
+            logger.warning("Could not create thumbnails for ID %s: %s", video_id, error)
+            return []
+
+        storage.delete_prefix(prefix)
+        storage.save_files([(variant['path'], prefix + os.path.basename(variant['path'])) for variant in variants])
+    logger.info("Created %s thumbnail variants for ID %s", len(variants), video_id)
+    return [{**variant, 'path': prefix + os.path.basename(variant['path'])} for variant in variants]
 
 
 def ensure_directory_exists(directory):
@@ -44,53 +255,553 @@ def ensure_directory_exists(directory):
         os.makedirs(directory)
 
 
-def move_video_files(video_path, video_id):
+def get_media_name(video_id, file_name):
     """
-    Moves all generated MP4 files to the correct directory.
+    Returns the storage name of a file in the media directory of a video.
     """
-    directory, file_name = os.path.split(video_path)
-    base_name, _ = os.path.splitext(file_name)
-    target_directory = os.path.join('media', 'videos', str(video_id))
+    return f"videos/{video_id}/{file_name}"
 
-    ensure_directory_exists(target_directory)
-    files_to_move = [
-        f"{directory}/{base_name}_120p.mp4",
-        f"{directory}/{base_name}_360p.mp4",
-        f"{directory}/{base_name}_720p.mp4",
-        f"{directory}/{base_name}_1080p.mp4"
-    ]
 
-    for file_path in files_to_move:
+def store_video_files(video_path, video_id, renditions, storage):
+    """
+    Writes all generated MP4 files and streaming outputs to the media
+    storage. Returns the number of stored bytes.
+    """
+    files = []
+    for resolution, _, _, _ in renditions:
+        file_path = get_rendition_target(video_path, resolution)
         if os.path.exists(file_path):
-            target_path = os.path.join(
-                target_directory, os.path.basename(file_path))
-            shutil.move(file_path, target_path)
-            print(f"Moved {file_path} to {target_path}")  # Debugging
+            files.append((file_path, get_media_name(video_id, os.path.basename(file_path))))
         else:
-            print(f"File not found: {file_path}")
+            logger.warning("File not found: %s", file_path)
+
+    for output_name in get_output_directory_names():
+        output_directory = get_stream_directory(video_path, output_name)
+        if not os.path.exists(output_directory):
+            continue
+        # Segmente eines früheren Durchlaufs entfernen
+        storage.delete_prefix(get_media_name(video_id, f"{output_name}/"))
+        for root, _, output_files in os.walk(output_directory):
+            for file in output_files:
+                relative_path = os.path.relpath(os.path.join(root, file), output_directory).replace(os.sep, '/')
+                files.append((os.path.join(root, file),
+                              get_media_name(video_id, f"{output_name}/{relative_path}")))
+
+    stored_bytes = sum(os.path.getsize(file_path) for file_path, _ in files)
+    storage.save_files(files)
+    return stored_bytes
+
+
+def discard_local_outputs(video_path, renditions):
+    """
+    Removes the outputs next to the source that are left after storing.
+    """
+    for path in [*(get_rendition_target(video_path, resolution) for resolution, _, _, _ in renditions),
+                 get_trickplay_frames_path(video_path)]:
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(path)
+    for output_name in get_output_directory_names():
+        shutil.rmtree(get_stream_directory(video_path, output_name), ignore_errors=True)
+
+
+def get_output_directory_names():
+    """
+    Returns the output directories next to the source that are stored
+    under the same name in the media directory of the video.
+    """
+    return [*settings.VIDEO_STREAMING_FORMATS, TRICKPLAY_DIRECTORY]
+
+
+def find_output_file(local_path, name, storage):
+    """
+    Returns a local path of an output: next to the source or, if an
+    earlier attempt already stored it locally, in the media storage.
+    """
+    if os.path.exists(local_path):
+        return local_path
+    stored_path = storage.path(name)
+    return stored_path if stored_path and os.path.exists(stored_path) else None
+
+
+def build_media_manifest(video_path, video_id, renditions, storage):
+    """
+    Describes the renditions and streaming manifests that were actually
+    produced for a video. Paths are storage names, relative to the media
+    base URL.
+    """
+    manifest = {'renditions': []}
+
+    for resolution, width, height, bitrate in renditions:
+        file_name = os.path.basename(get_rendition_target(video_path, resolution))
+        file_path = find_output_file(get_rendition_target(video_path, resolution),
+                                     get_media_name(video_id, file_name), storage)
+        if not file_path:
+            continue
+        infos = ffmpeg_parse_infos(file_path)
+        width, height = infos.get('video_size') or (width, height)
+        manifest['renditions'].append({
+            'resolution': resolution,
+            'path': get_media_name(video_id, file_name),
+            'width': width,
+            'height': height,
+            'bitrate': bitrate,
+            'size': os.path.getsize(file_path),
+            'duration': infos.get('duration'),
+        })
+
+    for stream_format, manifest_name in (('hls', 'master.m3u8'), ('dash', 'manifest.mpd')):
+        name = get_media_name(video_id, f"{stream_format}/{manifest_name}")
+        local_path = os.path.join(get_stream_directory(video_path, stream_format), manifest_name)
+        if find_output_file(local_path, name, storage):
+            manifest[stream_format] = name
+
+    name = get_media_name(video_id, f"{TRICKPLAY_DIRECTORY}/{TRICKPLAY_VTT}")
+    local_path = os.path.join(get_stream_directory(video_path, TRICKPLAY_DIRECTORY), TRICKPLAY_VTT)
+    if find_output_file(local_path, name, storage):
+        manifest['trickplay'] = {'vtt': name, 'interval': settings.VIDEO_TRICKPLAY_INTERVAL}
+    return manifest
 
 
-def convert_video(video_path, resolution, width, height, bitrate):
+def save_media_manifest(video_id, manifest):
+    """
+    Persists the media manifest on the video, so the API can expose it
+    without touching the file system.
+    """
+    Video.objects.filter(pk=video_id).update(media_manifest=manifest)
+    invalidate_catalog()
+    logger.info("Saved media manifest for ID %s: %s renditions", video_id, len(manifest['renditions']))
+
+
+def get_rendition_target(video_path, resolution):
+    """
+    Returns the output path of a rendition next to the source file.
+    """
     file_name, _ = os.path.splitext(video_path)
-    target = f"{file_name}_{resolution}.mp4"
+    return f"{file_name}_{resolution}.mp4"
+
+
+def get_partial_target(video_path, resolution):
+    """
+    Returns the path ffmpeg writes a rendition to before it is complete.
+    """
+    file_name, _ = os.path.splitext(video_path)
+    return f"{file_name}_{resolution}.part.mp4"
+
+
+def is_rendition_done(video_path, resolution, video_id=None):
+    """
+    Checks whether a rendition was already completed by an earlier run,
+    either next to the source or already in the media storage.
+    """
+    target = get_rendition_target(video_path, resolution)
+    if os.path.exists(target):
+        return True
+    return video_id is not None and get_media_storage().exists(
+        get_media_name(video_id, os.path.basename(target)))
+
+
+def commit_renditions(video_path, renditions):
+    """
+    Atomically renames the partial outputs of a finished ffmpeg run.
+    """
+    for resolution, _, _, _ in renditions:
+        os.replace(get_partial_target(video_path, resolution), get_rendition_target(video_path, resolution))
+
+
+def discard_partial_renditions(video_path, renditions):
+    """
+    Removes the partial outputs of an aborted ffmpeg run.
+    """
+    for resolution, _, _, _ in renditions:
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(get_partial_target(video_path, resolution))
+
 
+def fingerprint_source(video_path, video_id):
+    """
+    Returns the SHA-256 of the source and stores it on the video. A hash
+    from an earlier attempt is reused instead of reading the file again.
+    """
+    source_hash = Video.objects.filter(id=video_id).values_list('source_hash', flat=True).first()
+    if source_hash:
+        return source_hash
+
+    source_hash = hash_file(video_path)
+    Video.objects.filter(id=video_id).update(source_hash=source_hash)
+    return source_hash
+
+
+def hash_file(path):
+    """
+    Returns the SHA-256 of a file, read in chunks.
+    """
+    digest = hashlib.sha256()
+    with open(path, 'rb') as source:
+        for chunk in iter(lambda: source.read(HASH_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def reuse_existing_renditions(video_id, source_hash, thumbnails=()):
+    """
+    Takes over the renditions of a finished video with the same source.
+    Files are hardlinked locally and copied on the server side in S3, so
+    deleting one of the videos does not affect the other.
+    """
+    if not source_hash:
+        return False
+    original = (
+        Video.objects
+        .filter(source_hash=source_hash, status=Video.STATUS_READY)
+        .exclude(id=video_id).exclude(media_manifest={})
+        .order_by('id').first()
+    )
+    storage = get_media_storage()
+    if not original or not storage.has_prefix(get_media_name(original.id, '')):
+        return False
+
+    logger.info("Reusing renditions of video %s for ID %s", original.id, video_id)
+    storage.copy_prefix(get_media_name(original.id, ''), get_media_name(video_id, ''))
+    manifest = json.loads(
+        json.dumps(original.media_manifest).replace(f'"videos/{original.id}/', f'"videos/{video_id}/'))
+    # Thumbnails gehören zum jeweiligen Upload
+    manifest['thumbnails'] = list(thumbnails)
+    Video.objects.filter(id=video_id).update(media_manifest=manifest)
+    return True
+
+
+def get_audio_bitrate(resolution):
+    """
+    Returns the audio bitrate (kbit/s) used for the given resolution.
+    """
     # Dynamische Audio-Bitrate je nach Auflösung
     if resolution == "720p":
-        audio_bitrate = 160
-    elif resolution == "1080p":
-        audio_bitrate = 256
-    else:
-        audio_bitrate = 128
+        return 160
+    if resolution == "1080p":
+        return 256
+    return 128
 
-    print(f"Converting {video_path} to {resolution} ({width}x{height}) with audio {audio_bitrate}k...")
 
-    cmd = (
-        f'ffmpeg -i "{video_path}" -vf "scale={width}:{height}" '
-        f'-c:v h264 -b:v {bitrate}k -c:a aac -b:a {audio_bitrate}k "{target}"'
+def get_stream_directory(video_path, stream_format):
+    """
+    Returns the directory next to the source that holds the HLS, DASH or
+    trickplay output.
+    """
+    file_name, _ = os.path.splitext(video_path)
+    return f"{file_name}_{stream_format}"
+
+
+def build_rendition_command(video_path, renditions, profile, pass_number=None, passlog_directory=None,
+                            trickplay_size=None):
+    """
+    Builds a single ffmpeg command that decodes the source once and feeds
+    the frames to every rendition through one split/scale filter graph.
+    With a trickplay size, one more branch writes the seek preview frames.
+    The first pass of a two-pass encode only writes the pass logs.
+    """
+    trickplay = trickplay_size is not None and pass_number != 1
+    branches = len(renditions) + trickplay
+    splits = "".join(f"[s{index}]" for index in range(branches))
+    scales = ";".join(
+        f"[s{index}]scale={width}:{height}[v{index}]"
+        for index, (_, width, height, _) in enumerate(renditions)
     )
-    subprocess.run(cmd, capture_output=True, shell=True)
+    filter_graph = f"[0:v]split={branches}{splits};{scales}"
+    if trickplay:
+        filter_graph += f";[s{len(renditions)}]{build_trickplay_filter(trickplay_size)}[trickplay]"
+
+    cmd = ["ffmpeg", "-y", "-i", video_path, "-filter_complex", filter_graph]
+    for index, (resolution, _, _, bitrate) in enumerate(renditions):
+        passlog_file = os.path.join(passlog_directory, resolution) if passlog_directory else None
+        cmd += ["-map", f"[v{index}]", *build_video_codec_args(profile, bitrate, pass_number, passlog_file)]
+        if pass_number == 1:
+            cmd += ["-an", "-f", "null", os.devnull]
+            continue
+        cmd += [
+            "-map", "0:a?",
+            "-c:a", "aac", "-b:a", f"{get_audio_bitrate(resolution)}k",
+            get_partial_target(video_path, resolution),
+        ]
+    if trickplay:
+        cmd += ["-map", "[trickplay]", *get_trickplay_output_args(get_trickplay_frames_path(video_path, partial=True))]
+    return cmd
+
+
+def get_trickplay_frames_path(video_path, partial=False):
+    """
+    Returns the file next to the source that holds the raw preview frames.
+    """
+    file_name, _ = os.path.splitext(video_path)
+    return f"{file_name}_trickplay{'.part' if partial else ''}.rgb"
+
+
+def create_trickplay(video_path, video_id, storage):
+    """
+    Builds the seek preview sprite sheets and their WebVTT index from the
+    frames of the encode pass. If the encode pass did not produce them
+    (chunked or parallel mode, retries), they are extracted separately.
+    Errors are logged only, the video stays playable without previews.
+    """
+    size = get_trickplay_size(video_path)
+    vtt_name = get_media_name(video_id, f"{TRICKPLAY_DIRECTORY}/{TRICKPLAY_VTT}")
+    output_directory = get_stream_directory(video_path, TRICKPLAY_DIRECTORY)
+    if size is None or find_output_file(os.path.join(output_directory, TRICKPLAY_VTT), vtt_name, storage):
+        return
+
+    frames_path = get_trickplay_frames_path(video_path)
+    try:
+        if not os.path.exists(frames_path):
+            partial_path = get_trickplay_frames_path(video_path, partial=True)
+            run_ffmpeg(build_trickplay_command(video_path, size, partial_path), step='trickplay')
+            os.replace(partial_path, frames_path)
+        frame_count = write_trickplay(frames_path, size, output_directory, get_video_duration(video_path))
+        logger.info("Created %s seek previews for ID %s", frame_count, video_id)
+    except (OSError, ValueError, subprocess.CalledProcessError) as error:
+        logger.warning("Could not create seek previews for ID %s: %s", video_id, error)
+        shutil.rmtree(output_directory, ignore_errors=True)
+
+
+def run_ffmpeg(cmd, video_id=None, resolutions=(), duration=None, step='encode'):
+    """
+    Runs an ffmpeg command and streams its -progress output. If a video ID
+    is given, the progress of the listed renditions is published to Redis.
+    stderr goes to a temporary file instead of memory; its tail is part of
+    the error if ffmpeg fails. The run time is added to the job metrics.
+    """
+    cmd = [cmd[0], "-progress", "pipe:1", "-nostats", *cmd[1:]]
+    started = time.perf_counter()
+    with tempfile.TemporaryFile() as stderr:
+        process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=stderr, text=True)
+        for report in parse_ffmpeg_progress(process.stdout, duration):
+            if video_id is not None and resolutions:
+                set_rendition_progress(video_id, resolutions, report)
+        return_code = process.wait()
+        record_ffmpeg_run(step, resolutions, time.perf_counter() - started)
+
+        if return_code != 0:
+            stderr.seek(-min(2000, stderr.tell()), os.SEEK_END)
+            raise subprocess.CalledProcessError(return_code, cmd, stderr=stderr.read().decode(errors='replace'))
+
+
+def get_video_duration(video_path):
+    """
+    Returns the duration of a video in seconds, or None if it is unknown.
+    """
+    try:
+        return ffmpeg_parse_infos(video_path).get('duration')
+    except (IOError, OSError):
+        return None
+
+
+def convert_video_renditions(video_path, renditions, video_id=None, profile=None, trickplay_size=None):
+    """
+    Converts the video into all given renditions with a single ffmpeg run,
+    so the source is only decoded once. Two-pass profiles run it twice.
+    Renditions finished by an earlier attempt are skipped. With a
+    trickplay size the seek preview frames are written in the same run.
+    """
+    renditions = [rendition for rendition in renditions if not is_rendition_done(video_path, rendition[0], video_id)]
+    if not renditions:
+        logger.info("All renditions of %s are already done", video_path)
+        return
+
+    profile = profile or get_encoding_profile()
+    names = [resolution for resolution, _, _, _ in renditions]
+    logger.info("Converting %s to %s with profile %s...", video_path, ', '.join(names), profile['name'])
+    duration = get_video_duration(video_path) if video_id is not None else None
+
+    try:
+        if is_two_pass(profile):
+            with tempfile.TemporaryDirectory(prefix='passlog_') as passlog_directory:
+                for pass_number in (1, 2):
+                    cmd = build_rendition_command(video_path, renditions, profile, pass_number, passlog_directory,
+                                                  trickplay_size)
+                    run_ffmpeg(cmd, video_id, names, duration)
+        else:
+            cmd = build_rendition_command(video_path, renditions, profile, trickplay_size=trickplay_size)
+            run_ffmpeg(cmd, video_id, names, duration)
+    except BaseException:
+        discard_partial_renditions(video_path, renditions)
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(get_trickplay_frames_path(video_path, partial=True))
+        raise
+    commit_renditions(video_path, renditions)
+    if trickplay_size is not None:
+        os.replace(get_trickplay_frames_path(video_path, partial=True), get_trickplay_frames_path(video_path))
+
+
+def convert_video_chunked(video_path, renditions, video_id=None, profile=None):
+    """
+    Splits the source at keyframes into segments, encodes the segments
+    concurrently and joins each rendition back together without re-encoding.
+    The segments are threads of the calling job, not jobs of their own, so
+    this speeds up one job but does not shorten its timeout or retry unit.
+    """
+    renditions = [rendition for rendition in renditions if not is_rendition_done(video_path, rendition[0], video_id)]
+    if not renditions:
+        return
+    # Die Worker-Threads sehen den aktuellen Job nicht, daher hier auflösen
+    profile = profile or get_encoding_profile()
+    directory = os.path.dirname(video_path)
+    segment_directory = tempfile.mkdtemp(prefix='segments_', dir=directory or None)
+    try:
+        segments = split_video_segments(video_path, segment_directory, settings.VIDEO_SEGMENT_DURATION)
+        logger.info("Encoding %s segments of %s...", len(segments), video_path)
+
+        # Jedes Segment ist ein eigener ffmpeg-Prozess, die Threads warten nur darauf
+        names = [resolution for resolution, _, _, _ in renditions]
+        with ThreadPoolExecutor(max_workers=settings.VIDEO_SEGMENT_WORKERS) as executor:
+            # Eigener Kontext je Segment, damit die ffmpeg-Zeiten beim Job landen
+            futures = [
+                executor.submit(contextvars.copy_context().run, convert_video_renditions,
+                                segment, renditions, profile=profile)
+                for segment in segments
+            ]
+            for done, future in enumerate(as_completed(futures), start=1):
+                future.result()
+                if video_id is not None:
+                    set_rendition_progress(video_id, names, {
+                        'state': 'running', 'percent': round(done / len(segments) * 100, 1),
+                        'segments_done': done, 'segments': len(segments),
+                    })
+
+        for resolution, _, _, _ in renditions:
+            concat_segments(video_path, segments, resolution, segment_directory)
+    finally:
+        shutil.rmtree(segment_directory, ignore_errors=True)
+
+
+def split_video_segments(video_path, segment_directory, segment_duration):
+    """
+    Cuts the video stream into segments of roughly segment_duration seconds.
+    The stream is copied, so the cuts always land on keyframes.
+    """
+    segment_pattern = os.path.join(segment_directory, 'segment_%04d.mp4')
+    cmd = [
+        "ffmpeg", "-y", "-i", video_path, "-map", "0:v:0", "-an", "-c", "copy",
+        "-f", "segment", "-segment_time", str(segment_duration),
+        "-reset_timestamps", "1", segment_pattern,
+    ]
+    run_ffmpeg(cmd, step='split')
+    return sorted(
+        os.path.join(segment_directory, file)
+        for file in os.listdir(segment_directory)
+        if file.startswith('segment_') and file.endswith('.mp4')
+    )
+
+
+def concat_segments(video_path, segments, resolution, segment_directory):
+    """
+    Joins the encoded segments of one rendition losslessly and adds the
+    audio track of the source.
+    """
+    list_path = os.path.join(segment_directory, f'{resolution}.txt')
+    with open(list_path, 'w') as list_file:
+        for segment in segments:
+            list_file.write(f"file '{os.path.abspath(get_rendition_target(segment, resolution))}'\n")
+
+    cmd = [
+        "ffmpeg", "-y", "-f", "concat", "-safe", "0", "-i", list_path, "-i", video_path,
+        "-map", "0:v", "-map", "1:a?", "-c:v", "copy",
+        "-c:a", "aac", "-b:a", f"{get_audio_bitrate(resolution)}k",
+        get_partial_target(video_path, resolution),
+    ]
+    run_ffmpeg(cmd, resolutions=[resolution], step='concat')
+    os.replace(get_partial_target(video_path, resolution), get_rendition_target(video_path, resolution))
+
+
+def build_hls_command(video_path, renditions, has_audio):
+    """
+    Builds the ffmpeg command that packages the encoded renditions into
+    segmented HLS with a master playlist. The streams are only copied.
+    """
+    output_directory = get_stream_directory(video_path, 'hls')
+    cmd = ["ffmpeg", "-y"]
+    for resolution, _, _, _ in renditions:
+        cmd += ["-i", get_rendition_target(video_path, resolution)]
+
+    stream_map = []
+    for index, (resolution, _, _, _) in enumerate(renditions):
+        cmd += ["-map", f"{index}:v:0"]
+        if has_audio:
+            cmd += ["-map", f"{index}:a:0"]
+            stream_map.append(f"v:{index},a:{index},name:{resolution}")
+        else:
+            stream_map.append(f"v:{index},name:{resolution}")
+
+    cmd += [
+        "-c", "copy", "-f", "hls",
+        "-hls_time", str(settings.VIDEO_STREAM_SEGMENT_DURATION),
+        "-hls_playlist_type", "vod",
+        "-hls_segment_filename", os.path.join(output_directory, "%v", "segment_%03d.ts"),
+        "-master_pl_name", "master.m3u8",
+        "-var_stream_map", " ".join(stream_map),
+        os.path.join(output_directory, "%v", "index.m3u8"),
+    ]
+    return cmd
+
+
+def build_dash_command(video_path, renditions, has_audio):
+    """
+    Builds the ffmpeg command that packages the encoded renditions into a
+    DASH manifest with one video adaptation set and the best audio track.
+    """
+    output_directory = get_stream_directory(video_path, 'dash')
+    cmd = ["ffmpeg", "-y"]
+    for resolution, _, _, _ in renditions:
+        cmd += ["-i", get_rendition_target(video_path, resolution)]
+    for index in range(len(renditions)):
+        cmd += ["-map", f"{index}:v:0"]
+
+    adaptation_sets = "id=0,streams=v"
+    if has_audio:
+        cmd += ["-map", f"{len(renditions) - 1}:a:0"]
+        adaptation_sets += " id=1,streams=a"
+
+    cmd += [
+        "-c", "copy", "-f", "dash",
+        "-seg_duration", str(settings.VIDEO_STREAM_SEGMENT_DURATION),
+        "-use_template", "1", "-use_timeline", "1",
+        "-adaptation_sets", adaptation_sets,
+        os.path.join(output_directory, "manifest.mpd"),
+    ]
+    return cmd
+
+
+def package_streams(video_path, renditions):
+    """
+    Packages the encoded renditions into the adaptive streaming formats
+    configured in VIDEO_STREAMING_FORMATS.
+    """
+    has_audio = ffmpeg_parse_infos(video_path)['audio_found']
+    builders = {'hls': build_hls_command, 'dash': build_dash_command}
+
+    for stream_format in settings.VIDEO_STREAMING_FORMATS:
+        output_directory = get_stream_directory(video_path, stream_format)
+        shutil.rmtree(output_directory, ignore_errors=True)
+        ensure_directory_exists(output_directory)
+        if stream_format == 'hls':
+            for resolution, _, _, _ in renditions:
+                ensure_directory_exists(os.path.join(output_directory, resolution))
+
+        logger.info("Packaging %s as %s...", video_path, stream_format.upper())
+        cmd = builders[stream_format](video_path, renditions, has_audio)
+        run_ffmpeg(cmd, resolutions=[resolution for resolution, _, _, _ in renditions], step=stream_format)
+
+
+@instrument_job
+def convert_video(video_path, resolution, width, height, bitrate, video_id=None):
+    """
+    Converts the video into a single rendition.
+    """
+    logger.info("Converting %s to %s (%sx%s) with audio %sk...", video_path, resolution, width, height,
+                get_audio_bitrate(resolution))
+    convert_video_renditions(video_path, [(resolution, width, height, bitrate)], video_id=video_id)
+    add_job_bytes(bytes_in=get_file_size(video_path),
+                  bytes_out=get_file_size(get_rendition_target(video_path, resolution)))
 
 
+@instrument_job
 def remove_video_files(video_id):
     """
     Removes all video-related files.
@@ -103,18 +814,14 @@ def remove_video_thumbnail(video_id):
     """
     Deletes the thumbnail images.
     """
-    target_directory = os.path.join('media', 'thumbnails')
-    if os.path.exists(target_directory):
-        print(f"Removing thumbnails for video {video_id}")
-        for file in os.listdir(target_directory):
-            if file.startswith(f"{video_id}_"):
-                os.remove(os.path.join(target_directory, file))
+    logger.info("Removing thumbnails for video %s", video_id)
+    storage = get_media_storage()
+    storage.delete_prefix(f"thumbnails/{video_id}_")
+    storage.delete_prefix(f"thumbnails/{video_id}/")
 
 
 def remove_videos(video_id):
     """
     Deletes all video files.
     """
-    target_directory = os.path.join('media', 'videos', str(video_id))
-    if os.path.exists(target_directory):
-        shutil.rmtree(target_directory)
+    get_media_storage().delete_prefix(get_media_name(video_id, ''))
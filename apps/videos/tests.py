@@ -1,8 +1,48 @@
-from django.test import TestCase, Client
+import base64
+import hashlib
+import io
+import json
+import os
+import shutil
+import subprocess
+import tempfile
+from unittest import skipIf
+from urllib.parse import parse_qs, urlparse
+from unittest.mock import Mock, patch
+from django.core.management import call_command
+from django.test import TestCase, Client, override_settings
 from django.urls import reverse
+from PIL import Image
 from apps.users.models import UserAccount
-from apps.videos.models import Video, VideoProgress
+from apps.videos.models import Video, VideoProgress, VideoUpload
 from rest_framework_simplejwt.tokens import RefreshToken
+from apps.videos.api.serializers import VideoProgressUpdateSerializer
+from apps.videos.cache import get_catalog_version
+from django_redis import get_redis_connection
+from videoflix_backend.metrics import METRICS_KEY, render_metrics
+from videoflix_backend.middleware import QueryRecorder, RequestMetricsMiddleware
+from apps.videos.management.commands.bench_api import percentile, summarize
+from apps.videos.encoding import get_encoding_profile
+from apps.videos.ladder import select_renditions
+from apps.videos.queues import select_transcode_queue
+from apps.videos.processing import (get_processing_status, parse_ffmpeg_progress, set_processing_stage,
+                                    set_rendition_progress)
+from apps.videos.progress_buffer import FLUSHING_KEY, FLUSHING_USERS_KEY, flush_progress_buffer, get_key
+from apps.videos.storage import LocalMediaStorage, S3MediaStorage, get_media_base_url, get_media_storage
+from apps.videos.tasks import (RENDITIONS, build_rendition_command, build_hls_command, convert_video_renditions,
+                               create_thumbnails, create_trickplay, enqueue_parallel_processing, mark_processing_failed,
+                               process_video, remove_video_files, remove_videos,
+                               reuse_existing_renditions, store_video_files)
+from apps.videos.thumbnails import render_thumbnail_variants
+from apps.videos.trickplay import build_webvtt, get_trickplay_size, tile_frames
+from apps.videos.uploads import complete_upload
+import django_rq
+import numpy as np
+
+try:
+    from moto import mock_aws
+except ImportError:
+    mock_aws = None
 
 
 class VideoModelTests(TestCase):
@@ -74,14 +114,21 @@ class VideoViewTests(TestCase):
         
         self.token = str(RefreshToken.for_user(self.user).access_token)
         self.client.defaults['HTTP_AUTHORIZATION'] = f'Bearer {self.token}'
+
+        # Die Commit-Callbacks laufen, Verarbeitung und Aufräumen werden nur vorgemerkt
+        queue_patcher = patch('apps.videos.signals.get_queue')
+        self.mock_get_queue = queue_patcher.start()
+        self.addCleanup(queue_patcher.stop)
         
-        self.video = Video.objects.create(
-            title="Sample Video",
-            description="This is a test video.",
-            category="documentary",
-            video_file="videos/sample.mp4",
-            thumbnail="thumbnails/sample.jpg"
-        )
+        with self.captureOnCommitCallbacks(execute=True):
+            self.video = Video.objects.create(
+                title="Sample Video",
+                description="This is a test video.",
+                category="documentary",
+                video_file="videos/sample.mp4",
+                thumbnail="thumbnails/sample.jpg",
+                status=Video.STATUS_READY
+            )
         self.video_progress = VideoProgress.objects.create(
             user=self.user,
             video=self.video,
@@ -99,6 +146,189 @@ class VideoViewTests(TestCase):
         response = self.client.get(self.video_list_url)
         self.assertEqual(response.status_code, 200)
 
+    def test_video_list_exposes_media_manifest(self):
+        """
+        Each video links to its HLS master playlist and the renditions that exist.
+        """
+        self.video.media_manifest = {
+            'renditions': [{'resolution': '360p', 'path': f'videos/{self.video.id}/sample_360p.mp4',
+                            'width': 640, 'height': 360, 'bitrate': 1000, 'size': 1024, 'duration': 6.0}],
+            'hls': f'videos/{self.video.id}/hls/master.m3u8',
+        }
+        with self.captureOnCommitCallbacks(execute=True):
+            self.video.save()
+
+        data = self.client.get(self.video_list_url).json()["results"][0]
+        self.assertTrue(data["hls_manifest_url"].endswith(f"/media/videos/{self.video.id}/hls/master.m3u8"))
+        self.assertTrue(data["video_360p"].endswith(f"/media/videos/{self.video.id}/sample_360p.mp4"))
+        self.assertIsNone(data["video_1080p"])
+        self.assertEqual(len(data["renditions"]), 1)
+
+    def test_video_without_manifest_uses_legacy_paths(self):
+        """
+        Videos processed before the manifest existed keep the URLs of the MP4s the old pipeline stored.
+        """
+        with tempfile.TemporaryDirectory() as directory, override_settings(MEDIA_ROOT=directory):
+            os.makedirs(os.path.join(directory, "videos", str(self.video.id)))
+            with open(os.path.join(directory, "videos", str(self.video.id), "sample_720p.mp4"), "wb") as output:
+                output.write(b"encoded")
+            data = self.client.get(reverse("video-detail", args=[self.video.id])).json()
+        self.assertTrue(data["video_720p"].endswith(f"/media/videos/{self.video.id}/sample_720p.mp4"))
+        self.assertIsNone(data["video_1080p"])
+        self.assertIsNone(data["hls_manifest_url"])
+        self.assertEqual([rendition["resolution"] for rendition in data["renditions"]], ["720p"])
+
+    @patch('apps.videos.tasks.ffmpeg_parse_infos', return_value={'video_size': [640, 360], 'duration': 6.0})
+    def test_rebuild_media_manifests(self, _):
+        """
+        The backfill command builds the manifest from the files already stored for a video.
+        """
+        with tempfile.TemporaryDirectory() as directory, override_settings(MEDIA_ROOT=directory):
+            os.makedirs(os.path.join(directory, "videos", str(self.video.id), "hls"))
+            for name in ("sample_360p.mp4", "hls/master.m3u8"):
+                with open(os.path.join(directory, "videos", str(self.video.id), name), "wb") as output:
+                    output.write(b"encoded")
+            call_command("rebuild_media_manifests", stdout=io.StringIO(), stderr=io.StringIO())
+
+        self.video.refresh_from_db()
+        self.assertEqual([rendition["path"] for rendition in self.video.media_manifest["renditions"]],
+                         [f"videos/{self.video.id}/sample_360p.mp4"])
+        self.assertEqual(self.video.media_manifest["hls"], f"videos/{self.video.id}/hls/master.m3u8")
+
+    def test_seek_previews_only_in_detail_view(self):
+        """
+        The detail view links the trickplay WebVTT track, catalog pages do not carry it.
+        """
+        self.video.media_manifest = {'renditions': [], 'trickplay': {
+            'vtt': f'videos/{self.video.id}/trickplay/trickplay.vtt', 'interval': 10}}
+        with self.captureOnCommitCallbacks(execute=True):
+            self.video.save()
+
+        data = self.client.get(reverse("video-detail", args=[self.video.id])).json()
+        self.assertEqual(data["trickplay"], {
+            "vtt_url": f"http://testserver/media/videos/{self.video.id}/trickplay/trickplay.vtt", "interval": 10})
+        self.assertNotIn("trickplay", self.client.get(self.video_list_url).json()["results"][0])
+
+    def test_video_list_exposes_thumbnail_srcset(self):
+        """
+        Thumbnail variants are grouped by format into srcset strings, smallest first.
+        """
+        self.video.media_manifest = {'renditions': [], 'thumbnails': [
+            {'format': 'webp', 'width': 640, 'height': 360, 'path': f'thumbnails/{self.video.id}/640.webp'},
+            {'format': 'webp', 'width': 320, 'height': 180, 'path': f'thumbnails/{self.video.id}/320.webp'},
+            {'format': 'jpeg', 'width': 320, 'height': 180, 'path': f'thumbnails/{self.video.id}/320.jpg'},
+        ]}
+        with self.captureOnCommitCallbacks(execute=True):
+            self.video.save()
+
+        srcset = self.client.get(self.video_list_url).json()["results"][0]["thumbnail_srcset"]
+        self.assertEqual(srcset["webp"], f"http://testserver/media/thumbnails/{self.video.id}/320.webp 320w, "
+                                         f"http://testserver/media/thumbnails/{self.video.id}/640.webp 640w")
+        self.assertEqual(srcset["jpeg"], f"http://testserver/media/thumbnails/{self.video.id}/320.jpg 320w")
+
+    def test_video_list_is_cached(self):
+        """
+        A repeated catalog request is served from the cache.
+        """
+        self.client.get(self.video_list_url)
+        with self.assertNumQueries(1):  # nur der Benutzer für die Authentifizierung
+            response = self.client.get(self.video_list_url)
+        self.assertEqual(len(response.json()["results"]), 1)
+
+    def test_catalog_is_invalidated_after_commit(self):
+        """
+        The catalog version only changes once the transaction that changed a video has committed.
+        """
+        version = get_catalog_version()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.video.save()
+            self.assertEqual(get_catalog_version(), version)
+        self.assertGreater(get_catalog_version(), version)
+
+    def test_video_list_not_modified(self):
+        """
+        The catalog answers a matching ETag with 304 until a video changes.
+        """
+        response = self.client.get(self.video_list_url)
+        etag = response['ETag']
+        self.assertFalse(response.has_header('Last-Modified'))
+        response = self.client.get(self.video_list_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Video.objects.create(title="Another Video", description="Another test video.", category="drama",
+                                 status=Video.STATUS_READY)
+        response = self.client.get(self.video_list_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()["results"]), 2)
+
+    def test_video_list_cursor_pagination(self):
+        """
+        The catalog is paginated with a cursor, newest videos first.
+        """
+        with self.captureOnCommitCallbacks(execute=True):
+            newer_video = Video.objects.create(title="Newer Video", description="Newer test video.",
+                                               category="drama", status=Video.STATUS_READY)
+        response = self.client.get(self.video_list_url, {"page_size": 1})
+        data = response.json()
+        self.assertEqual([video["id"] for video in data["results"]], [newer_video.id])
+        self.assertIsNotNone(data["next"])
+
+        response = self.client.get(data["next"])
+        self.assertEqual([video["id"] for video in response.json()["results"]], [self.video.id])
+
+    def test_cursor_does_not_fall_back_to_offsets(self):
+        """
+        Videos uploaded on the same day are paged by their id, the cursor carries no offset.
+        """
+        with self.captureOnCommitCallbacks(execute=True):
+            for index in range(3):
+                Video.objects.create(title=f"Same Day {index}", description="Same day.", category="drama",
+                                     status=Video.STATUS_READY)
+        seen, url, params = [], self.video_list_url, {"page_size": 1}
+        while url:
+            data = self.client.get(url, params).json()
+            seen += [video["id"] for video in data["results"]]
+            url, params = data["next"], None
+            if url:
+                cursor = parse_qs(urlparse(url).query)["cursor"][0]
+                self.assertNotIn("o=", base64.b64decode(cursor).decode())
+        self.assertEqual(seen, sorted(seen, reverse=True))
+        self.assertEqual(len(seen), 4)
+
+    def test_video_list_category_filter(self):
+        """
+        The catalog can be filtered by category.
+        """
+        with self.captureOnCommitCallbacks(execute=True):
+            Video.objects.create(title="Drama Video", description="Drama test video.", category="drama",
+                                 status=Video.STATUS_READY)
+        response = self.client.get(self.video_list_url, {"category": "documentary"})
+        self.assertEqual([video["id"] for video in response.json()["results"]], [self.video.id])
+
+    def test_processing_status(self):
+        """
+        The processing endpoint reports the published stage and rendition progress.
+        """
+        set_processing_stage(self.video.id, 'transcoding')
+        set_rendition_progress(self.video.id, ['360p'], {'state': 'running', 'percent': 42.0, 'fps': 30.0, 'eta': 12})
+        response = self.client.get(reverse("video-processing", args=[self.video.id]))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["stage"], "transcoding")
+        self.assertEqual(response.json()["renditions"]["360p"]["percent"], 42.0)
+
+    def test_unfinished_videos_are_hidden(self):
+        """
+        Videos that are still transcoding are neither listed nor retrievable.
+        """
+        with self.captureOnCommitCallbacks(execute=True):
+            pending_video = Video.objects.create(title="Pending Video", description="Pending test video.",
+                                                 category="drama", status=Video.STATUS_TRANSCODING)
+        response = self.client.get(self.video_list_url)
+        self.assertNotIn(pending_video.id, [video["id"] for video in response.json()["results"]])
+        response = self.client.get(reverse("video-detail", args=[pending_video.id]))
+        self.assertEqual(response.status_code, 404)
+
     def test_unauthenticated_video_list(self):
         """
         Test the video list view for an unauthenticated user.
@@ -114,6 +344,21 @@ class VideoViewTests(TestCase):
         response = self.client.get(self.video_progress_url)
         self.assertEqual(response.status_code, 200)
 
+    def test_in_progress_most_recent_first(self):
+        """
+        The continue watching list is ordered by the last update and uses a slim video representation.
+        """
+        VideoProgress.objects.filter(pk=self.video_progress.pk).update(started=True)
+        newer_video = Video.objects.create(title="Newer Video", description="Newer test video.",
+                                           category="drama", status=Video.STATUS_READY)
+        VideoProgress.objects.create(user=self.user, video=newer_video, started=True, last_position=5)
+
+        with self.assertNumQueries(2):  # Benutzer + Fortschritt inkl. Video
+            response = self.client.get(self.video_progress_url)
+        data = response.json()
+        self.assertEqual([progress["video"]["id"] for progress in data], [newer_video.id, self.video.id])
+        self.assertEqual(set(data[0]["video"]), {"id", "title", "category", "thumbnail"})
+
     def test_unauthenticated_video_progress(self):
         """
         Test the video progress retrieval for an unauthenticated user.
@@ -129,10 +374,842 @@ class VideoViewTests(TestCase):
         response = self.client.post(self.save_progress_url, {"last_position": 50})
         self.assertEqual(response.status_code, 200)
 
+    def test_save_progress_is_a_single_upsert(self):
+        """
+        Saving progress updates the existing row with exactly one statement.
+        """
+        serializer = VideoProgressUpdateSerializer(data={"last_position": 75})
+        serializer.is_valid(raise_exception=True)
+        with self.assertNumQueries(1):
+            serializer.save_progress(user=self.user, video=self.video)
+
+        progress = VideoProgress.objects.get(user=self.user, video=self.video)
+        self.assertEqual(float(progress.last_position), 75)
+        self.assertTrue(progress.started)
+        self.assertEqual(VideoProgress.objects.filter(user=self.user, video=self.video).count(), 1)
+
     def test_unauthenticated_save_progress(self):
         """
         Test saving video progress for an unauthenticated user.
         """
         self.client.defaults.pop('HTTP_AUTHORIZATION', None)
         response = self.client.post(self.save_progress_url, {"last_position": 50})
-        self.assertEqual(response.status_code, 401)
\ No newline at end of file
+        self.assertEqual(response.status_code, 401)
+
+    def test_server_timing_header(self):
+        """
+        Responses report DB, serializer and total time as Server-Timing.
+        """
+        response = self.client.get(self.video_progress_url)
+        self.assertIn('db;dur=', response["Server-Timing"])
+        self.assertIn('serializer;dur=', response["Server-Timing"])
+        self.assertIn('total;dur=', response["Server-Timing"])
+
+    @override_settings(METRICS_TOKEN="secret")
+    def test_metrics_endpoint_aggregates_requests(self):
+        """
+        /metrics exposes request counts and query totals per view.
+        """
+        connection = get_redis_connection('default')
+        # Nur die Test-Datenbank wird geleert, nie der Live-Hash
+        self.assertEqual(connection.connection_pool.connection_kwargs['db'], 15)
+        connection.delete(METRICS_KEY)
+        self.client.get(self.video_progress_url)
+        response = self.client.get(reverse("metrics"), HTTP_AUTHORIZATION="Bearer secret")
+        body = response.content.decode()
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('videoflix_http_requests_total{view="video-progress-in-progress",method="GET",status="200"} 1', body)
+        self.assertIn('videoflix_db_queries_total{view="video-progress-in-progress",method="GET"}', body)
+        self.assertIn('# TYPE videoflix_http_request_duration_seconds histogram', body)
+
+    @override_settings(METRICS_TOKEN="secret")
+    def test_metrics_endpoint_requires_token(self):
+        """
+        With METRICS_TOKEN set, /metrics rejects scrapers without the token.
+        """
+        self.assertEqual(self.client.get(reverse("metrics")).status_code, 403)
+        response = self.client.get(reverse("metrics"), HTTP_AUTHORIZATION="Bearer secret")
+        self.assertEqual(response.status_code, 200)
+
+    @override_settings(METRICS_TOKEN="", DEBUG=False)
+    def test_metrics_endpoint_closed_without_token(self):
+        """
+        Without METRICS_TOKEN, /metrics is only served in DEBUG mode.
+        """
+        self.assertEqual(self.client.get(reverse("metrics")).status_code, 403)
+        with override_settings(DEBUG=True):
+            self.assertEqual(self.client.get(reverse("metrics")).status_code, 200)
+
+    @override_settings(N_PLUS_ONE_THRESHOLD=2)
+    def test_repeated_queries_are_logged(self):
+        """
+        A query repeated above the threshold is logged as possible N+1.
+        """
+        queries = QueryRecorder()
+        queries.statements["SELECT * FROM video WHERE id = %s"] = 3
+        request = Client().get(self.video_list_url).wsgi_request
+        with self.assertLogs("videoflix_backend.middleware", level="WARNING"):
+            RequestMetricsMiddleware(None).check_repeated_queries(request, "video-list", queries)
+
+class VideoTaskTests(TestCase):
+    """
+    Tests for the video processing helpers.
+    """
+
+    def test_rendition_command_decodes_source_once(self):
+        """
+        All renditions are produced from a single input and one filter graph.
+        """
+        cmd = build_rendition_command("videos/sample.mp4", RENDITIONS, get_encoding_profile('balanced'))
+        self.assertEqual(cmd.count("-i"), 1)
+        self.assertEqual(cmd.count("-filter_complex"), 1)
+        self.assertIn(f"split={len(RENDITIONS)}", cmd[cmd.index("-filter_complex") + 1])
+        for resolution, _, _, _ in RENDITIONS:
+            # ffmpeg schreibt zuerst in .part-Dateien, die erst danach umbenannt werden
+            self.assertIn(f"videos/sample_{resolution}.part.mp4", cmd)
+
+    @override_settings(VIDEO_TRICKPLAY_INTERVAL=10)
+    def test_rendition_command_writes_seek_previews(self):
+        """
+        The seek preview frames are one more branch of the encode filter graph, except in the first pass.
+        """
+        cmd = build_rendition_command("videos/sample.mp4", RENDITIONS[:2], get_encoding_profile('balanced'),
+                                      trickplay_size=(160, 90))
+        filter_graph = cmd[cmd.index("-filter_complex") + 1]
+        self.assertIn("split=3", filter_graph)
+        self.assertIn("[s2]fps=1/10,scale=160:90[trickplay]", filter_graph)
+        self.assertEqual(cmd[-7:], ["-map", "[trickplay]", "-f", "rawvideo", "-pix_fmt", "rgb24",
+                                    "videos/sample_trickplay.part.rgb"])
+
+        first_pass = build_rendition_command("videos/sample.mp4", RENDITIONS[:2], get_encoding_profile('archive'),
+                                             1, "passlog", trickplay_size=(160, 90))
+        self.assertNotIn("[trickplay]", first_pass)
+
+    def test_seek_preview_tiles_and_cues(self):
+        """
+        Frames are tiled row by row and every interval points at its tile.
+        """
+        # 23 Frames à 4x2 Pixel, jeder Frame trägt seinen Index als Farbwert
+        frames = np.broadcast_to(np.arange(23, dtype=np.uint8).reshape(23, 1, 1, 1), (23, 2, 4, 3))
+        sheets = list(tile_frames(frames, columns=5, rows=2))
+        self.assertEqual([sheet.shape for sheet in sheets], [(4, 20, 3), (4, 20, 3), (2, 20, 3)])
+        self.assertEqual(sheets[1][2, 8, 0], 17)
+        self.assertEqual(sheets[2][0, 12, 0], 0)
+
+        vtt = build_webvtt(23, (4, 2), 10, columns=5, rows=2, duration=225)
+        self.assertTrue(vtt.startswith("WEBVTT\n\n"))
+        self.assertIn("00:02:00.000 --> 00:02:10.000\nsprite_001.jpg#xywh=8,0,4,2", vtt)
+        self.assertIn("00:03:40.000 --> 00:03:45.000\nsprite_002.jpg#xywh=8,0,4,2", vtt)
+
+    @skipIf(shutil.which("ffmpeg") is None, "ffmpeg is not installed")
+    @override_settings(VIDEO_TRICKPLAY_INTERVAL=1, VIDEO_TRICKPLAY_COLUMNS=2, VIDEO_TRICKPLAY_ROWS=1)
+    def test_seek_previews_come_from_encode_pass(self):
+        """
+        The encode run leaves the preview frames behind, they are turned into sprites without another decode.
+        """
+        with tempfile.TemporaryDirectory() as directory, override_settings(MEDIA_ROOT=directory):
+            source = os.path.join(directory, "sample.mp4")
+            subprocess.run(["ffmpeg", "-y", "-f", "lavfi", "-i", "testsrc2=size=320x240:rate=10:duration=3",
+                            source], check=True, capture_output=True)
+            convert_video_renditions(source, RENDITIONS[:1], profile=get_encoding_profile('fast'),
+                                     trickplay_size=get_trickplay_size(source))
+            with patch('apps.videos.tasks.run_ffmpeg') as run_ffmpeg:
+                create_trickplay(source, 3, LocalMediaStorage())
+            run_ffmpeg.assert_not_called()
+
+            output_directory = os.path.join(directory, "sample_trickplay")
+            self.assertEqual(sorted(os.listdir(output_directory)),
+                             ["sprite_000.jpg", "sprite_001.jpg", "trickplay.vtt"])
+            with Image.open(os.path.join(output_directory, "sprite_000.jpg")) as sprite:
+                self.assertEqual(sprite.size, (320, 120))
+            with open(os.path.join(output_directory, "trickplay.vtt")) as vtt:
+                self.assertIn("sprite_001.jpg#xywh=0,0,160,120", vtt.read())
+
+    def test_capped_crf_profile_limits_bitrate(self):
+        """
+        Capped CRF uses the ladder bitrate as maxrate with keyframes on the segment grid.
+        """
+        cmd = build_rendition_command("videos/sample.mp4", RENDITIONS[:1], get_encoding_profile('balanced'))
+        self.assertEqual(cmd[cmd.index("-maxrate") + 1], "400k")
+        self.assertIn("-crf", cmd)
+        self.assertNotIn("-b:v", cmd)
+        self.assertEqual(cmd[cmd.index("-pix_fmt") + 1], "yuv420p")
+
+    def test_two_pass_first_pass_discards_output(self):
+        """
+        The first pass of a two-pass profile only writes the pass log.
+        """
+        profile = get_encoding_profile('archive')
+        cmd = build_rendition_command("videos/sample.mp4", RENDITIONS[:1], profile, 1, "/tmp/passlog")
+        self.assertEqual(cmd[cmd.index("-pass") + 1], "1")
+        self.assertEqual(cmd[cmd.index("-passlogfile") + 1], "/tmp/passlog/120p")
+        self.assertEqual(cmd[-1], os.devnull)
+        self.assertEqual(cmd[cmd.index("-force_key_frames") + 1], "expr:gte(t,n_forced*2)")
+
+    @override_settings(VIDEO_QUEUE_PROFILES={'default': 'fast'})
+    def test_profile_follows_queue_of_current_job(self):
+        """
+        Jobs pick the encoding profile configured for their queue.
+        """
+        queue = django_rq.get_queue('default', is_async=False)
+        job = queue.enqueue(get_encoding_profile)
+        self.assertEqual(job.result['name'], 'fast')
+        self.assertEqual(get_encoding_profile()['name'], 'balanced')
+
+    @patch('apps.videos.tasks.finish_processing')
+    @patch('apps.videos.tasks.fingerprint_source', return_value='')
+    @patch('apps.videos.tasks.create_thumbnails', return_value=[])
+    @patch('apps.videos.tasks.store_thumbnail')
+    @patch('apps.videos.tasks.convert_video_renditions', side_effect=RuntimeError("ffmpeg failed"))
+    def test_failed_job_is_logged_and_counted(self, *_):
+        """
+        Job runs are logged as JSON keyed by video id and counted by failure reason.
+        """
+        get_redis_connection('default').delete(METRICS_KEY)
+        queue = django_rq.get_queue('default', is_async=False)
+        with self.assertLogs("videoflix_backend.jobs", level="ERROR") as logs:
+            queue.enqueue(process_video, "videos/sample.mp4", 7, "thumbnails/sample.jpg")
+        record = json.loads(logs.records[0].getMessage())
+        self.assertEqual((record["job"], record["video_id"], record["queue"]), ("process_video", 7, "default"))
+        self.assertEqual(record["error"], "RuntimeError")
+        self.assertIsNotNone(record["queue_wait"])
+
+        metrics = render_metrics()
+        self.assertIn('videoflix_jobs_total{job="process_video",queue="default",status="failed"} 1', metrics)
+        self.assertIn('videoflix_job_failures_total{job="process_video",queue="default",reason="RuntimeError"} 1', metrics)
+
+    @patch('apps.videos.tasks.fingerprint_source', return_value='')
+    @patch('apps.videos.tasks.create_thumbnails', return_value=[])
+    @patch('apps.videos.tasks.store_thumbnail')
+    @patch('apps.videos.tasks.convert_video_renditions', side_effect=RuntimeError("ffmpeg failed"))
+    def test_failed_processing_marks_video_failed(self, *_):
+        """
+        An error during processing moves the video to the failed status.
+        """
+        video = Video.objects.create(title="Broken Video", description="Broken test video.", category="drama")
+        with self.assertRaises(RuntimeError):
+            process_video("videos/broken.mp4", video.id, "thumbnails/broken.jpg")
+        video.refresh_from_db()
+        self.assertEqual(video.status, Video.STATUS_FAILED)
+
+    @patch('apps.videos.tasks.get_current_job', return_value=Mock(retries_left=1))
+    @patch('apps.videos.tasks.fingerprint_source', return_value='')
+    @patch('apps.videos.tasks.create_thumbnails', return_value=[])
+    @patch('apps.videos.tasks.store_thumbnail')
+    @patch('apps.videos.tasks.convert_video_renditions', side_effect=RuntimeError("ffmpeg failed"))
+    def test_failed_attempt_with_retry_left_is_not_final(self, *_):
+        """
+        An attempt that RQ will retry only reports the retrying stage.
+        """
+        video = Video.objects.create(title="Flaky Video", description="Flaky test video.", category="drama")
+        with self.assertRaises(RuntimeError):
+            process_video("videos/flaky.mp4", video.id, "thumbnails/flaky.jpg")
+        video.refresh_from_db()
+        self.assertNotEqual(video.status, Video.STATUS_FAILED)
+        self.assertEqual(get_processing_status(video.id)['stage'], 'retrying')
+
+    def test_rendition_failure_callback_waits_for_last_retry(self):
+        """
+        The failure callback of the parallel jobs only fails the video on
+        the last attempt.
+        """
+        video = Video.objects.create(title="Parallel Video", description="Parallel test video.", category="drama")
+        error = RuntimeError("ffmpeg failed")
+
+        mark_processing_failed(Mock(retries_left=1, kwargs={'video_id': video.id}), None, RuntimeError, error, None)
+        video.refresh_from_db()
+        self.assertNotEqual(video.status, Video.STATUS_FAILED)
+        self.assertEqual(get_processing_status(video.id)['stage'], 'retrying')
+
+        mark_processing_failed(Mock(retries_left=0, kwargs={'video_id': video.id}), None, RuntimeError, error, None)
+        video.refresh_from_db()
+        self.assertEqual(video.status, Video.STATUS_FAILED)
+        self.assertEqual(get_processing_status(video.id)['stage'], 'failed')
+
+    def write_partial_outputs(self, cmd, *args, **kwargs):
+        """
+        Stands in for ffmpeg and writes every .part output of the command.
+        """
+        for argument in cmd:
+            if argument.endswith(".part.mp4"):
+                with open(argument, "wb") as output:
+                    output.write(b"encoded")
+
+    def test_retry_skips_finished_renditions(self):
+        """
+        Renditions completed by an earlier attempt are not encoded again.
+        """
+        with tempfile.TemporaryDirectory() as directory:
+            source = os.path.join(directory, "sample.mp4")
+            open(os.path.join(directory, "sample_120p.mp4"), "wb").close()
+            with patch('apps.videos.tasks.run_ffmpeg', side_effect=self.write_partial_outputs) as run_ffmpeg:
+                convert_video_renditions(source, RENDITIONS[:2], profile=get_encoding_profile('fast'))
+            cmd = run_ffmpeg.call_args[0][0]
+            self.assertNotIn(os.path.join(directory, "sample_120p.part.mp4"), cmd)
+            self.assertTrue(os.path.exists(os.path.join(directory, "sample_360p.mp4")))
+            self.assertFalse(os.path.exists(os.path.join(directory, "sample_360p.part.mp4")))
+
+    def test_failed_encode_leaves_no_partial_output(self):
+        """
+        An aborted ffmpeg run removes its partial outputs and commits nothing.
+        """
+        def fail(cmd, *args, **kwargs):
+            self.write_partial_outputs(cmd)
+            raise subprocess.CalledProcessError(1, cmd)
+
+        with tempfile.TemporaryDirectory() as directory:
+            source = os.path.join(directory, "sample.mp4")
+            with patch('apps.videos.tasks.run_ffmpeg', side_effect=fail):
+                with self.assertRaises(subprocess.CalledProcessError):
+                    convert_video_renditions(source, RENDITIONS[:1], profile=get_encoding_profile('fast'))
+            self.assertEqual(os.listdir(directory), [])
+
+    def test_identical_upload_reuses_renditions(self):
+        """
+        A source with a known content hash takes over the renditions of the original.
+        """
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        settings_override = override_settings(MEDIA_ROOT=directory)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        original = Video.objects.create(
+            title="Original", description="Encoded once.", category="drama", status=Video.STATUS_READY,
+            source_hash="a" * 64,
+        )
+        Video.objects.filter(id=original.id).update(media_manifest={
+            "renditions": [{"resolution": "120p", "path": f"videos/{original.id}/sample_120p.mp4"}]})
+        os.makedirs(os.path.join(directory, "videos", str(original.id)))
+        with open(os.path.join(directory, "videos", str(original.id), "sample_120p.mp4"), "wb") as rendition:
+            rendition.write(b"encoded")
+        copy = Video.objects.create(title="Re-import", description="Same file.", category="drama")
+
+        self.assertTrue(reuse_existing_renditions(copy.id, "a" * 64))
+        copy.refresh_from_db()
+        self.assertEqual(copy.media_manifest["renditions"][0]["path"], f"videos/{copy.id}/sample_120p.mp4")
+        self.assertTrue(os.path.exists(os.path.join(directory, "videos", str(copy.id), "sample_120p.mp4")))
+        self.assertFalse(reuse_existing_renditions(copy.id, "b" * 64))
+
+    @override_settings(VIDEO_THUMBNAIL_WIDTHS=[320, 640, 1280], VIDEO_THUMBNAIL_FORMATS=['webp', 'jpeg'])
+    def test_thumbnail_variants_are_not_upscaled(self):
+        """
+        Each format gets a variant per width up to the width of the uploaded image.
+        """
+        with tempfile.TemporaryDirectory() as directory:
+            image_path = os.path.join(directory, "upload.png")
+            Image.new("RGBA", (1000, 500), (200, 0, 0, 128)).save(image_path)
+            variants = render_thumbnail_variants(image_path, directory)
+            self.assertEqual([(variant["format"], variant["width"], variant["height"]) for variant in variants],
+                             [("webp", 320, 160), ("jpeg", 320, 160), ("webp", 640, 320), ("jpeg", 640, 320)])
+            with Image.open(variants[1]["path"]) as jpeg:
+                self.assertEqual((jpeg.format, jpeg.mode), ("JPEG", "RGB"))
+
+    @skipIf(shutil.which("ffmpeg") is None, "ffmpeg is not installed")
+    @override_settings(VIDEO_THUMBNAIL_WIDTHS=[160], VIDEO_THUMBNAIL_FORMATS=['jpeg'])
+    def test_poster_frame_without_thumbnail(self):
+        """
+        Videos without an uploaded thumbnail get variants of a frame from the video.
+        """
+        with tempfile.TemporaryDirectory() as directory, override_settings(MEDIA_ROOT=directory):
+            source = os.path.join(directory, "sample.mp4")
+            subprocess.run(["ffmpeg", "-y", "-f", "lavfi", "-i", "testsrc2=size=320x240:rate=10:duration=1",
+                            source], check=True, capture_output=True)
+            thumbnails = create_thumbnails(source, 9, None)
+            self.assertEqual(thumbnails, [{"format": "jpeg", "width": 160, "height": 120,
+                                           "path": "thumbnails/9/160.jpg"}])
+            self.assertTrue(os.path.exists(os.path.join(directory, "thumbnails", "9", "160.jpg")))
+
+    @patch('apps.videos.queues.ffmpeg_parse_infos', return_value={'duration': 42.0})
+    def test_short_clips_go_to_high_priority_queue(self, _):
+        """
+        Short, small sources are routed to transcode-high, long ones to transcode-bulk.
+        """
+        with tempfile.NamedTemporaryFile(suffix=".mp4") as source:
+            self.assertEqual(select_transcode_queue(source.name), "transcode-high")
+            with override_settings(VIDEO_PRIORITY_MAX_DURATION=30):
+                self.assertEqual(select_transcode_queue(source.name), "transcode-bulk")
+            with override_settings(VIDEO_PRIORITY_MAX_SIZE=-1):
+                self.assertEqual(select_transcode_queue(source.name), "transcode-bulk")
+        self.assertEqual(select_transcode_queue("videos/missing.mp4"), "transcode-bulk")
+
+    @patch('apps.videos.signals.select_transcode_queue', return_value='transcode-bulk')
+    @patch('apps.videos.signals.get_queue')
+    def test_cleanup_runs_on_maintenance_queue(self, mock_get_queue, _):
+        """
+        Deleting a video enqueues the file cleanup on the maintenance queue.
+        """
+        with self.captureOnCommitCallbacks(execute=True):
+            video = Video.objects.create(title="Old Video", description="To be removed.", category="drama",
+                                         video_file="videos/old.mp4", thumbnail="thumbnails/old.jpg")
+        mock_get_queue.assert_called_once_with("transcode-bulk")
+        self.assertIs(mock_get_queue.return_value.enqueue.call_args.args[0], process_video)
+        mock_get_queue.reset_mock()
+        video_id = video.id
+        with self.captureOnCommitCallbacks(execute=True):
+            video.delete()
+        mock_get_queue.assert_called_once_with("maintenance")
+        mock_get_queue.return_value.enqueue.assert_called_once_with(remove_video_files, video_id)
+
+    @patch('apps.videos.signals.select_transcode_queue', return_value='transcode-bulk')
+    @patch('apps.videos.signals.get_queue')
+    def test_processing_is_enqueued_after_commit(self, mock_get_queue, select_transcode_queue):
+        """
+        Neither the probe nor the enqueue run before the transaction that created the video commits.
+        """
+        with self.captureOnCommitCallbacks(execute=True):
+            video = Video.objects.create(title="New Video", description="Just uploaded.", category="drama",
+                                         video_file="videos/new.mp4")
+            select_transcode_queue.assert_not_called()
+            mock_get_queue.assert_not_called()
+        mock_get_queue.assert_called_once_with("transcode-bulk")
+        args = mock_get_queue.return_value.enqueue.call_args.args
+        self.assertEqual((args[0], args[2]), (process_video, video.id))
+
+    def test_parallel_processing_waits_for_all_renditions(self):
+        """
+        The fan-in job depends on one job per rendition.
+        """
+        queue = django_rq.get_queue('default')
+        finalize_job = enqueue_parallel_processing(queue, "videos/sample.mp4", 1, "thumbnails/sample.jpg")
+        self.assertEqual(len(finalize_job.dependency_ids), len(RENDITIONS))
+        self.assertEqual(finalize_job.get_status(), 'deferred')
+
+    @override_settings(VIDEO_PROCESSING_MODE='chunked')
+    @patch('apps.videos.tasks.finish_processing')
+    @patch('apps.videos.tasks.fingerprint_source', return_value='')
+    @patch('apps.videos.tasks.create_thumbnails', return_value=[])
+    @patch('apps.videos.tasks.store_thumbnail')
+    @patch('apps.videos.tasks.convert_video_chunked')
+    def test_chunked_mode_encodes_segments(self, convert_video_chunked, *_):
+        """
+        In chunked mode process_video hands the source to the segment encoder.
+        """
+        process_video("videos/sample.mp4", 1, "thumbnails/sample.jpg")
+        convert_video_chunked.assert_called_once_with("videos/sample.mp4", RENDITIONS, video_id=1, profile=None)
+
+    def test_parse_ffmpeg_progress(self):
+        """
+        ffmpeg -progress output is turned into percent, fps and ETA.
+        """
+        lines = ["frame=150", "fps=25.0", "out_time_us=3000000", "speed=2.0x", "progress=continue",
+                 "frame=300", "fps=25.0", "out_time_us=6000000", "speed=2.0x", "progress=end"]
+        reports = list(parse_ffmpeg_progress(lines, duration=6.0))
+        self.assertEqual(reports[0]["percent"], 50.0)
+        self.assertEqual(reports[0]["eta"], 2)
+        self.assertEqual(reports[1]["state"], "done")
+
+    def test_hls_command_builds_master_playlist(self):
+        """
+        The HLS packager copies every rendition into one master playlist.
+        """
+        cmd = build_hls_command("videos/sample.mp4", RENDITIONS, has_audio=True)
+        self.assertEqual(cmd.count("-i"), len(RENDITIONS))
+        self.assertIn("copy", cmd)
+        self.assertEqual(cmd[cmd.index("-master_pl_name") + 1], "master.m3u8")
+        self.assertIn("v:0,a:0,name:120p", cmd[cmd.index("-var_stream_map") + 1])
+
+    def test_ladder_skips_renditions_above_source(self):
+        """
+        A 480p source gets no upscaled rungs and keeps its aspect ratio.
+        """
+        probe = {'width': 640, 'height': 480, 'fps': 25, 'duration': 60, 'bitrate': 1500, 'has_audio': True}
+        renditions = select_renditions(probe, RENDITIONS)
+        self.assertEqual([rendition[0] for rendition in renditions], ["120p", "360p"])
+        self.assertEqual(renditions[-1][1:3], (480, 360))
+
+    def test_ladder_caps_bitrate_at_source(self):
+        """
+        No rendition gets more bitrate than the source has.
+        """
+        probe = {'width': 1920, 'height': 1080, 'fps': 25, 'duration': 60, 'bitrate': 1000, 'has_audio': True}
+        renditions = select_renditions(probe, RENDITIONS)
+        self.assertEqual(len(renditions), len(RENDITIONS))
+        self.assertTrue(all(rendition[3] <= 1000 for rendition in renditions))
+
+    @skipIf(shutil.which("ffmpeg") is None, "ffmpeg is not installed")
+    def test_bench_transcode_reports_json(self):
+        """
+        The transcode benchmark encodes a synthetic source and reports its measurements.
+        """
+        with tempfile.TemporaryDirectory() as directory:
+            report_path = os.path.join(directory, "report.json")
+            call_command("bench_transcode", durations="1", resolutions="240", profiles="fast",
+                         output=report_path, work_dir=directory, stderr=io.StringIO())
+            with open(report_path) as report_file:
+                result = json.load(report_file)["results"][0]
+        self.assertEqual(result["profile"], "fast")
+        self.assertGreater(result["realtime_factor"], 0)
+        self.assertGreater(result["output_bytes"]["120p"], 0)
+        self.assertGreater(result["output_bytes"]["trickplay"], 0)
+
+    def test_bench_api_percentiles(self):
+        """
+        The API benchmark reports nearest-rank percentiles.
+        """
+        latencies = list(range(1, 101))
+        self.assertEqual(percentile(latencies, 50), 50)
+        self.assertEqual(percentile(latencies, 99), 99)
+        self.assertEqual(summarize(latencies)["p95"], 95)
+        self.assertIsNone(summarize([]))
+
+
+class VideoFileStreamTests(TestCase):
+    """
+    Tests for the byte-range media endpoint.
+    """
+
+    def setUp(self):
+        """
+        Write a small rendition file into a temporary media root.
+        """
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        self.settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        self.settings_override.enable()
+        self.addCleanup(self.settings_override.disable)
+
+        os.makedirs(os.path.join(self.media_root, 'videos', '1'))
+        self.content = bytes(range(256)) * 4
+        with open(os.path.join(self.media_root, 'videos', '1', 'sample_360p.mp4'), 'wb') as file:
+            file.write(self.content)
+        self.url = reverse('video-file', args=[1, 'sample_360p.mp4'])
+
+    def test_full_file(self):
+        """
+        Without a Range header the whole file is returned.
+        """
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertEqual(response['Content-Type'], 'video/mp4')
+        self.assertEqual(b''.join(response.streaming_content), self.content)
+
+    def test_single_range(self):
+        """
+        A single range returns 206 with the requested bytes only.
+        """
+        response = self.client.get(self.url, HTTP_RANGE='bytes=100-199')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], f'bytes 100-199/{len(self.content)}')
+        self.assertEqual(b''.join(response.streaming_content), self.content[100:200])
+
+    def test_multiple_ranges(self):
+        """
+        Several ranges are returned as multipart/byteranges.
+        """
+        response = self.client.get(self.url, HTTP_RANGE='bytes=0-9,-10')
+        body = b''.join(response.streaming_content)
+        self.assertEqual(response.status_code, 206)
+        self.assertTrue(response['Content-Type'].startswith('multipart/byteranges'))
+        self.assertEqual(int(response['Content-Length']), len(body))
+        self.assertIn(self.content[:10], body)
+        self.assertIn(self.content[-10:], body)
+
+    def test_unsatisfiable_range(self):
+        """
+        Ranges beyond the end of the file are rejected with 416.
+        """
+        response = self.client.get(self.url, HTTP_RANGE=f'bytes={len(self.content)}-')
+        self.assertEqual(response.status_code, 416)
+
+    def test_etag_not_modified(self):
+        """
+        A matching If-None-Match header returns 304.
+        """
+        etag = self.client.get(self.url)['ETag']
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_path_outside_video_directory(self):
+        """
+        Paths escaping the video directory are not served.
+        """
+        response = self.client.get(reverse('video-file', args=[1, '../../secret.txt']))
+        self.assertEqual(response.status_code, 404)
+
+
+@override_settings(VIDEO_PROGRESS_WRITE_BEHIND=True)
+class VideoProgressWriteBehindTests(TestCase):
+    """
+    Tests for the buffered progress heartbeats.
+    """
+
+    def setUp(self):
+        """
+        Prepare a user, a video and an authenticated client.
+        """
+        self.user = UserAccount.objects.create_user(email="buffered@mail.com", password="password123")
+        self.client.defaults['HTTP_AUTHORIZATION'] = f'Bearer {RefreshToken.for_user(self.user).access_token}'
+        self.video = Video.objects.create(title="Buffered Video", description="Buffered test video.",
+                                          category="drama")
+        self.save_progress_url = reverse("video-progress-save-progress", args=[self.video.id])
+        self.addCleanup(flush_progress_buffer)
+
+    def test_heartbeat_is_buffered_and_flushed(self):
+        """
+        Heartbeats are not written to the database until the buffer is flushed.
+        """
+        self.client.post(self.save_progress_url, {"last_position": 42.5})
+        self.assertFalse(VideoProgress.objects.filter(user=self.user).exists())
+
+        flush_progress_buffer()
+        progress = VideoProgress.objects.get(user=self.user, video=self.video)
+        self.assertEqual(float(progress.last_position), 42.5)
+        self.assertTrue(progress.started)
+
+    def test_flush_skips_deleted_users(self):
+        """
+        A heartbeat of a user deleted before the flush does not block the positions of other users.
+        """
+        other_user = UserAccount.objects.create_user(email="deleted@mail.com", password="password123")
+        self.client.post(self.save_progress_url, {"last_position": 42.5})
+        other_client = Client(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(other_user).access_token}')
+        other_client.post(self.save_progress_url, {"last_position": 7})
+        other_user.delete()
+
+        flush_progress_buffer()
+        self.assertEqual(float(VideoProgress.objects.get(user=self.user, video=self.video).last_position), 42.5)
+        self.assertEqual(flush_progress_buffer(), 0)
+
+    def test_interrupted_flush_is_retried(self):
+        """
+        Entries left by a flush that died are merged with newer heartbeats and saved by the next flush.
+        """
+        other_video = Video.objects.create(title="Other Video", description="Other test video.", category="drama")
+        connection = get_redis_connection('default')
+        # Stand eines Workers, der nach dem Umbenennen abgestürzt ist
+        connection.hset(get_key(FLUSHING_KEY, user_id=self.user.id),
+                        mapping={self.video.id: '10', other_video.id: '5'})
+        connection.sadd(get_key(FLUSHING_USERS_KEY), self.user.id)
+        self.client.post(self.save_progress_url, {"last_position": 20})
+
+        self.assertEqual(flush_progress_buffer(), 2)
+        positions = dict(VideoProgress.objects.filter(user=self.user).values_list('video_id', 'last_position'))
+        self.assertEqual({video_id: float(position) for video_id, position in positions.items()},
+                         {self.video.id: 20.0, other_video.id: 5.0})
+        self.assertFalse(connection.exists(get_key(FLUSHING_KEY, user_id=self.user.id)))
+        self.assertFalse(connection.scard(get_key(FLUSHING_USERS_KEY)))
+
+    def test_in_progress_sees_buffered_position(self):
+        """
+        The continue watching list reflects positions that are still buffered.
+        """
+        VideoProgress.objects.create(user=self.user, video=self.video, started=True, last_position=10)
+        self.client.post(self.save_progress_url, {"last_position": 99})
+        response = self.client.get(reverse("video-progress-in-progress"))
+        self.assertEqual(float(response.json()[0]["last_position"]), 99)
+
+
+class VideoUploadTests(TestCase):
+    """
+    Tests for the resumable tus upload API.
+    """
+
+    def setUp(self):
+        """
+        Prepare a staff user, an authenticated client and a temporary media root.
+        """
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        self.settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        self.settings_override.enable()
+        self.addCleanup(self.settings_override.disable)
+
+        self.user = UserAccount.objects.create_user(email="staff@mail.com", password="password123", is_staff=True)
+        self.client.defaults['HTTP_AUTHORIZATION'] = f'Bearer {RefreshToken.for_user(self.user).access_token}'
+        self.client.defaults['HTTP_TUS_RESUMABLE'] = '1.0.0'
+        self.content = os.urandom(3000)
+
+    def create_upload(self):
+        """
+        Register an upload for self.content and return its URL.
+        """
+        metadata = ','.join(f'{key} {base64.b64encode(value.encode()).decode()}' for key, value in {
+            'title': 'Uploaded Video', 'description': 'Uploaded in chunks.', 'category': 'drama',
+            'filename': 'uploaded.mp4'}.items())
+        response = self.client.post(reverse('video-upload-list'), HTTP_UPLOAD_LENGTH=str(len(self.content)),
+                                    HTTP_UPLOAD_METADATA=metadata)
+        self.assertEqual(response.status_code, 201)
+        return response['Location']
+
+    def send_chunk(self, url, offset, chunk, checksum=None):
+        """
+        PATCH one chunk with an optional sha256 Upload-Checksum.
+        """
+        headers = {'HTTP_UPLOAD_OFFSET': str(offset)}
+        if checksum is not None:
+            headers['HTTP_UPLOAD_CHECKSUM'] = f'sha256 {base64.b64encode(checksum).decode()}'
+        return self.client.patch(url, chunk, content_type='application/offset+octet-stream', **headers)
+
+    @patch('apps.videos.signals.get_queue')
+    def test_chunked_upload_creates_video(self, mock_get_queue):
+        """
+        Two verified chunks complete the upload and enqueue the processing.
+        """
+        url = self.create_upload()
+        first, second = self.content[:1000], self.content[1000:]
+
+        response = self.send_chunk(url, 0, first, hashlib.sha256(first).digest())
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(response['Upload-Offset'], '1000')
+        self.assertEqual(self.client.head(url)['Upload-Offset'], '1000')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.send_chunk(url, 1000, second, hashlib.sha256(second).digest())
+        self.assertEqual(response.status_code, 204)
+        video = Video.objects.get(id=response['Video-Id'])
+        self.assertEqual(video.title, 'Uploaded Video')
+        with open(video.video_file.path, 'rb') as file:
+            self.assertEqual(file.read(), self.content)
+        self.assertTrue(mock_get_queue.return_value.enqueue.called)
+
+    @patch('apps.videos.signals.get_queue')
+    def test_upload_is_completed_once(self, mock_get_queue):
+        """
+        A second completion of the same upload returns the first video instead of creating another one.
+        """
+        url = self.create_upload()
+        stale_upload = VideoUpload.objects.get()
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.send_chunk(url, 0, self.content)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            video = complete_upload(stale_upload)
+        self.assertEqual(str(video.id), response['Video-Id'])
+        self.assertEqual(Video.objects.count(), 1)
+        self.assertEqual(mock_get_queue.return_value.enqueue.call_count, 1)
+
+    def test_wrong_offset_conflicts(self):
+        """
+        A chunk that does not start at the stored offset is rejected.
+        """
+        url = self.create_upload()
+        response = self.send_chunk(url, 500, self.content[500:1000])
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response['Upload-Offset'], '0')
+
+    def test_checksum_mismatch_discards_chunk(self):
+        """
+        A chunk whose checksum does not match is not stored.
+        """
+        url = self.create_upload()
+        response = self.send_chunk(url, 0, self.content[:1000], hashlib.sha256(b'other').digest())
+        self.assertEqual(response.status_code, 460)
+        upload = VideoUpload.objects.get()
+        self.assertEqual(upload.offset, 0)
+        self.assertEqual(os.path.getsize(upload.partial_path), 0)
+
+    def test_requires_tus_version(self):
+        """
+        Requests without the Tus-Resumable header are refused.
+        """
+        del self.client.defaults['HTTP_TUS_RESUMABLE']
+        response = self.client.post(reverse('video-upload-list'), HTTP_UPLOAD_LENGTH='10')
+        self.assertEqual(response.status_code, 412)
+
+    def test_termination_removes_partial_file(self):
+        """
+        DELETE cancels the upload and removes its partial file.
+        """
+        url = self.create_upload()
+        self.send_chunk(url, 0, self.content[:1000])
+        upload = VideoUpload.objects.get()
+        self.assertEqual(self.client.delete(url).status_code, 204)
+        self.assertFalse(VideoUpload.objects.exists())
+        self.assertFalse(os.path.exists(upload.partial_path))
+
+
+class MediaStorageTests(TestCase):
+    """
+    Tests for the local and S3 media storage backends.
+    """
+
+    def setUp(self):
+        """
+        Prepare a temporary media root and a source directory with outputs.
+        """
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        self.settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        self.settings_override.enable()
+        self.addCleanup(self.settings_override.disable)
+
+        self.source_directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.source_directory)
+        self.source = os.path.join(self.source_directory, "sample.mp4")
+        with open(os.path.join(self.source_directory, "sample_120p.mp4"), "wb") as rendition:
+            rendition.write(b"encoded")
+        os.makedirs(os.path.join(self.source_directory, "sample_hls", "120p"))
+        for name in ("master.m3u8", "120p/segment_000.ts"):
+            with open(os.path.join(self.source_directory, "sample_hls", name), "wb") as output:
+                output.write(b"hls")
+
+    def test_local_storage_stores_below_media_root(self):
+        """
+        Renditions and streaming outputs end up in MEDIA_ROOT, independent of the working directory.
+        """
+        stored_bytes = store_video_files(self.source, 7, RENDITIONS[:1], LocalMediaStorage())
+        self.assertEqual(stored_bytes, 13)
+        for name in ("sample_120p.mp4", "hls/master.m3u8", "hls/120p/segment_000.ts"):
+            self.assertTrue(os.path.exists(os.path.join(self.media_root, "videos", "7", name)))
+
+        remove_videos(7)
+        self.assertFalse(os.path.exists(os.path.join(self.media_root, "videos", "7")))
+
+    def test_local_storage_keeps_outputs_for_retries(self):
+        """
+        Storing keeps the local outputs, so an attempt that fails before the manifest is saved can be retried.
+        """
+        store_video_files(self.source, 7, RENDITIONS[:1], LocalMediaStorage())
+        self.assertTrue(os.path.exists(os.path.join(self.source_directory, "sample_120p.mp4")))
+        self.assertTrue(os.path.exists(os.path.join(self.source_directory, "sample_hls", "master.m3u8")))
+
+        # Der Retry speichert dieselben Dateien noch einmal
+        store_video_files(self.source, 7, RENDITIONS[:1], LocalMediaStorage())
+        with open(os.path.join(self.media_root, "videos", "7", "sample_120p.mp4"), "rb") as stored:
+            self.assertEqual(stored.read(), b"encoded")
+
+    @override_settings(VIDEO_STORAGE_BACKEND='s3', VIDEO_STORAGE_S3_BUCKET='media',
+                       VIDEO_STORAGE_S3_ENDPOINT_URL='http://minio:9000', VIDEO_STORAGE_S3_PUBLIC_URL='')
+    def test_s3_media_base_url(self):
+        """
+        Without a public URL the bucket URL of the endpoint is used.
+        """
+        self.assertEqual(get_media_base_url(), 'http://minio:9000/media/')
+
+    def test_media_storage_is_reused(self):
+        """
+        The storage is built once and rebuilt when the settings change.
+        """
+        storage = get_media_storage()
+        self.assertIs(get_media_storage(), storage)
+        self.assertEqual(storage.location, self.media_root)
+        with tempfile.TemporaryDirectory() as directory, override_settings(MEDIA_ROOT=directory):
+            self.assertEqual(get_media_storage().location, directory)
+        self.assertEqual(get_media_storage().location, self.media_root)
+
+    @skipIf(mock_aws is None, "moto is not installed")
+    def test_s3_storage_uploads_copies_and_deletes(self):
+        """
+        Large renditions are uploaded in parts, prefixes are copied and deleted on the server.
+        """
+        with mock_aws():
+            storage = S3MediaStorage('media', region='us-east-1', multipart_threshold=5 * 1024 * 1024,
+                                     multipart_chunksize=5 * 1024 * 1024, max_concurrency=4)
+            storage.client.create_bucket(Bucket='media')
+            with open(os.path.join(self.source_directory, "sample_120p.mp4"), "wb") as rendition:
+                rendition.write(os.urandom(11 * 1024 * 1024))
+
+            store_video_files(self.source, 7, RENDITIONS[:1], storage)
+            head = storage.client.head_object(Bucket='media', Key='videos/7/sample_120p.mp4')
+            self.assertEqual(head['ContentLength'], 11 * 1024 * 1024)
+            self.assertIn('-3', head['ETag'])
+            self.assertEqual(head['ContentType'], 'video/mp4')
+            self.assertTrue(storage.exists('videos/7/hls/120p/segment_000.ts'))
+
+            storage.copy_prefix('videos/7/', 'videos/8/')
+            self.assertTrue(storage.exists('videos/8/hls/master.m3u8'))
+            storage.delete_prefix('videos/7/')
+            self.assertFalse(storage.has_prefix('videos/7/'))
+            self.assertTrue(storage.has_prefix('videos/8/'))
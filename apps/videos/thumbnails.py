@@ -0,0 +1,100 @@
+import logging
+import os
+from django.conf import settings
+from PIL import Image, ImageOps
+
+try:
+    # Registriert AVIF bei Pillow, wenn das Plugin installiert ist
+    import pillow_avif  # noqa: F401
+except ImportError:
+    pillow_avif = None
+
+logger = logging.getLogger(__name__)
+
+# Pillow-Formatnamen und Dateiendungen der Varianten
+IMAGE_FORMATS = {
+    'avif': ('AVIF', 'avif'),
+    'webp': ('WEBP', 'webp'),
+    'jpeg': ('JPEG', 'jpg'),
+}
+# Position des automatischen Posters, relativ zur Videolänge
+POSTER_POSITION = 0.1
+MAX_POSTER_OFFSET = 30  # Sekunden
+
+
+def get_thumbnail_formats():
+    """
+    Returns the configured thumbnail formats this Pillow build can write.
+    AVIF needs Pillow 11.3+ or the pillow-avif-plugin.
+    """
+    Image.init()
+    formats = [name for name in settings.VIDEO_THUMBNAIL_FORMATS if IMAGE_FORMATS[name][0] in Image.SAVE]
+    skipped = set(settings.VIDEO_THUMBNAIL_FORMATS) - set(formats)
+    if skipped:
+        logger.warning("Pillow cannot write %s, skipping these thumbnail formats", ', '.join(sorted(skipped)))
+    return formats
+
+
+def get_poster_offset(duration):
+    """
+    Returns where the poster frame is taken from. The first frames are
+    often black, so a frame a bit into the video is used.
+    """
+    return min((duration or 0) * POSTER_POSITION, MAX_POSTER_OFFSET)
+
+
+def build_poster_command(video_path, output_path, offset):
+    """
+    Builds the ffmpeg command that extracts a single full-size frame.
+    """
+    return [
+        "ffmpeg", "-y", "-ss", f"{offset:.3f}", "-i", video_path,
+        "-map", "0:v:0", "-frames:v", "1", "-q:v", "2", output_path,
+    ]
+
+
+def get_variant_widths(source_width):
+    """
+    Returns the configured widths that do not upscale the source. Small
+    sources still get one variant at their own width.
+    """
+    widths = [width for width in settings.VIDEO_THUMBNAIL_WIDTHS if width <= source_width]
+    return widths or [source_width]
+
+
+def render_thumbnail_variants(image_path, output_directory):
+    """
+    Resizes the image to every configured width and format. Returns a
+    list of dicts with format, width, height and the local path.
+    """
+    with Image.open(image_path) as source:
+        # Handyfotos sind oft nur per EXIF gedreht
+        image = ImageOps.exif_transpose(source)
+        image = image.convert('RGBA' if image.mode in ('RGBA', 'LA', 'P') else 'RGB')
+
+    variants = []
+    formats = get_thumbnail_formats()
+    for width in get_variant_widths(image.width):
+        height = max(round(image.height * width / image.width), 1)
+        resized = image if width == image.width else image.resize((width, height), Image.LANCZOS)
+        for name in formats:
+            pillow_format, extension = IMAGE_FORMATS[name]
+            output_path = os.path.join(output_directory, f"{width}.{extension}")
+            # JPEG kennt keine Transparenz
+            output = resized.convert('RGB') if name == 'jpeg' else resized
+            output.save(output_path, pillow_format, quality=settings.VIDEO_THUMBNAIL_QUALITY[name],
+                        **({'optimize': True, 'progressive': True} if name == 'jpeg' else {}))
+            variants.append({'format': name, 'width': width, 'height': height, 'path': output_path})
+    return variants
+
+
+def build_srcset(variants, base_url):
+    """
+    Groups the variants by format into srcset strings,
+    e.g. {'webp': 'https://.../320.webp 320w, https://.../640.webp 640w'}.
+    """
+    srcset = {}
+    for variant in sorted(variants, key=lambda variant: variant['width']):
+        entry = f"{base_url}{variant['path']} {variant['width']}w"
+        srcset[variant['format']] = f"{srcset[variant['format']]}, {entry}" if variant['format'] in srcset else entry
+    return srcset
@@ -0,0 +1,139 @@
+import os
+import numpy as np
+from django.conf import settings
+from PIL import Image
+from apps.videos.ladder import probe_video
+
+TRICKPLAY_DIRECTORY = 'trickplay'
+TRICKPLAY_VTT = 'trickplay.vtt'
+BYTES_PER_PIXEL = 3  # rgb24
+
+
+def get_trickplay_size(video_path):
+    """
+    Returns the (width, height) of the preview frames, or None if seek
+    previews are disabled or the source has no video stream. The height
+    follows the aspect ratio of the source and is kept even.
+    """
+    if not settings.VIDEO_TRICKPLAY_ENABLED:
+        return None
+    try:
+        probe = probe_video(video_path)
+    except (IOError, OSError):
+        return None
+    if not probe['width'] or not probe['height']:
+        return None
+    width = settings.VIDEO_TRICKPLAY_WIDTH
+    return width, max(round(width * probe['height'] / probe['width'] / 2) * 2, 2)
+
+
+def build_trickplay_filter(size):
+    """
+    Returns the filter that picks one frame per interval and scales it.
+    """
+    width, height = size
+    return f"fps=1/{settings.VIDEO_TRICKPLAY_INTERVAL},scale={width}:{height}"
+
+
+def get_trickplay_output_args(output_path):
+    """
+    Returns the output options that write the preview frames as raw RGB.
+    """
+    return ["-f", "rawvideo", "-pix_fmt", "rgb24", output_path]
+
+
+def build_trickplay_command(video_path, size, output_path):
+    """
+    Builds a standalone extraction run, used when the frames could not be
+    taken from the encode pass (chunked and parallel mode, retries).
+    """
+    return [
+        "ffmpeg", "-y", "-i", video_path, "-map", "0:v:0", "-vf", build_trickplay_filter(size),
+        *get_trickplay_output_args(output_path),
+    ]
+
+
+def read_frames(raw_path, size):
+    """
+    Maps the raw frames into a (frames, height, width, 3) array without
+    reading the whole file into memory.
+    """
+    width, height = size
+    frame_count = os.path.getsize(raw_path) // (width * height * BYTES_PER_PIXEL)
+    if not frame_count:
+        return np.zeros((0, height, width, BYTES_PER_PIXEL), dtype=np.uint8)
+    return np.memmap(raw_path, dtype=np.uint8, mode='r', shape=(frame_count, height, width, BYTES_PER_PIXEL))
+
+
+def tile_frames(frames, columns, rows):
+    """
+    Yields one mosaic per sprite sheet. Frames are placed row by row; the
+    last sheet only gets as many rows as it needs.
+    """
+    per_sheet = columns * rows
+    _, height, width, channels = frames.shape
+    for start in range(0, len(frames), per_sheet):
+        sheet = frames[start:start + per_sheet]
+        sheet_rows = -(-len(sheet) // columns)
+        padding = sheet_rows * columns - len(sheet)
+        if padding:
+            sheet = np.concatenate([sheet, np.zeros((padding, height, width, channels), dtype=sheet.dtype)])
+        # (rows, columns, h, w, c) -> (rows, h, columns, w, c) -> Bild
+        yield (sheet.reshape(sheet_rows, columns, height, width, channels)
+               .transpose(0, 2, 1, 3, 4)
+               .reshape(sheet_rows * height, columns * width, channels))
+
+
+def format_timestamp(seconds):
+    """
+    Formats seconds as a WebVTT timestamp (HH:MM:SS.mmm).
+    """
+    milliseconds = round(seconds * 1000)
+    hours, milliseconds = divmod(milliseconds, 3600 * 1000)
+    minutes, milliseconds = divmod(milliseconds, 60 * 1000)
+    return f"{hours:02d}:{minutes:02d}:{milliseconds // 1000:02d}.{milliseconds % 1000:03d}"
+
+
+def build_webvtt(frame_count, size, interval, columns, rows, duration=None):
+    """
+    Builds the WebVTT track that maps every interval to its tile,
+    e.g. "sprite_000.jpg#xywh=160,0,160,90".
+    """
+    width, height = size
+    per_sheet = columns * rows
+    lines = ["WEBVTT", ""]
+    for index in range(frame_count):
+        start = index * interval
+        end = start + interval if duration is None else min(start + interval, max(duration, start))
+        position = index % per_sheet
+        x, y = (position % columns) * width, (position // columns) * height
+        lines += [
+            f"{format_timestamp(start)} --> {format_timestamp(end)}",
+            f"{get_sprite_name(index // per_sheet)}#xywh={x},{y},{width},{height}",
+            "",
+        ]
+    return "\n".join(lines)
+
+
+def get_sprite_name(sheet_index):
+    """
+    Returns the file name of a sprite sheet.
+    """
+    return f"sprite_{sheet_index:03d}.jpg"
+
+
+def write_trickplay(raw_path, size, output_directory, duration=None):
+    """
+    Tiles the raw preview frames into JPEG sprite sheets and writes the
+    WebVTT index next to them. Returns the number of frames.
+    """
+    frames = read_frames(raw_path, size)
+    columns, rows = settings.VIDEO_TRICKPLAY_COLUMNS, settings.VIDEO_TRICKPLAY_ROWS
+    os.makedirs(output_directory, exist_ok=True)
+    for sheet_index, sheet in enumerate(tile_frames(frames, columns, rows)):
+        Image.fromarray(sheet).save(os.path.join(output_directory, get_sprite_name(sheet_index)), 'JPEG',
+                                    quality=settings.VIDEO_TRICKPLAY_QUALITY, optimize=True)
+
+    with open(os.path.join(output_directory, TRICKPLAY_VTT), 'w') as vtt:
+        vtt.write(build_webvtt(len(frames), size, settings.VIDEO_TRICKPLAY_INTERVAL, columns, rows, duration))
+    return len(frames)
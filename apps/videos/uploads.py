@@ -0,0 +1,133 @@
+import base64
+import binascii
+import hashlib
+import os
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.http.request import UnreadablePostError
+from django.utils import timezone
+from apps.videos.models import Video, VideoUpload
+
+TUS_VERSION = '1.0.0'
+TUS_EXTENSIONS = 'creation,checksum,termination'
+TUS_CHECKSUM_ALGORITHMS = ('sha256',)
+UPLOAD_LOCK_KEY = 'videoflix:upload:lock:{upload_id}'
+
+
+class ChecksumMismatch(Exception):
+    """
+    The received chunk does not match its Upload-Checksum header.
+    """
+
+
+class UploadAlreadyCompleted(Exception):
+    """
+    A concurrent request has already created the video of the upload.
+    """
+
+
+def parse_upload_metadata(header):
+    """
+    Decodes the tus Upload-Metadata header ("key base64value,key2 ...")
+    into a dict. Returns None if the header is malformed.
+    """
+    metadata = {}
+    for pair in filter(None, (item.strip() for item in (header or '').split(','))):
+        key, _, value = pair.partition(' ')
+        try:
+            metadata[key] = base64.b64decode(value, validate=True).decode() if value else ''
+        except (binascii.Error, UnicodeDecodeError):
+            return None
+    return metadata
+
+
+def parse_upload_checksum(header):
+    """
+    Parses the tus Upload-Checksum header ("sha256 base64digest") into
+    (algorithm, digest). Returns None if the header is malformed.
+    """
+    algorithm, _, value = (header or '').strip().partition(' ')
+    try:
+        return algorithm.lower(), base64.b64decode(value.strip(), validate=True)
+    except binascii.Error:
+        return None
+
+
+def write_chunk(upload, stream, checksum=None):
+    """
+    Streams the request body to the partial file at the current offset
+    without buffering it in memory and hashes it on the way. Accepts at
+    most the remaining upload length. Returns the number of stored bytes.
+    """
+    remaining = upload.upload_length - upload.offset
+    digest = hashlib.sha256()
+    written = 0
+    interrupted = False
+
+    with open(upload.partial_path, 'r+b') as partial:
+        partial.seek(upload.offset)
+        try:
+            while written < remaining:
+                chunk = stream.read(min(settings.VIDEO_UPLOAD_READ_SIZE, remaining - written))
+                if not chunk:
+                    break
+                partial.write(chunk)
+                digest.update(chunk)
+                written += len(chunk)
+        except (UnreadablePostError, OSError):
+            # Verbindung abgebrochen: ohne Checksumme zählt, was angekommen ist
+            interrupted = True
+
+        if checksum and (interrupted or digest.digest() != checksum[1]):
+            partial.truncate(upload.offset)
+            raise ChecksumMismatch()
+        partial.truncate(upload.offset + written)
+    return written
+
+
+def create_partial_file(upload):
+    """
+    Creates the empty partial file of a new upload.
+    """
+    os.makedirs(os.path.dirname(upload.partial_path), exist_ok=True)
+    open(upload.partial_path, 'wb').close()
+
+
+def remove_partial_file(upload):
+    """
+    Deletes the partial file of an upload if it exists.
+    """
+    if os.path.exists(upload.partial_path):
+        os.remove(upload.partial_path)
+
+
+def complete_upload(upload):
+    """
+    Moves the finished file into the video storage and creates the video.
+    Saving the video enqueues its processing through the post_save signal.
+    Only the request that links its video to the upload completes it, a
+    concurrent one gets the video of the first and leaves the file alone.
+    """
+    name = default_storage.get_available_name(os.path.join('videos', os.path.basename(upload.filename)))
+    try:
+        with transaction.atomic():
+            video = Video.objects.create(
+                title=upload.title,
+                description=upload.description,
+                category=upload.category,
+                video_file=name,
+            )
+            # Bedingter Übergang: nur ein Request verknüpft sein Video mit dem Upload
+            claimed = VideoUpload.objects.filter(pk=upload.pk, video__isnull=True).update(
+                video=video, updated_at=timezone.now())
+            if not claimed:
+                raise UploadAlreadyCompleted()
+
+            os.makedirs(os.path.dirname(default_storage.path(name)), exist_ok=True)
+            os.replace(upload.partial_path, default_storage.path(name))
+    except UploadAlreadyCompleted:
+        upload.refresh_from_db()
+        return upload.video
+    upload.video = video
+    return video
@@ -4,11 +4,36 @@ from rest_framework.permissions import IsAuthenticated
 from rest_framework.decorators import action
 from rest_framework.exceptions import NotFound
 from apps.videos.models import Video, VideoProgress
-from apps.videos.api.serializers import VideoSerializer, VideoProgressSerializer, VideoProgressUpdateSerializer
+from apps.videos.api.serializers import (VideoSerializer, VideoDetailSerializer, VideoProgressSerializer,
+                                         VideoProgressUpdateSerializer)
+from apps.videos.api.pagination import VideoCursorPagination
 from rest_framework.generics import RetrieveAPIView
+from rest_framework.views import APIView
+from django.conf import settings
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseNotModified, StreamingHttpResponse
+from django.utils._os import safe_join
+from django.core.exceptions import SuspiciousFileOperation
+from django.views import View
+from django.utils.cache import get_conditional_response
+from apps.videos.processing import get_processing_status
+from apps.videos.progress_buffer import apply_buffered_progress, CONTINUE_WATCHING_VIDEO_FIELDS
+from apps.videos.cache import get_catalog_version, get_catalog_etag, get_cached_catalog, set_cached_catalog
+from apps.videos.streaming import (guess_content_type, file_etag, file_last_modified, parse_range_header,
+                                   build_multipart_ranges, iter_and_close, offload_headers)
 import os
 from urllib.parse import unquote
 
+def filter_visible_videos(queryset, request):
+    """
+    Restricts the queryset to ready videos. Staff members can pass
+    ?status=<status> or ?status=all to see unfinished videos.
+    """
+    requested_status = request.query_params.get('status')
+    if request.user.is_staff and requested_status:
+        return queryset if requested_status == 'all' else queryset.filter(status=requested_status)
+    return queryset.filter(status=Video.STATUS_READY)
+
+
 class VideoListView(generics.ListAPIView):
     """
     API view to list all videos
@@ -16,13 +41,49 @@ class VideoListView(generics.ListAPIView):
     queryset = Video.objects.all()
     serializer_class = VideoSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = VideoCursorPagination
+
+    def get_queryset(self):
+        """
+        Filters the catalog by the optional category and new query parameters.
+        Only ready videos are listed unless a staff member asks for a status.
+        """
+        queryset = filter_visible_videos(super().get_queryset(), self.request)
+        category = self.request.query_params.get('category')
+        if category:
+            queryset = queryset.filter(category=category)
+        new = self.request.query_params.get('new')
+        if new is not None:
+            queryset = queryset.filter(new=new.lower() in ('1', 'true', 'yes'))
+        return queryset
+
+    def list(self, request, *args, **kwargs):
+        """
+        Serves the catalog from the cache and answers conditional requests
+        without touching the database.
+        """
+        version = get_catalog_version()
+        # Nur ETag: die Version ist ein Zähler und kein Änderungszeitpunkt
+        headers = {'ETag': get_catalog_etag(version, request)}
+
+        not_modified = get_conditional_response(request, etag=headers['ETag'])
+        if not_modified is not None:
+            for header, value in headers.items():
+                not_modified[header] = value
+            return not_modified
+
+        data = get_cached_catalog(version, request)
+        if data is None:
+            data = super().list(request, *args, **kwargs).data
+            set_cached_catalog(version, request, data)
+        return Response(data, headers=headers)
 
 
 class VideoDetailView(RetrieveAPIView):
     """
     API View, um ein einzelnes Video anhand der ID abzurufen.
     """
-    serializer_class = VideoSerializer
+    serializer_class = VideoDetailSerializer
     queryset = Video.objects.all()
 
     def get_object(self):
@@ -32,13 +93,30 @@ class VideoDetailView(RetrieveAPIView):
         video_id = self.kwargs.get("pk")
 
         try:
-            video = Video.objects.get(pk=video_id)
+            video = filter_visible_videos(Video.objects.all(), self.request).get(pk=video_id)
         except Video.DoesNotExist:
             raise NotFound(f"Video mit ID {video_id} nicht gefunden")
 
         return video
 
 
+class VideoProcessingStatusView(APIView):
+    """
+    API view that reports the transcoding progress of a video.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, pk):
+        """
+        Returns the current stage and the per-rendition progress (percent, fps, ETA).
+        """
+        video_status = Video.objects.filter(pk=pk).values_list('status', flat=True).first()
+        if video_status is None:
+            raise NotFound(f"Video mit ID {pk} nicht gefunden")
+        status_data = get_processing_status(pk) or {'stage': None, 'renditions': {}}
+        return Response({'video_id': pk, 'status': video_status, **status_data}, status=status.HTTP_200_OK)
+
+
 class VideoProgressViewSet(viewsets.ModelViewSet):
     """
     ViewSet to handle video progress-related endpoints
@@ -51,7 +129,19 @@ class VideoProgressViewSet(viewsets.ModelViewSet):
         Returns a list of videos the user has started watching but not completed
         """
         user = request.user
-        in_progress_videos = VideoProgress.objects.filter(user=user, started=True, completed=False).select_related('video')
+        limit = settings.CONTINUE_WATCHING_LIMIT
+        in_progress_videos = (
+            VideoProgress.objects
+            .filter(user=user, started=True, completed=False)
+            .select_related('video')
+            .only('last_position', 'started', 'completed', 'updated_at', 'video',
+                  *(f'video__{field}' for field in CONTINUE_WATCHING_VIDEO_FIELDS))
+            .order_by('-updated_at')[:limit]
+        )
+        if settings.VIDEO_PROGRESS_WRITE_BEHIND:
+            in_progress_videos = apply_buffered_progress(user, list(in_progress_videos))
+            in_progress_videos.sort(key=lambda progress: progress.updated_at, reverse=True)
+            in_progress_videos = in_progress_videos[:limit]
         serializer = VideoProgressSerializer(in_progress_videos, many=True)
         return Response(serializer.data, status=status.HTTP_200_OK)
     
@@ -74,3 +164,99 @@ class VideoProgressViewSet(viewsets.ModelViewSet):
             return Video.objects.get(pk=pk)
         except Video.DoesNotExist:
             raise NotFound('Video not found.')
+
+
+class VideoFileStreamView(View):
+    """
+    Serves rendition files with support for byte ranges, conditional
+    requests and web server offloading.
+    """
+
+    def get(self, request, video_id, file_path):
+        path = self._get_file_path(video_id, file_path)
+        stat = os.stat(path)
+        etag = file_etag(stat)
+        headers = {
+            'Accept-Ranges': 'bytes',
+            'ETag': etag,
+            'Last-Modified': file_last_modified(stat),
+        }
+
+        if self._etag_matches(request.headers.get('If-None-Match'), etag):
+            return HttpResponseNotModified(headers=headers)
+
+        if settings.MEDIA_SENDFILE_MODE:
+            # nginx/Apache liefern die Datei (inkl. Range) selbst aus
+            headers.update(offload_headers(path, settings.MEDIA_ROOT, settings.MEDIA_SENDFILE_MODE,
+                                           settings.MEDIA_ACCEL_REDIRECT_PREFIX))
+            return HttpResponse(content_type=guess_content_type(path), headers=headers)
+
+        ranges = self._get_requested_ranges(request, etag, stat.st_size)
+        if ranges is None:
+            # FileResponse nutzt wsgi.file_wrapper und damit sendfile
+            return FileResponse(open(path, 'rb'), content_type=guess_content_type(path), headers=headers)
+        if not ranges:
+            headers['Content-Range'] = f"bytes */{stat.st_size}"
+            return HttpResponse(status=416, headers=headers)
+        return self._partial_response(path, ranges, stat.st_size, headers)
+
+    def head(self, request, video_id, file_path):
+        response = self.get(request, video_id, file_path)
+        if isinstance(response, (FileResponse, StreamingHttpResponse)):
+            response.close()
+            return HttpResponse(status=response.status_code, headers=response.headers)
+        return response
+
+    def _get_file_path(self, video_id, file_path):
+        """
+        Resolves the requested file inside the video's media directory.
+        """
+        try:
+            path = safe_join(settings.MEDIA_ROOT, 'videos', str(video_id), unquote(file_path))
+        except SuspiciousFileOperation:
+            raise Http404('File not found.')
+        if not os.path.isfile(path):
+            raise Http404('File not found.')
+        return path
+
+    def _etag_matches(self, header, etag):
+        """
+        Checks an If-None-Match header against the ETag of the file.
+        """
+        if not header:
+            return False
+        candidates = [value.strip() for value in header.split(',')]
+        return '*' in candidates or etag in candidates or f"W/{etag}" in candidates
+
+    def _get_requested_ranges(self, request, etag, size):
+        """
+        Returns the ranges to serve, or None if the whole file is served.
+        """
+        range_header = request.headers.get('Range')
+        if not range_header:
+            return None
+        if_range = request.headers.get('If-Range')
+        if if_range and if_range.strip() != etag:
+            return None
+        return parse_range_header(range_header, size)
+
+    def _partial_response(self, path, ranges, size, headers):
+        """
+        Builds a 206 response for one or several byte ranges.
+        """
+        content_type = guess_content_type(path)
+        file = open(path, 'rb')
+
+        if len(ranges) == 1:
+            start, end = ranges[0]
+            response = StreamingHttpResponse(iter_and_close(file, start, end), status=206,
+                                             content_type=content_type, headers=headers)
+            response['Content-Range'] = f"bytes {start}-{end}/{size}"
+            response['Content-Length'] = str(end - start + 1)
+            return response
+
+        boundary, content_length, stream = build_multipart_ranges(file, ranges, content_type, size)
+        response = StreamingHttpResponse(stream, status=206, headers=headers,
+                                         content_type=f"multipart/byteranges; boundary={boundary}")
+        response['Content-Length'] = str(content_length)
+        return response
@@ -0,0 +1,122 @@
+import functools
+import inspect
+import json
+import logging
+import time
+from contextvars import ContextVar
+from django.conf import settings
+from rq import get_current_job
+from videoflix_backend.metrics import increment, observe_histogram, sample_name
+
+logger = logging.getLogger(__name__)
+
+_job_context = ContextVar('job_context', default=None)
+
+
+def instrument_job(func):
+    """
+    Wraps an RQ job function and records queue wait, run time, ffmpeg time,
+    bytes in/out and the failure reason. Each run is exported as metrics
+    and logged as one JSON line keyed by the video id.
+    """
+    signature = inspect.signature(func)
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        job = get_current_job()
+        arguments = signature.bind_partial(*args, **kwargs).arguments
+        context = {'bytes_in': 0, 'bytes_out': 0, 'ffmpeg': []}
+        record = {
+            'event': 'job',
+            'job': func.__name__,
+            'job_id': job.id if job else None,
+            'queue': job.origin if job else 'direct',
+            'video_id': arguments.get('video_id'),
+            'queue_wait': get_queue_wait(job),
+            # Gilt auch für Abbrüche ohne Exception (z.B. Warm-Shutdown des Workers)
+            'status': 'failed',
+            'error': 'Interrupted',
+        }
+
+        token = _job_context.set(context)
+        started = time.perf_counter()
+        try:
+            result = func(*args, **kwargs)
+            record.update(status='finished', error=None)
+            return result
+        except Exception as error:
+            record.update(status='failed', error=type(error).__name__, message=str(error)[:500])
+            if getattr(error, 'stderr', None):
+                record['stderr'] = str(error.stderr)[-500:]
+            raise
+        finally:
+            _job_context.reset(token)
+            record.update(duration=round(time.perf_counter() - started, 3), bytes_in=context['bytes_in'],
+                          bytes_out=context['bytes_out'], ffmpeg=context['ffmpeg'])
+            log_job(record)
+            record_job_metrics(record)
+
+    return wrapper
+
+
+def get_queue_wait(job):
+    """
+    Returns how long the job waited in the queue in seconds, if known.
+    """
+    if job is None or not job.enqueued_at or not job.started_at:
+        return None
+    return round(max((job.started_at - job.enqueued_at).total_seconds(), 0), 3)
+
+
+def add_job_bytes(bytes_in=0, bytes_out=0):
+    """
+    Adds read and written bytes to the running job.
+    """
+    context = _job_context.get()
+    if context is not None:
+        context['bytes_in'] += bytes_in
+        context['bytes_out'] += bytes_out
+
+
+def record_ffmpeg_run(step, resolutions, seconds):
+    """
+    Adds the duration of one ffmpeg run to the running job. A single run
+    encodes all listed renditions together.
+    """
+    context = _job_context.get()
+    if context is not None:
+        context['ffmpeg'].append({'step': step, 'renditions': list(resolutions), 'seconds': round(seconds, 3)})
+
+
+def log_job(record):
+    """
+    Writes the job record as one JSON line.
+    """
+    level = logging.INFO if record['status'] == 'finished' else logging.ERROR
+    logger.log(level, json.dumps(record, default=str))
+
+
+def record_job_metrics(record):
+    """
+    Adds the job record to the shared metrics registry.
+    """
+    labels = {'job': record['job'], 'queue': record['queue']}
+    fields = {
+        sample_name('videoflix_jobs_total', {**labels, 'status': record['status']}): 1,
+        sample_name('videoflix_job_bytes_in_total', labels): record['bytes_in'],
+        sample_name('videoflix_job_bytes_out_total', labels): record['bytes_out'],
+    }
+    observe_histogram(fields, 'videoflix_job_duration_seconds', labels, record['duration'],
+                      settings.JOB_METRICS_BUCKETS)
+    if record['queue_wait'] is not None:
+        observe_histogram(fields, 'videoflix_job_queue_wait_seconds', labels, record['queue_wait'],
+                          settings.JOB_METRICS_BUCKETS)
+    if record['status'] == 'failed':
+        fields[sample_name('videoflix_job_failures_total', {**labels, 'reason': record['error']})] = 1
+    for run in record['ffmpeg']:
+        ffmpeg_labels = {'step': run['step'], 'renditions': ','.join(run['renditions'])}
+        duration_name = sample_name('videoflix_ffmpeg_duration_seconds_total', ffmpeg_labels)
+        runs_name = sample_name('videoflix_ffmpeg_runs_total', ffmpeg_labels)
+        fields[duration_name] = fields.get(duration_name, 0) + run['seconds']
+        fields[runs_name] = fields.get(runs_name, 0) + 1
+    increment(fields)
@@ -0,0 +1,141 @@
+import logging
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from django_redis import get_redis_connection
+from redis.exceptions import RedisError
+from rest_framework import serializers
+
+logger = logging.getLogger(__name__)
+
+# Alle Worker-Prozesse schreiben in denselben Hash, /metrics liest die Summe
+METRICS_KEY = 'videoflix:metrics'
+METRIC_HELP = {
+    'videoflix_http_requests_total': ('counter', 'Handled requests.'),
+    'videoflix_http_request_duration_seconds': ('histogram', 'Total request latency.'),
+    'videoflix_db_queries_total': ('counter', 'Database queries executed by requests.'),
+    'videoflix_db_query_duration_seconds_total': ('counter', 'Time requests spent in the database.'),
+    'videoflix_serializer_duration_seconds_total': ('counter', 'Time requests spent serializing.'),
+    'videoflix_n_plus_one_warnings_total': ('counter', 'Requests that repeated a query above the threshold.'),
+    'videoflix_jobs_total': ('counter', 'Finished and failed RQ jobs.'),
+    'videoflix_job_queue_wait_seconds': ('histogram', 'Time jobs waited in the queue.'),
+    'videoflix_job_duration_seconds': ('histogram', 'Run time of jobs.'),
+    'videoflix_job_failures_total': ('counter', 'Failed jobs by exception type.'),
+    'videoflix_job_bytes_in_total': ('counter', 'Bytes read by jobs.'),
+    'videoflix_job_bytes_out_total': ('counter', 'Bytes written by jobs.'),
+    'videoflix_ffmpeg_duration_seconds_total': ('counter', 'Time spent in ffmpeg per step and renditions.'),
+    'videoflix_ffmpeg_runs_total': ('counter', 'ffmpeg runs per step and renditions.'),
+}
+
+_request_timings = ContextVar('request_timings', default=None)
+
+
+def escape_label(value):
+    """
+    Escapes a label value for the Prometheus text format.
+    """
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def sample_name(metric, labels):
+    """
+    Returns the sample name with labels, e.g. metric{view="video-list"}.
+    """
+    return metric + '{' + ','.join(f'{name}="{escape_label(value)}"' for name, value in labels.items()) + '}'
+
+
+def increment(fields):
+    """
+    Adds the given {sample name: amount} values to the shared registry.
+    Metrics must never break the request, so Redis errors are only logged.
+    """
+    try:
+        with get_redis_connection('default').pipeline(transaction=False) as pipeline:
+            for name, amount in fields.items():
+                pipeline.hincrbyfloat(METRICS_KEY, name, amount)
+            pipeline.execute()
+    except RedisError as error:
+        logger.warning("Could not record metrics: %s", error)
+
+
+def observe_histogram(fields, metric, labels, value, buckets):
+    """
+    Adds one observation of a histogram to a field dict for increment().
+    """
+    for bucket in (*buckets, '+Inf'):
+        if bucket == '+Inf' or value <= bucket:
+            fields[sample_name(f'{metric}_bucket', {**labels, 'le': bucket})] = 1
+    fields[sample_name(f'{metric}_sum', labels)] = value
+    fields[sample_name(f'{metric}_count', labels)] = 1
+
+
+def render_metrics():
+    """
+    Returns all recorded metrics in the Prometheus text exposition format.
+    """
+    samples = get_redis_connection('default').hgetall(METRICS_KEY)
+    lines = []
+    for metric, (metric_type, help_text) in METRIC_HELP.items():
+        metric_samples = sorted(
+            (name.decode(), value.decode()) for name, value in samples.items()
+            if name.decode().split('{')[0] in (metric, f'{metric}_bucket', f'{metric}_sum', f'{metric}_count')
+        )
+        if not metric_samples:
+            continue
+        lines += [f'# HELP {metric} {help_text}', f'# TYPE {metric} {metric_type}']
+        lines += [f'{name} {float(value):g}' for name, value in metric_samples]
+    return '\n'.join(lines) + '\n'
+
+
+@contextmanager
+def track_request():
+    """
+    Collects the timings of the current request. Yields the dict that
+    record_timing() and the query hook write to.
+    """
+    timings = {}
+    token = _request_timings.set(timings)
+    try:
+        yield timings
+    finally:
+        _request_timings.reset(token)
+
+
+@contextmanager
+def record_timing(name):
+    """
+    Adds the time spent in the block to the named timing of the current
+    request. Does nothing outside of a tracked request.
+    """
+    timings = _request_timings.get()
+    if timings is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[name] = timings.get(name, 0) + time.perf_counter() - started
+
+
+class TimedListSerializer(serializers.ListSerializer):
+    """
+    ListSerializer that reports its serialization time.
+    """
+
+    @property
+    def data(self):
+        with record_timing('serializer'):
+            return super().data
+
+
+class TimedSerializerMixin:
+    """
+    Reports the serialization time of a serializer as "serializer" timing.
+    Lists need `list_serializer_class = TimedListSerializer` in Meta.
+    """
+
+    @property
+    def data(self):
+        with record_timing('serializer'):
+            return super().data
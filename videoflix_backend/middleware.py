@@ -0,0 +1,99 @@
+import logging
+import time
+from collections import Counter
+from django.conf import settings
+from django.db import connection
+from videoflix_backend.metrics import increment, observe_histogram, sample_name, track_request
+
+logger = logging.getLogger(__name__)
+
+
+class QueryRecorder:
+    """
+    Database execute wrapper that counts and times the queries of a request.
+    Works without DEBUG, only the SQL templates are kept, never the params.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.statements = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - started
+            self.count += 1
+            self.statements[sql] += 1
+
+
+class RequestMetricsMiddleware:
+    """
+    Records query count, DB time, serializer time and total latency per
+    view. The values are sent as Server-Timing header and aggregated for
+    the /metrics endpoint.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not settings.REQUEST_METRICS_ENABLED:
+            return self.get_response(request)
+
+        queries = QueryRecorder()
+        started = time.perf_counter()
+        with track_request() as timings, connection.execute_wrapper(queries):
+            response = self.get_response(request)
+        duration = time.perf_counter() - started
+
+        match = getattr(request, 'resolver_match', None)
+        view = match.view_name if match else 'unmatched'
+        if view == 'metrics':
+            return response
+
+        if settings.REQUEST_METRICS_SERVER_TIMING:
+            response['Server-Timing'] = self.build_server_timing(queries, timings, duration)
+        self.check_repeated_queries(request, view, queries)
+        self.record(request, response, view, queries, timings, duration)
+        return response
+
+    def build_server_timing(self, queries, timings, duration):
+        """
+        Builds the Server-Timing header value, durations in milliseconds.
+        """
+        entries = [f'db;dur={queries.duration * 1000:.1f};desc="{queries.count} queries"']
+        entries += [f'{name};dur={value * 1000:.1f}' for name, value in timings.items()]
+        entries.append(f'total;dur={duration * 1000:.1f}')
+        return ', '.join(entries)
+
+    def check_repeated_queries(self, request, view, queries):
+        """
+        Logs a warning if one query ran more often than the N+1 threshold.
+        """
+        threshold = settings.N_PLUS_ONE_THRESHOLD
+        if not threshold or not queries.statements:
+            return
+        sql, repetitions = queries.statements.most_common(1)[0]
+        if repetitions <= threshold:
+            return
+        logger.warning("Possible N+1 in %s (%s %s): query repeated %s times: %s",
+                       view, request.method, request.path, repetitions, sql[:300])
+        increment({sample_name('videoflix_n_plus_one_warnings_total', {'view': view}): 1})
+
+    def record(self, request, response, view, queries, timings, duration):
+        """
+        Adds the request to the aggregated metrics.
+        """
+        labels = {'view': view, 'method': request.method}
+        fields = {
+            sample_name('videoflix_http_requests_total', {**labels, 'status': response.status_code}): 1,
+            sample_name('videoflix_db_queries_total', labels): queries.count,
+            sample_name('videoflix_db_query_duration_seconds_total', labels): queries.duration,
+            sample_name('videoflix_serializer_duration_seconds_total', labels): timings.get('serializer', 0),
+        }
+        observe_histogram(fields, 'videoflix_http_request_duration_seconds', labels, duration,
+                          settings.REQUEST_METRICS_BUCKETS)
+        increment(fields)
@@ -13,6 +13,7 @@ https://docs.djangoproject.com/en/5.1/ref/settings/
 import os
 from dotenv import load_dotenv
 from pathlib import Path
+from corsheaders.defaults import default_headers as default_cors_headers
 import sys
 from datetime import timedelta
 
@@ -71,6 +72,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'videoflix_backend.middleware.RequestMetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -179,6 +181,20 @@ CORS_ALLOWED_ORIGINS = [
     BACKEND_URL,
 ]
 
+# Resumable uploads (tus) send and read their own headers
+CORS_ALLOW_HEADERS = (
+    *default_cors_headers,
+    'tus-resumable',
+    'upload-length',
+    'upload-metadata',
+    'upload-offset',
+    'upload-checksum',
+)
+CORS_EXPOSE_HEADERS = [
+    'Location', 'Tus-Resumable', 'Tus-Version', 'Tus-Extension', 'Tus-Max-Size',
+    'Tus-Checksum-Algorithm', 'Upload-Offset', 'Upload-Length', 'Video-Id',
+]
+
 AUTH_USER_MODEL = 'users.UserAccount'
 
 REST_FRAMEWORK = {
@@ -194,18 +210,126 @@ SIMPLE_JWT = {
     'REFRESH_TOKEN_LIFETIME': timedelta(days=30),  # 30 Tage gültig
 }
 
+RQ_CONNECTION = {
+    'HOST': 'localhost',
+    'PORT': 6379,
+    'DB': 0,
+    'PASSWORD': os.getenv('REDIS_PASSWORD'),
+}
+
+# Workers take queues in the given order, e.g.
+# "rqworker transcode-high transcode-bulk" and "rqworker maintenance email default"
 RQ_QUEUES = {
-    'default': {
-        'HOST': 'localhost',
-        'PORT': 6379,
-        'DB': 0,
-        'PASSWORD': os.getenv('REDIS_PASSWORD'),
-        'DEFAULT_TIMEOUT': 360,
-    },
+    'default': {**RQ_CONNECTION, 'DEFAULT_TIMEOUT': 360},
+    'transcode-high': {**RQ_CONNECTION, 'DEFAULT_TIMEOUT': 30 * 60},
+    'transcode-bulk': {**RQ_CONNECTION, 'DEFAULT_TIMEOUT': 6 * 60 * 60},
+    'maintenance': {**RQ_CONNECTION, 'DEFAULT_TIMEOUT': 10 * 60},
+    'email': {**RQ_CONNECTION, 'DEFAULT_TIMEOUT': 60},
 }
 
+# Jobs enqueued by tests land in their own Redis database, never on the live queues
+if TESTING:
+    for queue_config in RQ_QUEUES.values():
+        queue_config['DB'] = 14
+
 # RQ_WORKER_CLASS = 'rq_win.WindowsWorker'
 
+# 'single_pass': one job encodes all renditions with a single ffmpeg run
+# 'parallel': one job per rendition, finalized once all of them are done
+# 'chunked': the source is split into segments that are encoded concurrently.
+#   All segments run in threads of the one processing job, so the job timeout
+#   still covers the whole video and a failed segment retries the whole job
+#   (finished renditions are kept). Use 'parallel' to spread the work over workers.
+VIDEO_PROCESSING_MODE = os.getenv('VIDEO_PROCESSING_MODE', 'single_pass')
+VIDEO_SEGMENT_DURATION = int(os.getenv('VIDEO_SEGMENT_DURATION', 60))  # Sekunden
+VIDEO_SEGMENT_WORKERS = int(os.getenv('VIDEO_SEGMENT_WORKERS', os.cpu_count() or 1))
+
+# Failed processing jobs are retried, finished renditions are kept and skipped
+VIDEO_PROCESSING_RETRIES = int(os.getenv('VIDEO_PROCESSING_RETRIES', 2))
+VIDEO_RETRY_INTERVALS = [60, 5 * 60]  # Sekunden, benötigt "rqworker --with-scheduler"
+
+# Resumable uploads: largest accepted file, read size per chunk and PATCH lock timeout
+VIDEO_UPLOAD_MAX_SIZE = int(os.getenv('VIDEO_UPLOAD_MAX_SIZE', 20 * 1024 ** 3))  # Bytes
+VIDEO_UPLOAD_READ_SIZE = 1024 * 1024
+VIDEO_UPLOAD_LOCK_TIMEOUT = 60 * 60  # Sekunden
+
+# Sources up to this length and size go to the transcode-high queue
+VIDEO_PRIORITY_MAX_DURATION = int(os.getenv('VIDEO_PRIORITY_MAX_DURATION', 3 * 60))  # Sekunden
+VIDEO_PRIORITY_MAX_SIZE = int(os.getenv('VIDEO_PRIORITY_MAX_SIZE', 200 * 1024 * 1024))  # Bytes
+
+# Skip rungs above the source resolution and tune bitrates to the probed source
+VIDEO_ADAPTIVE_LADDER = os.getenv('VIDEO_ADAPTIVE_LADDER', 'True') == 'True'
+
+# Encoder settings per profile. rate_control is 'bitrate' (target the ladder
+# bitrate, optionally two_pass), 'crf' or 'capped_crf' (CRF limited to the
+# ladder bitrate). gop is the keyframe interval in seconds and has to divide
+# VIDEO_STREAM_SEGMENT_DURATION; threads=0 lets x264 decide.
+VIDEO_ENCODING_PROFILES = {
+    'fast': {
+        'preset': 'veryfast',
+        'rate_control': 'capped_crf',
+        'crf': 25,
+    },
+    'balanced': {
+        'preset': 'medium',
+        'rate_control': 'capped_crf',
+        'crf': 23,
+    },
+    'archive': {
+        'preset': 'slow',
+        'tune': 'film',
+        'rate_control': 'bitrate',
+        'two_pass': True,
+        'gop': 2,
+    },
+}
+VIDEO_ENCODING_PROFILE = os.getenv('VIDEO_ENCODING_PROFILE', 'balanced')
+# Profile per RQ queue, jobs on other queues use VIDEO_ENCODING_PROFILE
+VIDEO_QUEUE_PROFILES = {
+    'default': VIDEO_ENCODING_PROFILE,
+    # Kurze Clips sollen schnell online sein
+    'transcode-high': 'fast',
+    'transcode-bulk': VIDEO_ENCODING_PROFILE,
+}
+
+# Adaptive streaming output next to the progressive MP4s ('hls' and/or 'dash')
+VIDEO_STREAMING_FORMATS = os.getenv('VIDEO_STREAMING_FORMATS', 'hls').split(',')
+VIDEO_STREAM_SEGMENT_DURATION = 6  # Sekunden pro HLS/DASH-Segment
+
+# Responsive thumbnail variants, formats in order of preference. AVIF is
+# opt-in (e.g. 'avif,webp,jpeg'), the pinned Pillow 10.4 cannot write it
+# without pillow-avif-plugin.
+VIDEO_THUMBNAIL_WIDTHS = [320, 640, 1280]
+VIDEO_THUMBNAIL_FORMATS = os.getenv('VIDEO_THUMBNAIL_FORMATS', 'webp,jpeg').split(',')
+VIDEO_THUMBNAIL_QUALITY = {'avif': 50, 'webp': 80, 'jpeg': 82}
+
+# Seek previews: one frame every INTERVAL seconds, tiled into COLUMNS x ROWS JPEG sprites
+VIDEO_TRICKPLAY_ENABLED = os.getenv('VIDEO_TRICKPLAY_ENABLED', 'True') == 'True'
+VIDEO_TRICKPLAY_INTERVAL = int(os.getenv('VIDEO_TRICKPLAY_INTERVAL', 10))  # Sekunden
+VIDEO_TRICKPLAY_WIDTH = 160
+VIDEO_TRICKPLAY_COLUMNS = 10
+VIDEO_TRICKPLAY_ROWS = 10
+VIDEO_TRICKPLAY_QUALITY = 75
+
+# Offload video delivery to the web server: '' (Django), 'nginx' or 'sendfile'
+MEDIA_SENDFILE_MODE = os.getenv('MEDIA_SENDFILE_MODE', '')
+MEDIA_ACCEL_REDIRECT_PREFIX = '/protected-media/'
+
+# Where processed renditions and thumbnails are stored: 'local' (MEDIA_ROOT) or 's3'.
+# 's3' works with any S3-compatible service (AWS, MinIO, ...) and requires boto3.
+VIDEO_STORAGE_BACKEND = os.getenv('VIDEO_STORAGE_BACKEND', 'local')
+VIDEO_STORAGE_S3_BUCKET = os.getenv('VIDEO_STORAGE_S3_BUCKET', '')
+VIDEO_STORAGE_S3_ENDPOINT_URL = os.getenv('VIDEO_STORAGE_S3_ENDPOINT_URL') or None
+VIDEO_STORAGE_S3_REGION = os.getenv('VIDEO_STORAGE_S3_REGION') or None
+VIDEO_STORAGE_S3_ACCESS_KEY_ID = os.getenv('VIDEO_STORAGE_S3_ACCESS_KEY_ID') or None
+VIDEO_STORAGE_S3_SECRET_ACCESS_KEY = os.getenv('VIDEO_STORAGE_S3_SECRET_ACCESS_KEY') or None
+# Public or CDN URL of the bucket, defaults to <endpoint>/<bucket>/
+VIDEO_STORAGE_S3_PUBLIC_URL = os.getenv('VIDEO_STORAGE_S3_PUBLIC_URL', '')
+# Files above the threshold are uploaded in parts, up to MAX_CONCURRENCY parts and files at a time
+VIDEO_STORAGE_S3_MULTIPART_THRESHOLD = 8 * 1024 * 1024  # Bytes
+VIDEO_STORAGE_S3_MULTIPART_CHUNKSIZE = 8 * 1024 * 1024  # Bytes
+VIDEO_STORAGE_S3_MAX_CONCURRENCY = int(os.getenv('VIDEO_STORAGE_S3_MAX_CONCURRENCY', 8))
+
 CACHES = {
     "default": {
         "BACKEND": "django_redis.cache.RedisCache",
@@ -218,6 +342,59 @@ CACHES = {
     }
 }
 
+# Tests get their own Redis database, so they never touch the live metrics,
+# caches or progress buffers
+if TESTING:
+    CACHES['default']['LOCATION'] = "redis://127.0.0.1:6379/15"
+    CACHES['default']['KEY_PREFIX'] = "videoflix-test"
+
+VIDEO_CATALOG_CACHE_TIMEOUT = 60 * 60  # 1 Stunde, Invalidierung über die Katalog-Version
+
+# Write-behind for player heartbeats: positions are buffered in Redis and
+# flushed in bulk (requires a worker started with --with-scheduler)
+VIDEO_PROGRESS_WRITE_BEHIND = os.getenv('VIDEO_PROGRESS_WRITE_BEHIND') == 'True'
+VIDEO_PROGRESS_FLUSH_INTERVAL = 10  # Sekunden
+CONTINUE_WATCHING_LIMIT = 20
+
+# Per-request query count, DB/serializer time and latency (Server-Timing + /metrics)
+REQUEST_METRICS_ENABLED = os.getenv('REQUEST_METRICS_ENABLED', 'True') == 'True'
+REQUEST_METRICS_SERVER_TIMING = os.getenv('REQUEST_METRICS_SERVER_TIMING', 'True') == 'True'
+REQUEST_METRICS_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)  # Sekunden
+# Warn when a single query repeats more often than this within one request (0 = off)
+N_PLUS_ONE_THRESHOLD = int(os.getenv('N_PLUS_ONE_THRESHOLD', 10))
+# Bearer token for /metrics. Without a token /metrics is only served with DEBUG = True.
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+JOB_METRICS_BUCKETS = (1.0, 5.0, 15.0, 60.0, 300.0, 900.0, 1800.0, 3600.0)  # Sekunden
+
+# Job records and N+1 warnings are written as JSON lines to stderr, the apps log
+# their processing steps (LOG_LEVEL=DEBUG also shows every stored file)
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'message': {'format': '%(message)s'},
+    },
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler', 'formatter': 'message'},
+    },
+    'loggers': {
+        'videoflix_backend': {
+            'handlers': ['console'],
+            'level': os.getenv('LOG_LEVEL', 'INFO'),
+            'propagate': False,
+        },
+        'apps': {
+            'handlers': ['console'],
+            'level': os.getenv('LOG_LEVEL', 'INFO'),
+            'propagate': False,
+        },
+    },
+}
+
+# Tests keep the job records and warnings out of the output, assertLogs still sees them
+if TESTING:
+    LOGGING['handlers']['console'] = {'class': 'logging.NullHandler'}
+
 SESSION_COOKIE_AGE = 60 * 60 * 24 * 7  # 1 Week
 SESSION_EXPIRE_AT_BROWSER_CLOSE = False
 SESSION_ENGINE = 'django.contrib.sessions.backends.db'
@@ -19,13 +19,19 @@ from django.urls import include, path
 from django.conf import settings
 from django.conf.urls.static import static
 from debug_toolbar.toolbar import debug_toolbar_urls
+from apps.videos.views import VideoFileStreamView
+from videoflix_backend.views import metrics_view
 
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/auth/', include('apps.users.api.urls')),
     path('api/videos/', include('apps.videos.api.urls')),
-    path('django-rq/', include('django_rq.urls'))
+    path('django-rq/', include('django_rq.urls')),
+    path('metrics', metrics_view, name='metrics'),
+    # Videos mit Range-Support ausliefern (Spulen ohne Neuladen)
+    path(f"{settings.MEDIA_URL.lstrip('/')}videos/<int:video_id>/<path:file_path>",
+         VideoFileStreamView.as_view(), name='video-file'),
 ]
 
 if not settings.TESTING:
@@ -33,5 +39,5 @@ if not settings.TESTING:
         *urlpatterns,
     ] + debug_toolbar_urls()
 
-# Serve media files during development
+# Serve the remaining media files (e.g. thumbnails) during development
 urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
\ No newline at end of file
@@ -0,0 +1,20 @@
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
+from django.utils.crypto import constant_time_compare
+from videoflix_backend.metrics import render_metrics
+
+
+def metrics_view(request):
+    """
+    Exposes the aggregated request metrics in the Prometheus text format.
+    The scraper has to send METRICS_TOKEN as Bearer token. Without a
+    token the endpoint is only open in DEBUG mode.
+    """
+    if settings.METRICS_TOKEN:
+        header = request.headers.get('Authorization', '')
+        if not constant_time_compare(header, f'Bearer {settings.METRICS_TOKEN}'):
+            return HttpResponseForbidden()
+    elif not settings.DEBUG:
+        # Ohne Token nicht öffentlich, auch nicht hinter einem Proxy
+        return HttpResponseForbidden()
+    return HttpResponse(render_metrics(), content_type='text/plain; version=0.0.4; charset=utf-8')